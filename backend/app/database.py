@@ -1,9 +1,15 @@
 """
-database.py — SQLAlchemy engine + session factory
+database.py — SQLAlchemy engines + session factories
 Reads DATABASE_URL from environment. Falls back gracefully if not set.
+
+Two engines share the same database:
+- engine / SessionLocal (sync)  — table creation, scripts, sync endpoints
+- async_engine / AsyncSessionLocal — request handlers (asyncpg / aiosqlite)
 """
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -17,6 +23,28 @@ if DATABASE_URL.startswith("postgres://"):
 if not DATABASE_URL:
     DATABASE_URL = "sqlite:///./cypher_local.db"
 
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (asyncpg / aiosqlite)"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+
+    if backend == "postgresql":
+        # asyncpg spells libpq's sslmode as ssl and has no channel_binding option
+        query = dict(parsed.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        query.pop("channel_binding", None)
+        return parsed.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+
+    return url
+
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
 engine = create_engine(
     DATABASE_URL,
     # SQLite doesn't support pool options; skip for Postgres
@@ -25,6 +53,14 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **({} if "sqlite" in ASYNC_DATABASE_URL else {"pool_pre_ping": True})
+)
+
+# expire_on_commit=False: returned rows stay readable after commit without a refresh round-trip
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
 Base = declarative_base()
 
 
@@ -35,3 +71,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """FastAPI dependency — yields an AsyncSession and closes it after the request."""
+    async with AsyncSessionLocal() as db:
+        yield db
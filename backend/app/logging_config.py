@@ -0,0 +1,137 @@
+"""
+logging_config.py — non-blocking, sampled structured logging
+Server code logs through stdlib loggers (logging.getLogger(__name__)); this
+module wires them to a background writer once per process.
+
+- Records go onto a bounded in-memory queue; a QueueListener thread formats
+  and writes them, so request threads never wait on stdout. The message is
+  formatted by the writer thread too (%-style args stay unformatted until then).
+  When the queue is full, records are dropped and counted, never blocking.
+- CYPHER_LOG_LEVEL (default INFO) gates by level: guard expensive debug detail
+  with logger.isEnabledFor(logging.DEBUG) and it costs one check when off.
+- CYPHER_LOG_SAMPLE, e.g. "ml_enhancement=0.01,ml_fallback=1", keeps that
+  fraction of records per event type (extra={"event": ...}); unlisted events are kept.
+- CYPHER_LOG_FORMAT: "text" (default, human-readable) or "json" (one object per line).
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get("CYPHER_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("CYPHER_LOG_FORMAT", "text").lower()
+LOG_SAMPLE = os.environ.get("CYPHER_LOG_SAMPLE", "")
+LOG_QUEUE_SIZE = int(os.environ.get("CYPHER_LOG_QUEUE_SIZE", "10000"))
+
+# Attributes every LogRecord has; anything else came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """'event=rate,...' -> {event: rate}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a configured fraction of records per `event`"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(getattr(record, "event", None))
+        return rate is None or (rate > 0 and (rate >= 1 or random.random() < rate))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, event fields, exc"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """QueueHandler that defers formatting to the listener and drops (counting) when full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same process: hand the record over as is; the writer thread formats it
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def start_background(*handlers, queue_size: int = LOG_QUEUE_SIZE):
+    """Queue handler whose records are written by `handlers` on a listener thread; returns (handler, listener)"""
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return BackgroundQueueHandler(log_queue), listener
+
+
+_configured_pid = None
+_listener = None
+queue_handler = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sample: str = LOG_SAMPLE):
+    """Route the root logger through the background writer (idempotent per process)"""
+    global _configured_pid, _listener, queue_handler
+    if _configured_pid == os.getpid():
+        return
+    _configured_pid = os.getpid()
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s: %(message)s"
+    ))
+    queue_handler, _listener = start_background(stream)
+    rates = parse_sample_rates(sample)
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    # A forked worker inherits the parent's handler, whose listener isn't running here
+    for handler in [h for h in root.handlers if isinstance(h, BackgroundQueueHandler)]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener, _configured_pid, queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(queue_handler)
+        _listener.stop()
+        _listener = None
+        queue_handler = None
+        _configured_pid = None
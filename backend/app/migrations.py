@@ -0,0 +1,101 @@
+"""
+Schema upgrades for databases created by older releases.
+
+create_all builds missing tables but never changes existing ones. upgrade()
+adds the scan_records columns and indexes a table created by an older release
+lacks. It is idempotent and safe to run from several processes at once: an
+"already exists" error from a process that lost the race is ignored once the
+column or index is confirmed present. On PostgreSQL indexes are built with
+CREATE INDEX CONCURRENTLY IF NOT EXISTS, so writes keep flowing while a large
+table is indexed.
+
+Run it once per deploy, before starting the server:  python -m app.migrations
+
+The server runs it at startup only when CYPHER_MIGRATE_ON_STARTUP=1 (the
+default for SQLite, a single local process); otherwise it logs what is missing.
+"""
+import logging
+import os
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex
+
+from app import models
+from app.database import DATABASE_URL, engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_ON_STARTUP = os.environ.get(
+    "CYPHER_MIGRATE_ON_STARTUP", "1" if DATABASE_URL.startswith("sqlite") else "0"
+) == "1"
+
+TABLE = models.ScanRecord.__table__
+
+
+def _columns(bind) -> set:
+    return {c["name"] for c in inspect(bind).get_columns(TABLE.name)}
+
+
+def _indexes(bind) -> set:
+    return {i["name"] for i in inspect(bind).get_indexes(TABLE.name)}
+
+
+def pending(bind=engine) -> List[str]:
+    """Columns and indexes upgrade() would add (empty when the schema is current)"""
+    columns, indexes = _columns(bind), _indexes(bind)
+    return (
+        [f"column {TABLE.name}.{c.name}" for c in TABLE.columns if c.name not in columns]
+        + [f"index {i.name}" for i in TABLE.indexes if i.name not in indexes]
+    )
+
+
+def _add_column(bind, column):
+    # All added columns are nullable, so no backfill is needed
+    ddl = f"ALTER TABLE {TABLE.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+    try:
+        with bind.begin() as conn:
+            conn.execute(text(ddl))
+    except DBAPIError:
+        if column.name not in _columns(bind):
+            raise
+        # Another process added it first
+
+
+def _create_index(bind, index):
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=bind.dialect))
+    if bind.dialect.name == "postgresql":
+        # Doesn't block writes; must run outside a transaction
+        ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+    try:
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(ddl))
+    except DBAPIError:
+        if index.name not in _indexes(bind):
+            raise
+
+
+def upgrade(bind=engine) -> List[str]:
+    """Create missing tables, then add missing columns and indexes; returns what was added"""
+    models.Base.metadata.create_all(bind=bind)
+    columns = _columns(bind)
+    added = []
+    for column in TABLE.columns:
+        if column.name not in columns:
+            _add_column(bind, column)
+            added.append(f"column {TABLE.name}.{column.name}")
+    # Indexes last: they may cover the columns just added
+    indexes = _indexes(bind)
+    for index in TABLE.indexes:
+        if index.name not in indexes:
+            _create_index(bind, index)
+            added.append(f"index {index.name}")
+    return added
+
+
+if __name__ == "__main__":
+    changes = upgrade()
+    for change in changes:
+        print(f"   + {change}")
+    print(f"✅ Schema up to date ({len(changes)} change(s) applied)")
@@ -1,7 +1,7 @@
 """
 models.py — SQLAlchemy ORM models
 """
-from sqlalchemy import Column, String, Float, DateTime, Integer
+from sqlalchemy import Column, String, Float, Date, DateTime, Integer, Index, LargeBinary
 from datetime import datetime
 from app.database import Base
 
@@ -13,6 +13,30 @@ class ScanRecord(Base):
     upi_id    = Column(String(120), nullable=True, index=True)
     risk_score = Column(Float, nullable=False)
     risk_label = Column(String(20), nullable=False)           # safe / warning / danger
-    reasons   = Column(String(2000), nullable=True)           # JSON-encoded list
-    user_id   = Column(String(120), nullable=True, index=True) # Clerk user ID (optional)
+    reasons   = Column(String(2000), nullable=True)           # JSON-encoded list (legacy rows)
+    reason_codes = Column(LargeBinary, nullable=True)         # packed codes, see services/reasons.py
+    user_id   = Column(String(120), nullable=True)            # Clerk user ID (optional)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    analyst_label = Column(Integer, nullable=True)            # 1 phishing / 0 legitimate, set by an analyst
+    labelled_at = Column(DateTime, nullable=True)             # when analyst_label was last set
+
+    __table_args__ = (
+        # /history keyset pagination: newest first, id breaks timestamp ties.
+        # Both columns DESC so "(timestamp, id) < cursor" is one index range scan.
+        Index("ix_scan_records_user_ts_id", user_id, timestamp.desc(), id.desc()),
+        Index("ix_scan_records_ts_id", timestamp.desc(), id.desc()),
+        # Incremental training reads labels newer than a (labelled_at, id) watermark
+        Index("ix_scan_records_labelled_at_id", labelled_at, id),
+    )
+
+
+class ScanDailyRollup(Base):
+    """Per user, per UTC day, per label aggregates of scan_records (kept by save_scans)"""
+    __tablename__ = "scan_daily_rollups"
+
+    user_id    = Column(String(120), primary_key=True)        # "" for anonymous scans
+    day        = Column(Date, primary_key=True)
+    risk_label = Column(String(20), primary_key=True)
+    scan_count = Column(Integer, nullable=False, default=0)
+    score_sum  = Column(Float, nullable=False, default=0.0)
+    score_max  = Column(Float, nullable=False, default=0.0)
@@ -2,25 +2,42 @@
 ML Router - API endpoints for ML predictions
 """
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-import sys
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from datetime import datetime
+import asyncio
+import hmac
 import os
 
-# Add backend root to path
-backend_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-if backend_root not in sys.path:
-    sys.path.insert(0, backend_root)
-
-try:
-    from ml.predictor import UPIPhishingPredictor
-    predictor = UPIPhishingPredictor()
-    ML_AVAILABLE = True
-except Exception as e:
-    print(f"⚠️  ML model not loaded: {e}")
-    import traceback
-    traceback.print_exc()
-    ML_AVAILABLE = False
+from app.database import get_async_db
+from app.models import ScanRecord
+from app.services import tracing
+from app.services.batcher import BatcherStopped, MicroBatcher
+from app.services.executor import inference_executor, InferenceSaturated, InferenceTimeout
+from app.services.registry import model_registry, predict_with_version
+from ml.model_store import ModelStoreError, list_versions
+from ml.predictor import UPIPhishingPredictor
+
+# Micro-batching of concurrent predictions (window 0 still coalesces queued requests)
+ML_MICROBATCH = os.environ.get("CYPHER_ML_MICROBATCH", "1") == "1"
+ML_BATCH_WINDOW_MS = float(os.environ.get("CYPHER_ML_BATCH_WINDOW_MS", "2"))
+ML_MAX_BATCH = int(os.environ.get("CYPHER_ML_MAX_BATCH", "64"))
+
+# Model admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get("CYPHER_ADMIN_TOKEN", "")
+
+# The model itself is loaded (and warmed up) by the app lifespan via model_registry
+batcher = None
+if ML_MICROBATCH:
+    batcher = MicroBatcher(
+        predict_with_version,
+        window_ms=ML_BATCH_WINDOW_MS,
+        max_batch=ML_MAX_BATCH,
+        runner=inference_executor.run,
+    )
 
 router = APIRouter()
 
@@ -28,6 +45,13 @@ router = APIRouter()
 class UPIPredictionRequest(BaseModel):
     upi_id: str
 
+    @field_validator("upi_id", mode="before")
+    @classmethod
+    def strip_upi_id(cls, v):
+        # Same normalization as TransactionInput.payee_id, so both endpoints
+        # score (and cache) one form of each ID
+        return v.strip() if isinstance(v, str) else v
+
 
 class UPIPredictionResponse(BaseModel):
     upi_id: str
@@ -35,6 +59,24 @@ class UPIPredictionResponse(BaseModel):
     phishing_probability: float
     confidence: str
     ml_available: bool
+    model_version: str
+
+
+class ModelActivationRequest(BaseModel):
+    version: Optional[str] = None  # None serves the legacy upi_classifier.pkl
+
+
+class ScanLabelRequest(BaseModel):
+    scan_ids: List[int] = Field(..., min_length=1, max_length=1000)
+    label: Optional[Literal[0, 1]]  # 1 phishing, 0 legitimate, None clears the label
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Guard for model management: X-Admin-Token must match CYPHER_ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model admin API is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
 
 
 @router.post("/ml/predict_payee_risk", response_model=UPIPredictionResponse)
@@ -48,16 +90,27 @@ async def predict_payee_risk(request: UPIPredictionRequest):
     Returns:
         Prediction with phishing probability and confidence
     """
-    if not ML_AVAILABLE:
+    tracing.mark("validation")
+    if not model_registry.available:
         raise HTTPException(
             status_code=503,
             detail="ML model not available. Please train the model first."
         )
     
     try:
-        result = predictor.predict(request.upi_id)
+        with tracing.span("scoring"):
+            if batcher is not None:
+                probability, model_version = await batcher.submit(request.upi_id)
+            else:
+                [(probability, model_version)] = await inference_executor.run(predict_with_version, [request.upi_id])
+        result = UPIPhishingPredictor.format_prediction(request.upi_id, probability)
         result['ml_available'] = True
+        result['model_version'] = model_version
         return result
+    except (InferenceSaturated, BatcherStopped) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except InferenceTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -68,7 +121,59 @@ async def predict_payee_risk(request: UPIPredictionRequest):
 @router.get("/ml/health")
 async def ml_health():
     """Check if ML model is loaded and ready"""
+    ml_available = model_registry.available
+    predictor = model_registry.predictor if ml_available else None
+    return {
+        **model_registry.stats(),
+        "parallelism": predictor.parallelism() if ml_available else None,
+        "cache": predictor.cache.stats() if ml_available else None,
+        "batcher": batcher.stats() if batcher is not None else None,
+        "executor": inference_executor.stats()
+    }
+
+
+@router.get("/ml/models", dependencies=[Depends(require_admin)])
+async def list_models():
+    """Published model versions and the one being served"""
     return {
-        "ml_available": ML_AVAILABLE,
-        "model_path": "ml/models/upi_classifier.pkl" if ML_AVAILABLE else None
+        "active_version": model_registry.active_version,
+        "model_version": model_registry.model_version,
+        "versions": list_versions(),
     }
+
+
+@router.post("/ml/models/activate", dependencies=[Depends(require_admin)])
+async def activate_model(request: ModelActivationRequest):
+    """Load and warm a version off the event loop, then swap it in without dropping requests"""
+    try:
+        model_version = await asyncio.to_thread(model_registry.activate, request.version)
+    except ModelStoreError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model activation failed: {e}")
+    return {"model_version": model_version, **model_registry.stats()}
+
+
+@router.post("/ml/models/rollback", dependencies=[Depends(require_admin)])
+async def rollback_model():
+    """Swap back to the previously served model"""
+    try:
+        model_version = await asyncio.to_thread(model_registry.rollback)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"model_version": model_version, **model_registry.stats()}
+
+
+@router.post("/ml/labels", dependencies=[Depends(require_admin)])
+async def label_scans(request: ScanLabelRequest, db: AsyncSession = Depends(get_async_db)):
+    """Record an analyst verdict on scans; ml/incremental_train.py picks up labels newer than its watermark"""
+    result = await db.execute(
+        update(ScanRecord)
+        .where(ScanRecord.id.in_(request.scan_ids))
+        .values(
+            analyst_label=request.label,
+            labelled_at=datetime.utcnow() if request.label is not None else None,
+        )
+    )
+    await db.commit()
+    return {"updated": result.rowcount, "label": request.label}
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, field_validator, model_validator
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Dict, List, Optional
+from datetime import date, datetime
 
 
 class TransactionInput(BaseModel):
@@ -74,3 +74,24 @@ class AnalysisResult(BaseModel):
     risk_label: str  # "safe", "warning", "danger"
     reasons: List[str]
     timestamp: datetime = datetime.now()
+    model_version: Optional[str] = None  # ML model that scored the payee (None: rules only)
+    # Packed reason codes for storage (app/services/reasons.py); never sent to clients
+    reason_codes: Optional[bytes] = Field(default=None, exclude=True)
+
+
+class DailyRiskTrend(BaseModel):
+    day: date
+    total: int
+    safe: int = 0
+    warning: int = 0
+    danger: int = 0
+    average_risk_score: float
+
+
+class AnalyticsSummary(BaseModel):
+    days: int
+    total_scans: int
+    average_risk_score: float
+    max_risk_score: float
+    by_label: Dict[str, int]  # risk_label -> count
+    daily: List[DailyRiskTrend]
@@ -0,0 +1,171 @@
+"""
+Scan analytics — per user, per day, per risk label rollups of scan_records.
+
+save_scans upserts the rollups in the same transaction as the scan rows, so the
+dashboard summary reads O(days) rollup rows instead of every scan.
+
+Backfill (or repair) existing data with:  python -m app.services.analytics
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.database import engine
+
+LABELS = ("safe", "warning", "danger")
+
+
+def aggregate_rows(rows: List[dict]) -> List[dict]:
+    """Collapse scan rows into one rollup delta per (user, day, label)"""
+    groups = {}
+    for row in rows:
+        key = (row["user_id"] or "", row["timestamp"].date(), row["risk_label"])
+        score = float(row["risk_score"])
+        group = groups.get(key)
+        if group is None:
+            groups[key] = {
+                "user_id": key[0],
+                "day": key[1],
+                "risk_label": key[2],
+                "scan_count": 1,
+                "score_sum": score,
+                "score_max": score,
+            }
+        else:
+            group["scan_count"] += 1
+            group["score_sum"] += score
+            group["score_max"] = max(group["score_max"], score)
+    return list(groups.values())
+
+
+async def upsert_rollups(db: AsyncSession, rows: List[dict]):
+    """Add scan rows to their rollups; the caller commits together with the scans"""
+    deltas = aggregate_rows(rows)
+    if not deltas:
+        return
+    Rollup = models.ScanDailyRollup
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert, greatest = (
+            (postgresql.insert, func.greatest) if dialect == "postgresql" else (sqlite.insert, func.max)
+        )
+        stmt = dialect_insert(Rollup).values(deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Rollup.user_id, Rollup.day, Rollup.risk_label],
+            set_={
+                "scan_count": Rollup.scan_count + stmt.excluded.scan_count,
+                "score_sum": Rollup.score_sum + stmt.excluded.score_sum,
+                "score_max": greatest(Rollup.score_max, stmt.excluded.score_max),
+            },
+        )
+        await db.execute(stmt)
+        return
+
+    # Other databases: update in place, insert the groups that did not exist yet
+    for delta in deltas:
+        result = await db.execute(
+            update(Rollup)
+            .where(
+                Rollup.user_id == delta["user_id"],
+                Rollup.day == delta["day"],
+                Rollup.risk_label == delta["risk_label"],
+            )
+            .values(
+                scan_count=Rollup.scan_count + delta["scan_count"],
+                score_sum=Rollup.score_sum + delta["score_sum"],
+                score_max=case(
+                    (Rollup.score_max < delta["score_max"], delta["score_max"]), else_=Rollup.score_max
+                ),
+            )
+        )
+        if result.rowcount == 0:
+            await db.execute(insert(Rollup).values(**delta))
+
+
+async def summarize(db: AsyncSession, user_id: Optional[str], days: int) -> dict:
+    """Label counts, score averages and a daily trend over the last `days` UTC days"""
+    Rollup = models.ScanDailyRollup
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+
+    query = select(
+        Rollup.day,
+        Rollup.risk_label,
+        func.sum(Rollup.scan_count).label("scan_count"),
+        func.sum(Rollup.score_sum).label("score_sum"),
+        func.max(Rollup.score_max).label("score_max"),
+    ).where(Rollup.day >= since)
+    # Without a user ID the summary covers all scans, like /history
+    if user_id is not None:
+        query = query.where(Rollup.user_id == user_id)
+    query = query.group_by(Rollup.day, Rollup.risk_label).order_by(Rollup.day)
+
+    by_label = {label: 0 for label in LABELS}
+    daily = {}
+    total = 0
+    score_sum = 0.0
+    score_max = 0.0
+    for r in (await db.execute(query)).all():
+        by_label[r.risk_label] = by_label.get(r.risk_label, 0) + r.scan_count
+        total += r.scan_count
+        score_sum += r.score_sum
+        score_max = max(score_max, r.score_max)
+
+        day = daily.setdefault(r.day, {"day": r.day, "total": 0, "score_sum": 0.0, **{label: 0 for label in LABELS}})
+        day["total"] += r.scan_count
+        day["score_sum"] += r.score_sum
+        if r.risk_label in LABELS:
+            day[r.risk_label] += r.scan_count
+
+    for day in daily.values():
+        day["average_risk_score"] = round(day.pop("score_sum") / day["total"], 2)
+
+    return {
+        "days": days,
+        "total_scans": total,
+        "average_risk_score": round(score_sum / total, 2) if total else 0.0,
+        "max_risk_score": score_max,
+        "by_label": by_label,
+        "daily": list(daily.values()),
+    }
+
+
+def rebuild_rollups() -> int:
+    """
+    Recompute all rollups from scan_records in one GROUP BY (idempotent).
+    Scans written while it runs may be miscounted; run it with writes paused.
+    """
+    Scan = models.ScanRecord
+    Rollup = models.ScanDailyRollup
+    user = func.coalesce(Scan.user_id, "")
+    day = func.date(Scan.timestamp)
+
+    grouped = (
+        select(
+            user,
+            day,
+            Scan.risk_label,
+            func.count(),
+            func.sum(Scan.risk_score),
+            func.max(Scan.risk_score),
+        )
+        .where(Scan.timestamp.is_not(None))
+        .group_by(user, day, Scan.risk_label)
+    )
+    with engine.begin() as conn:
+        conn.execute(delete(Rollup))
+        conn.execute(
+            insert(Rollup).from_select(
+                ["user_id", "day", "risk_label", "scan_count", "score_sum", "score_max"], grouped
+            )
+        )
+        return conn.execute(select(func.count()).select_from(Rollup)).scalar_one()
+
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine, tables=[models.ScanDailyRollup.__table__])
+    print(f"✅ Rebuilt {rebuild_rollups()} daily rollup rows from scan_records")
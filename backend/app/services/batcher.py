@@ -0,0 +1,172 @@
+"""
+Async micro-batching for ML predictions.
+
+Concurrent requests each submit one UPI ID; requests arriving within a short
+window (or until max_batch items are queued) are scored with a single batched
+feature-extraction + predict_proba call and the results fanned back out.
+Every submitted call resolves: with its result, the batch's error, or
+BatcherStopped when the batcher shuts down before scoring it.
+"""
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+from app.services import tracing
+
+
+class BatcherStopped(Exception):
+    """The batcher was stopped before this ID was scored"""
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item predictions into batched model calls"""
+
+    def __init__(self, predict_batch: Callable[[List[str]], Sequence[Any]],
+                 window_ms: float = 2.0, max_batch: int = 64,
+                 runner: Optional[Callable[..., Awaitable]] = None):
+        """
+        predict_batch returns one result per ID, in order (each caller gets its own).
+        runner(fn, *args), when given, executes predict_batch off the event loop
+        (e.g. InferenceExecutor.run); batches are then dispatched concurrently.
+        """
+        self.predict_batch = predict_batch
+        self.runner = runner
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self._in_progress = set()
+        self._waiting = set()   # futures of every submit() not yet resolved
+
+        # Metrics
+        self.submitted = 0
+        self.dispatched = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.batch_size_histogram = {}  # power-of-two upper bound -> count
+
+    def _ensure_started(self):
+        """Start the collector task on the running loop (restarting if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # Empty context: the collector must not inherit the first caller's request trace
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+
+    async def submit(self, upi_id: str) -> Any:
+        """Queue one UPI ID and wait for its result from predict_batch"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        caller = (tracing.current_trace(), tracing.current_parent())
+        self._queue.put_nowait((upi_id, future, time.perf_counter(), caller))
+        self._waiting.add(future)
+        future.add_done_callback(self._waiting.discard)
+        self.submitted += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+
+            # Give concurrent requests one window to join, unless already full
+            if self.window > 0 and queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            if self.runner is None:
+                await self._dispatch(batch)
+            else:
+                task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+                self._in_progress.add(task)
+                task.add_done_callback(self._in_progress.discard)
+
+    async def _dispatch(self, batch):
+        # Skip callers that went away while queued
+        batch = [entry for entry in batch if not entry[1].done()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        for _, _, queued_at, _ in batch:
+            wait = started - queued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        self._record_batch(len(batch))
+
+        upi_ids = [upi_id for upi_id, _, _, _ in batch]
+        # Stages of the shared model call are copied into every traced caller's trace
+        batch_trace = tracing.Trace() if any(caller[0] for _, _, _, caller in batch) else None
+        try:
+            with tracing.activate(batch_trace):
+                if self.runner is None:
+                    results = self.predict_batch(upi_ids)
+                else:
+                    results = await self.runner(self.predict_batch, upi_ids)
+            results = list(results)
+            if len(results) != len(batch):
+                raise RuntimeError(f"predict_batch returned {len(results)} results for {len(batch)} IDs")
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _, (trace, parent)), result in zip(batch, results):
+            if trace is not None and batch_trace is not None:
+                trace.adopt(batch_trace, parent)
+            if not future.done():
+                future.set_result(result)
+
+    def _record_batch(self, size: int):
+        self.batches += 1
+        self.dispatched += size
+        bucket = 1 << (size - 1).bit_length()
+        self.batch_size_histogram[bucket] = self.batch_size_histogram.get(bucket, 0) + 1
+
+    async def stop(self):
+        """
+        Stop collecting, let batches already dispatched finish, and fail every
+        call still queued (or waiting out a window) with BatcherStopped
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_progress:
+            await asyncio.gather(*self._in_progress, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            self._queue.get_nowait()
+        for future in list(self._waiting):
+            if not future.done():
+                future.set_exception(BatcherStopped("Prediction batcher stopped"))
+
+    def stats(self) -> dict:
+        """Queue depth, batch size distribution and added wait time"""
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": round(self.dispatched / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": {f"<={size}": count for size, count in sorted(self.batch_size_histogram.items())},
+            "avg_wait_ms": round(self.total_wait / self.dispatched * 1000.0, 3) if self.dispatched else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000.0, 3),
+        }
@@ -1,4 +1,103 @@
-def analyze_transaction(features: dict) -> dict:
+import logging
+import time
+import numpy as np
+from typing import List
+
+from app.services import reasons as rc
+from app.services.metrics import ML_FALLBACKS, observe_stage
+from app.services.reasons import ReasonCode, render_reasons
+from app.services.registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+
+# --- Base Weights (UPI-specific reasoning) ---
+WEIGHTS = {
+    "amount_risk": 0.30,       # Large transfers are strong fraud signals
+    "payee_risk": 0.25,        # Unknown / flagged receiver
+    "frequency_risk": 0.20,    # Rapid transaction velocity
+    "timing_risk": 0.15,       # Odd hours (night scams)
+    "device_risk": 0.10        # New / untrusted device
+}
+
+TRUSTED_PROVIDERS = ["paytm", "phonepe", "googlepay", "gpay", "amazonpay", "bhim"]
+
+
+def _collect_reasons(amount_risk, payee_risk, frequency_risk, timing_risk, device_risk,
+                     amount_value, hour_of_day, payee_id, risk_score) -> List[ReasonCode]:
+    """
+    Build the explanation for one scored transaction as reason codes.
+    Shared by the single and batch paths so both produce identical reasons;
+    render_reasons turns the codes into text (see app/services/reasons.py).
+    """
+    reasons = []
+    
+    # --- Amplification Patterns ---
+    if timing_risk > 0.6 and amount_risk > 0.5:
+        reasons.append((rc.AMPLIFIED_NIGHT_AMOUNT, None))
+    
+    if payee_risk > 0.6 and amount_risk > 0.5:
+        reasons.append((rc.AMPLIFIED_UNVERIFIED_AMOUNT, None))
+    
+    if frequency_risk > 0.7:
+        reasons.append((rc.AMPLIFIED_VELOCITY, None))
+    
+    # --- Enhanced Explainability with Context ---
+    
+    # Amount-specific reasons
+    if amount_risk > 0.6:
+        if amount_value is not None:
+            # Round number detection (scammers often use round amounts)
+            if amount_value >= 5000 and amount_value % 1000 == 0:
+                reasons.append((rc.AMOUNT_ROUND, amount_value))
+            elif amount_value > 10000:
+                reasons.append((rc.AMOUNT_HIGH_VALUE, amount_value))
+            else:
+                reasons.append((rc.AMOUNT_UNUSUAL, amount_value))
+        else:
+            reasons.append((rc.AMOUNT_HIGH, None))
+    
+    # Payee-specific reasons
+    if payee_risk > 0.5:
+        if payee_id is not None and "@" in payee_id:
+            domain = payee_id.split("@")[1]
+            # Check for known trusted providers
+            if not any(provider in domain.lower() for provider in TRUSTED_PROVIDERS):
+                reasons.append((rc.PAYEE_UNVERIFIED_PROVIDER, None))
+            else:
+                reasons.append((rc.PAYEE_FIRST_TIME, None))
+        else:
+            reasons.append((rc.PAYEE_SUSPICIOUS, None))
+    
+    # Timing-specific reasons
+    if timing_risk > 0.6:
+        if hour_of_day is not None:
+            if hour_of_day >= 23 or hour_of_day < 6:
+                reasons.append((rc.TIMING_NIGHT, hour_of_day))
+            else:
+                reasons.append((rc.TIMING_UNUSUAL, hour_of_day))
+        else:
+            reasons.append((rc.TIMING_UNUSUAL_HOURS, None))
+    
+    # Frequency-specific reasons
+    if frequency_risk > 0.5:
+        reasons.append((rc.FREQUENCY_RAPID, None))
+    
+    # Device-specific reasons
+    if device_risk > 0.5:
+        reasons.append((rc.DEVICE_UNTRUSTED, None))
+    
+    # --- Ensure at least one reason (MANDATORY) ---
+    if not reasons:
+        if risk_score < 0.30:
+            reasons.append((rc.PATTERN_NORMAL, None))
+        else:
+            reasons.append((rc.MINOR_FACTORS, None))
+    
+    return reasons
+
+
+def analyze_transaction(features: dict, predictor=None) -> dict:
     """
     Cypher – Enhanced Explainable UPI Threat Detection Logic
     NOW WITH ML-POWERED PHISHING DETECTION!
@@ -24,21 +123,19 @@ def analyze_transaction(features: dict) -> dict:
     {
         "risk_score": int,         # 0–100 (MANDATORY INTEGER)
         "risk_label": "safe" | "warning" | "danger",
-        "reasons": [string]        # Always at least one reason
+        "reasons": [string],       # Always at least one reason
+        "reason_codes": [(code, param)], # Same reasons, compact (see reasons.py)
+        "model_version": str | None      # ML model that scored the payee, if any
     }
+    
+    predictor defaults to the registry's current model (warm-up passes its own).
     """
     
-    # --- ML Model Integration ---
-    try:
-        import sys
-        import os
-        # Add parent directory to path to import ml module
-        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-        from ml.predictor import predict_phishing_probability
-        ml_available = True
-    except Exception as e:
-        print(f"⚠️  ML model not available: {e}")
-        ml_available = False
+    # --- ML Model Integration (shared registry; one model for the whole call) ---
+    if predictor is None and model_registry.available:
+        predictor = model_registry.predictor
+    ml_available = predictor is not None
+    model_version = None
     
     # --- Extract Required Features (with safe defaults) ---
     amount_risk = features.get("amount_risk", 0.0)
@@ -55,29 +152,26 @@ def analyze_transaction(features: dict) -> dict:
     # --- ML-Enhanced Payee Risk ---
     if ml_available and payee_id:
         try:
-            ml_phishing_prob = predict_phishing_probability(payee_id)
+            ml_phishing_prob = predictor.predict_phishing_probability(payee_id)
+            model_version = predictor.model_version
             # Blend rule-based (40%) with ML (60%)
             original_payee_risk = payee_risk
             payee_risk = (payee_risk * 0.4) + (ml_phishing_prob * 0.6)
             
-            print(f"🤖 ML Enhancement: {payee_id}")
-            print(f"   Rule-based risk: {original_payee_risk:.2f}")
-            print(f"   ML phishing prob: {ml_phishing_prob:.2f}")
-            print(f"   Final payee_risk: {payee_risk:.2f}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "ML enhancement %s: rule-based %.2f, ML %.2f, final payee_risk %.2f",
+                    payee_id, original_payee_risk, ml_phishing_prob, payee_risk,
+                    extra={"event": "ml_enhancement", "payee_id": payee_id,
+                           "rule_payee_risk": original_payee_risk, "ml_phishing_prob": ml_phishing_prob,
+                           "payee_risk": payee_risk, "model_version": model_version},
+                )
         except Exception as e:
-            print(f"⚠️  ML prediction failed: {e}")
-    
+            ML_FALLBACKS.labels("single").inc()
+            logger.warning("ML prediction failed, scoring rule-only: %s", e,
+                           extra={"event": "ml_fallback", "payee_id": payee_id})
     
-    # --- Base Weights (UPI-specific reasoning) ---
-    WEIGHTS = {
-        "amount_risk": 0.30,       # Large transfers are strong fraud signals
-        "payee_risk": 0.25,        # Unknown / flagged receiver
-        "frequency_risk": 0.20,    # Rapid transaction velocity
-        "timing_risk": 0.15,       # Odd hours (night scams)
-        "device_risk": 0.10        # New / untrusted device
-    }
-    
-    reasons = []
+    rules_start = time.perf_counter()
     
     # --- Calculate Base Weighted Risk Score ---
     base_risk = (
@@ -94,17 +188,14 @@ def analyze_transaction(features: dict) -> dict:
     # Late night + high amount = scam pattern
     if timing_risk > 0.6 and amount_risk > 0.5:
         amplification_factor *= 1.3
-        reasons.append("High-risk pattern: Large transaction during unusual hours")
     
     # Unknown payee + high amount = potential fraud
     if payee_risk > 0.6 and amount_risk > 0.5:
         amplification_factor *= 1.25
-        reasons.append("High-risk pattern: Large payment to unverified recipient")
     
     # Rapid frequency = velocity attack
     if frequency_risk > 0.7:
         amplification_factor *= 1.15
-        reasons.append("Suspicious velocity: Multiple rapid transactions detected")
     
     # Apply amplification
     risk_score = base_risk * amplification_factor
@@ -112,52 +203,6 @@ def analyze_transaction(features: dict) -> dict:
     # Clamp to valid range
     risk_score = max(0.0, min(1.0, risk_score))
     
-    # --- Enhanced Explainability with Context ---
-    
-    # Amount-specific reasons
-    if amount_risk > 0.6:
-        if amount_value is not None:
-            # Round number detection (scammers often use round amounts)
-            if amount_value >= 5000 and amount_value % 1000 == 0:
-                reasons.append(f"₹{amount_value:,.0f} is a round amount (common in scams)")
-            elif amount_value > 10000:
-                reasons.append(f"High-value transaction: ₹{amount_value:,.0f}")
-            else:
-                reasons.append(f"Transaction amount: ₹{amount_value:,.0f} flagged as unusual")
-        else:
-            reasons.append("Unusually high transaction amount")
-    
-    # Payee-specific reasons
-    if payee_risk > 0.5:
-        if payee_id is not None and "@" in payee_id:
-            domain = payee_id.split("@")[1]
-            # Check for known trusted providers
-            trusted_providers = ["paytm", "phonepe", "googlepay", "gpay", "amazonpay", "bhim"]
-            if not any(provider in domain.lower() for provider in trusted_providers):
-                reasons.append(f"Unverified payment provider: @{domain}")
-            else:
-                reasons.append(f"First-time transaction to {payee_id}")
-        else:
-            reasons.append("Payee has suspicious or unverified history")
-    
-    # Timing-specific reasons
-    if timing_risk > 0.6:
-        if hour_of_day is not None:
-            if hour_of_day >= 23 or hour_of_day < 6:
-                reasons.append(f"Transaction at {hour_of_day:02d}:00 (high-risk hours: 11 PM - 6 AM)")
-            else:
-                reasons.append(f"Transaction at unusual time: {hour_of_day:02d}:00")
-        else:
-            reasons.append("Transaction initiated at unusual hours")
-    
-    # Frequency-specific reasons
-    if frequency_risk > 0.5:
-        reasons.append("Rapid transaction frequency detected")
-    
-    # Device-specific reasons
-    if device_risk > 0.5:
-        reasons.append("Transaction from a new or untrusted device")
-    
     # --- Risk Label Mapping (Conservative Thresholds) ---
     if risk_score >= 0.60:
         risk_label = "danger"
@@ -166,18 +211,115 @@ def analyze_transaction(features: dict) -> dict:
     else:
         risk_label = "safe"
     
-    # --- Ensure at least one reason (MANDATORY) ---
-    if not reasons:
-        if risk_score < 0.30:
-            reasons.append("Transaction pattern appears normal")
-        else:
-            reasons.append("Multiple minor risk factors detected")
+    reason_codes = _collect_reasons(
+        amount_risk, payee_risk, frequency_risk, timing_risk, device_risk,
+        amount_value, hour_of_day, payee_id, risk_score
+    )
     
     # --- Convert to 0-100 Integer (MANDATORY) ---
     risk_score_int = int(round(risk_score * 100))
     
-    return {
+    result = {
         "risk_score": risk_score_int,  # 0-100 integer
         "risk_label": risk_label,
-        "reasons": reasons
+        "reasons": render_reasons(reason_codes, payee_id),
+        "reason_codes": reason_codes,
+        "model_version": model_version
+    }
+    observe_stage("rule_scoring", time.perf_counter() - rules_start)
+    return result
+
+
+def analyze_transactions_batch(features_list: List[dict]) -> List[dict]:
+    """
+    Score many transactions in one pass.
+    
+    Same contract as analyze_transaction, applied element-wise: the weighted
+    sum, amplification factors and thresholds run as NumPy array operations
+    over the whole batch, and the ML model is queried once for all distinct
+    payee IDs. Results are identical to calling analyze_transaction per item.
+    """
+    n = len(features_list)
+    if n == 0:
+        return []
+    
+    # --- ML Model Integration (shared registry; one model for the whole batch) ---
+    predictor = model_registry.predictor if model_registry.available else None
+    model_version = None
+    
+    # --- Column Arrays (same safe defaults as the single path) ---
+    cols = {
+        name: np.array([features.get(name, 0.0) for features in features_list], dtype=np.float64)
+        for name in WEIGHTS
     }
+    amount_risk = cols["amount_risk"]
+    payee_risk = cols["payee_risk"]
+    frequency_risk = cols["frequency_risk"]
+    timing_risk = cols["timing_risk"]
+    device_risk = cols["device_risk"]
+    
+    payee_ids = [features.get("payee_id", None) for features in features_list]
+    
+    # --- ML-Enhanced Payee Risk (one prediction per distinct payee) ---
+    distinct_ids = list(dict.fromkeys(pid for pid in payee_ids if pid))
+    if predictor is not None and distinct_ids:
+        try:
+            probs = predictor.predict_phishing_probabilities(distinct_ids)
+            prob_by_id = dict(zip(distinct_ids, probs))
+            has_ml = np.array([bool(pid) for pid in payee_ids])
+            ml_phishing_prob = np.array([prob_by_id.get(pid, 0.0) if pid else 0.0 for pid in payee_ids])
+            # Blend rule-based (40%) with ML (60%)
+            payee_risk = np.where(has_ml, (payee_risk * 0.4) + (ml_phishing_prob * 0.6), payee_risk)
+            model_version = predictor.model_version
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("ML enhancement: batch of %d (%d distinct payees)", n, len(distinct_ids),
+                             extra={"event": "ml_enhancement", "batch_size": n,
+                                    "distinct_payees": len(distinct_ids), "model_version": model_version})
+        except Exception as e:
+            ML_FALLBACKS.labels("batch").inc(sum(1 for pid in payee_ids if pid))
+            logger.warning("ML prediction failed for batch of %d, scoring rule-only: %s", n, e,
+                           extra={"event": "ml_fallback", "batch_size": n})
+    
+    rules_start = time.perf_counter()
+    
+    # --- Calculate Base Weighted Risk Score ---
+    base_risk = (
+        amount_risk * WEIGHTS["amount_risk"] +
+        payee_risk * WEIGHTS["payee_risk"] +
+        frequency_risk * WEIGHTS["frequency_risk"] +
+        timing_risk * WEIGHTS["timing_risk"] +
+        device_risk * WEIGHTS["device_risk"]
+    )
+    
+    # --- Risk Amplification (applied in the same order as the single path) ---
+    amplification_factor = np.ones(n)
+    amplification_factor = np.where((timing_risk > 0.6) & (amount_risk > 0.5), amplification_factor * 1.3, amplification_factor)
+    amplification_factor = np.where((payee_risk > 0.6) & (amount_risk > 0.5), amplification_factor * 1.25, amplification_factor)
+    amplification_factor = np.where(frequency_risk > 0.7, amplification_factor * 1.15, amplification_factor)
+    
+    risk_score = np.clip(base_risk * amplification_factor, 0.0, 1.0)
+    
+    # --- Risk Label Mapping (Conservative Thresholds) ---
+    risk_label = np.where(risk_score >= 0.60, "danger", np.where(risk_score >= 0.30, "warning", "safe"))
+    
+    # --- Convert to 0-100 Integer (round-half-even, like round()) ---
+    risk_score_int = np.rint(risk_score * 100).astype(np.int64)
+    
+    results = []
+    for i, features in enumerate(features_list):
+        reason_codes = _collect_reasons(
+            float(amount_risk[i]), float(payee_risk[i]), float(frequency_risk[i]),
+            float(timing_risk[i]), float(device_risk[i]),
+            features.get("amount_value", None), features.get("hour_of_day", None),
+            payee_ids[i], float(risk_score[i])
+        )
+        results.append({
+            "risk_score": int(risk_score_int[i]),
+            "risk_label": str(risk_label[i]),
+            "reasons": render_reasons(reason_codes, payee_ids[i]),
+            "reason_codes": reason_codes,
+            "model_version": model_version if payee_ids[i] else None
+        })
+    
+    observe_stage("rule_scoring", time.perf_counter() - rules_start)
+    return results
@@ -0,0 +1,166 @@
+"""
+Inference execution layer.
+
+CPU-bound scoring (feature extraction, predict_proba, rule evaluation) runs in
+a bounded thread or process pool so it never blocks the event loop serving
+/health and /history. Callers beyond the pool size plus the queue limit are
+rejected immediately, and each task has a timeout. A timed-out task keeps its
+slot until the worker actually finishes it (a queued one is cancelled), so
+sustained timeouts can't grow the pool's backlog past the limit.
+"""
+import os
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from app.services.metrics import INFERENCE_IN_FLIGHT
+
+# "thread" (default) or "process"
+INFERENCE_POOL = os.environ.get("CYPHER_INFERENCE_POOL", "thread").lower()
+INFERENCE_WORKERS = int(os.environ.get("CYPHER_INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Tasks allowed to wait for a free worker before new ones are rejected
+INFERENCE_QUEUE_LIMIT = int(os.environ.get("CYPHER_INFERENCE_QUEUE_LIMIT", "64"))
+INFERENCE_TIMEOUT = float(os.environ.get("CYPHER_INFERENCE_TIMEOUT", "5"))
+
+
+class InferenceSaturated(Exception):
+    """All workers are busy and the wait queue is full"""
+
+
+class InferenceTimeout(Exception):
+    """A task did not finish within the configured timeout"""
+
+
+def _preload_model():
+    """Worker initializer: load the model once per worker process, not per task"""
+    from app.logging_config import configure_logging
+    from app.services.registry import model_registry
+    configure_logging()  # no-op in the server process; starts the log writer in pool processes
+    model_registry.load(warmup=False)
+    # Pool processes follow ACTIVE like the server (already running in thread mode)
+    model_registry.start_watcher()
+
+
+def _ready():
+    return True
+
+
+class InferenceExecutor:
+    """Runs blocking inference callables in a bounded pool from async code"""
+
+    def __init__(self, mode: str = "thread", workers: int = 4, queue_limit: int = 64, timeout: float = 5.0):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference pool: {mode}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self.timeout = timeout
+        self._pool = None
+        self._count_lock = threading.Lock()  # in_flight is released from pool threads
+
+        # Saturation metrics
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_preload_model)
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="cypher-inference",
+                    initializer=_preload_model,
+                )
+        return self._pool
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) in the pool and await its result.
+        In process mode fn and args must be picklable (module-level functions).
+
+        Raises:
+            InferenceSaturated: pool and queue are full
+            InferenceTimeout: task exceeded the timeout (the worker finishes it in the
+                background and its slot stays taken until then)
+        """
+        with self._count_lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise InferenceSaturated(
+                    f"Inference pool saturated ({self.in_flight} tasks in flight)"
+                )
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        INFERENCE_IN_FLIGHT.inc()
+
+        if self.mode == "thread":
+            # Carry the caller's context (request trace) into the worker thread
+            fn = functools.partial(contextvars.copy_context().run, fn)
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the work really ends (or is cancelled while queued), not when we stop waiting
+        future.add_done_callback(self._release)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise InferenceTimeout(f"Inference timed out after {self.timeout}s")
+        except Exception:
+            self.failed += 1
+            raise
+
+    def _release(self, future=None):
+        with self._count_lock:
+            self.in_flight -= 1
+        INFERENCE_IN_FLIGHT.dec()
+
+    async def warm_up(self):
+        """Start every worker now (running the initializer) instead of on the first requests"""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        await asyncio.gather(*(loop.run_in_executor(pool, _ready) for _ in range(self.workers)))
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool (a later run() starts a fresh one)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        """Pool usage and saturation counters"""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "active": min(self.in_flight, self.workers),
+            "queued": max(0, self.in_flight - self.workers),
+            "max_in_flight": self.max_in_flight,
+            "utilization": round(min(self.in_flight, self.workers) / self.workers, 3),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+# Shared by /analyze and the ML router
+inference_executor = InferenceExecutor(
+    mode=INFERENCE_POOL,
+    workers=INFERENCE_WORKERS,
+    queue_limit=INFERENCE_QUEUE_LIMIT,
+    timeout=INFERENCE_TIMEOUT,
+)
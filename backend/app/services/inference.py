@@ -1,13 +1,13 @@
+from typing import List
 from app.schemas import TransactionInput, AnalysisResult
 from datetime import datetime
 from app.services.cypher_ml_logic import analyze_transaction as ml_analyze
+from app.services.cypher_ml_logic import analyze_transactions_batch as ml_analyze_batch
+from app.services.reasons import pack_reasons
 
-def analyze_transaction(data: TransactionInput) -> AnalysisResult:
-    """
-    Orchestrates the ML analysis.
-    Converts Pydantic model to dict, calls ML logic, and returns result.
-    """
-    # 1. Build full feature dict — include optional context for ML-enhanced analysis
+
+def _build_features(data: TransactionInput) -> dict:
+    """Convert a validated TransactionInput into the feature dict the ML logic expects"""
     features = {
         "amount_risk": data.amount_risk,
         "payee_risk": data.payee_risk,
@@ -24,6 +24,17 @@ def analyze_transaction(data: TransactionInput) -> AnalysisResult:
     if data.hour_of_day is not None:
         features["hour_of_day"] = data.hour_of_day
 
+    return features
+
+
+def analyze_transaction(data: TransactionInput) -> AnalysisResult:
+    """
+    Orchestrates the ML analysis.
+    Converts Pydantic model to dict, calls ML logic, and returns result.
+    """
+    # 1. Build full feature dict — include optional context for ML-enhanced analysis
+    features = _build_features(data)
+
     # 2. Call the ML Logic (Separation of Concerns)
     result = ml_analyze(features)
 
@@ -32,6 +43,28 @@ def analyze_transaction(data: TransactionInput) -> AnalysisResult:
         risk_score=result["risk_score"],
         risk_label=result["risk_label"],
         reasons=result["reasons"],
+        reason_codes=pack_reasons(result["reason_codes"]),
+        model_version=result["model_version"],
         timestamp=datetime.now()
     )
 
+
+def analyze_transactions(batch: List[TransactionInput]) -> List[AnalysisResult]:
+    """
+    Batch counterpart of analyze_transaction.
+    Scores the whole list in one vectorized pass; results keep input order.
+    """
+    results = ml_analyze_batch([_build_features(data) for data in batch])
+
+    now = datetime.now()
+    return [
+        AnalysisResult(
+            risk_score=result["risk_score"],
+            risk_label=result["risk_label"],
+            reasons=result["reasons"],
+            reason_codes=pack_reasons(result["reason_codes"]),
+            model_version=result["model_version"],
+            timestamp=now
+        )
+        for result in results
+    ]
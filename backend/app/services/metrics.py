@@ -0,0 +1,208 @@
+"""
+Prometheus metrics, served at GET /metrics.
+
+Histograms: request latency per route, and per-stage latency for feature
+extraction, model inference, rule scoring and the DB commit. Counters: risk
+labels, ML fallbacks (scans scored without the model after a prediction
+error), rate-limit rejections and scans dropped by the write-behind queue.
+Gauges: prediction cache entries, inference pool and DB pool usage,
+write-behind queue depth.
+
+Every update is an in-memory increment, cheap enough to leave on. With several
+uvicorn workers (or CYPHER_INFERENCE_POOL=process) set PROMETHEUS_MULTIPROC_DIR
+to an empty directory before starting the server: each process then writes its
+samples to a file there and /metrics aggregates all of them.
+
+The point-in-time gauges are sampled when /metrics is scraped, not per request.
+In multiprocess mode the scrape only reaches one worker, so every worker also
+resamples its own gauges every CYPHER_METRICS_REFRESH_SECONDS (default 5) from
+a daemon thread.
+"""
+import logging
+import os
+import threading
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+
+from app.services.tracing import record_stage
+
+logger = logging.getLogger(__name__)
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+GAUGE_REFRESH_SECONDS = float(os.environ.get("CYPHER_METRICS_REFRESH_SECONDS", "5"))
+
+# Stages run from tens of microseconds (rules) to seconds (large batches)
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+REQUEST_SECONDS = Histogram(
+    "cypher_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "cypher_stage_duration_seconds",
+    "Latency of one scoring stage: feature_extraction, inference, rule_scoring, db_commit",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+RISK_LABELS = Counter("cypher_risk_labels", "Scans by risk label", ["label"])
+ML_FALLBACKS = Counter(
+    "cypher_ml_fallbacks", "Scans scored rule-only because the ML prediction failed", ["path"],
+)
+RATE_LIMITED = Counter("cypher_rate_limited_requests", "Requests rejected by the rate limiter", ["route"])
+WRITE_BEHIND_DROPPED = Counter(
+    "cypher_write_behind_dropped_scans",
+    "Scans the write-behind queue dropped: queue_full (enqueue timed out) or flush_failed (retries exhausted)",
+    ["reason"],
+)
+
+# Summed over live processes in multiprocess mode
+CACHE_ENTRIES = Gauge(
+    "cypher_prediction_cache_entries", "Entries in the prediction cache", multiprocess_mode="livesum",
+)
+INFERENCE_IN_FLIGHT = Gauge(
+    "cypher_inference_in_flight", "Inference tasks running or queued", multiprocess_mode="livesum",
+)
+INFERENCE_WORKERS = Gauge(
+    "cypher_inference_workers", "Inference pool size", multiprocess_mode="livesum",
+)
+DB_CONNECTIONS_IN_USE = Gauge(
+    "cypher_db_connections_in_use", "Async DB pool connections checked out", multiprocess_mode="livesum",
+)
+WRITE_BEHIND_QUEUE = Gauge(
+    "cypher_write_behind_queue_depth", "Scans waiting for the write-behind flusher", multiprocess_mode="livesum",
+)
+
+_stage_children = {}
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record one stage duration in the histogram and the request trace (also the predictor's on_stage hook)"""
+    child = _stage_children.get(stage)
+    if child is None:
+        child = _stage_children[stage] = STAGE_SECONDS.labels(stage)
+    child.observe(seconds)
+    record_stage(stage, seconds)
+
+
+class timed_stage:
+    """Context manager: `with timed_stage("db_commit"): ...`"""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def count_labels(results):
+    """Count the risk label of each scored result"""
+    for result in results:
+        RISK_LABELS.labels(result.risk_label).inc()
+
+
+def refresh_gauges():
+    """Sample the point-in-time gauges; called on scrape (and periodically in multiprocess mode)"""
+    from app.database import async_engine
+    from app.services.executor import inference_executor
+    from app.services.persistence import scan_writer
+    from app.services.registry import model_registry
+
+    predictor = model_registry._predictor
+    CACHE_ENTRIES.set(len(predictor.cache) if predictor is not None else 0)
+    INFERENCE_WORKERS.set(inference_executor.workers)
+    checkedout = getattr(async_engine.pool, "checkedout", None)
+    DB_CONNECTIONS_IN_USE.set(checkedout() if checkedout else 0)
+    WRITE_BEHIND_QUEUE.set(scan_writer.stats()["queue_depth"])
+
+
+_refresher = None
+
+
+def start_gauge_refresher(interval: float = GAUGE_REFRESH_SECONDS):
+    """In multiprocess mode, keep this worker's gauges current from a daemon thread (idempotent)"""
+    global _refresher
+    if not MULTIPROCESS or interval <= 0 or _refresher is not None:
+        return
+
+    def refresh_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh_gauges()
+            except Exception as e:
+                logger.warning("Sampling metrics gauges failed: %s", e)
+
+    _refresher = threading.Thread(target=refresh_loop, name="cypher-gauge-refresher", daemon=True)
+    _refresher.start()
+
+
+def render_metrics():
+    """(body, content type) in the Prometheus text format, across processes in multiprocess mode"""
+    refresh_gauges()
+    registry = REGISTRY
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drop this process's live gauges from the shared directory on shutdown"""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def route_label(scope) -> str:
+    """Bounded route label: the request path for fixed routes, the template for parameterized ones"""
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # The matched route may be the router's own, without the include_router prefix
+    return route.path if getattr(route, "param_convertors", None) else scope["path"]
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every HTTP request, labelled by route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.labels(scope["method"], route_label(scope), str(status)).observe(
+                time.perf_counter() - start
+            )
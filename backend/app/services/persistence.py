@@ -0,0 +1,219 @@
+"""
+Scan persistence — builds scan_records rows and writes them with one bulk INSERT,
+either inline or through the optional write-behind queue.
+"""
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.database import AsyncSessionLocal
+from app.services.analytics import upsert_rollups
+from app.services.metrics import WRITE_BEHIND_DROPPED, timed_stage
+from app.schemas import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+def scan_row(payee_id: Optional[str], result: AnalysisResult, user_id: Optional[str]) -> dict:
+    """Column values for one ScanRecord"""
+    return {
+        "upi_id": payee_id,
+        "risk_score": result.risk_score,
+        "risk_label": result.risk_label,
+        # Compact codes when available; JSON text only for results without them
+        "reasons": None if result.reason_codes is not None else json.dumps(result.reasons),
+        "reason_codes": result.reason_codes,
+        "user_id": user_id,  # Clerk user ID from frontend header
+        "timestamp": datetime.utcnow(),
+    }
+
+
+async def save_scans(db: AsyncSession, rows: List[dict]):
+    """Insert all rows in a single statement and update their daily rollups in the same commit"""
+    if not rows:
+        return
+    with timed_stage("db_commit"):
+        await db.execute(insert(models.ScanRecord), rows)
+        await upsert_rollups(db, rows)
+        await db.commit()
+
+
+# ===== WRITE-BEHIND MODE =====
+# Rows go onto a bounded in-memory queue and a background task bulk-inserts
+# them, so /analyze responds without waiting on the database. This is lossy:
+# rows are dropped when the queue stays full past the enqueue timeout, when a
+# flush still fails after its retries, or if the process dies before a flush.
+# Drops are counted in cypher_write_behind_dropped_scans and /health.
+WRITE_BEHIND = os.environ.get("CYPHER_WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get("CYPHER_WRITE_BEHIND_QUEUE_SIZE", "10000"))
+WRITE_BEHIND_FLUSH_MS = float(os.environ.get("CYPHER_WRITE_BEHIND_FLUSH_MS", "200"))
+WRITE_BEHIND_BATCH_ROWS = int(os.environ.get("CYPHER_WRITE_BEHIND_BATCH_ROWS", "500"))
+# How long a request waits for queue space before its rows are dropped
+WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.environ.get("CYPHER_WRITE_BEHIND_ENQUEUE_TIMEOUT", "0.5"))
+WRITE_BEHIND_MAX_RETRIES = int(os.environ.get("CYPHER_WRITE_BEHIND_MAX_RETRIES", "3"))
+
+_STOP = object()
+
+
+class ScanWriter:
+    """
+    Buffers scan rows and flushes them with bulk inserts every N ms or M rows.
+
+    Lossy by design: rows that can't be queued within enqueue_timeout, or whose
+    flush fails max_retries + 1 times, are dropped (counted, never raised), and
+    rows still queued when the process is killed are lost.
+    """
+
+    def __init__(self, session_factory, max_queue: int = 10000, flush_interval_ms: float = 200,
+                 batch_rows: int = 500, enqueue_timeout: float = 0.5, max_retries: int = 3):
+        self.session_factory = session_factory
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_rows = max(1, batch_rows)
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+
+        self._queue = None
+        self._task = None
+
+        # Counters
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.retried = 0
+        self.dropped = 0
+        self.dropped_queue_full = 0
+        self.dropped_flush_failed = 0
+        self.backpressure_waits = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Start the background flusher on the running loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def enqueue(self, rows: List[dict]):
+        """
+        Queue rows for writing. When the queue is full the caller waits up to
+        enqueue_timeout for space (backpressure); rows still not queued are dropped.
+        """
+        dropped = 0
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self.backpressure_waits += 1
+                try:
+                    await asyncio.wait_for(self._queue.put(row), timeout=self.enqueue_timeout)
+                except asyncio.TimeoutError:
+                    dropped += 1
+                    continue
+            self.enqueued += 1
+        if dropped:
+            self._count_dropped("queue_full", dropped)
+            logger.warning("Write-behind queue full, dropped %d scans", dropped)
+
+    def _count_dropped(self, reason: str, n: int):
+        self.dropped += n
+        if reason == "queue_full":
+            self.dropped_queue_full += n
+        else:
+            self.dropped_flush_failed += n
+        WRITE_BEHIND_DROPPED.labels(reason).inc(n)
+
+    async def _run(self):
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            batch = [] if item is _STOP else [item]
+            stopping = item is _STOP
+
+            # Wait one interval for more rows, unless a full batch is already queued
+            if not stopping and queue.qsize() < self.batch_rows - 1:
+                await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.batch_rows and not queue.empty():
+                item = queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    continue
+                batch.append(item)
+
+            if batch:
+                await self._flush(batch)
+
+            # Shutdown: drain whatever is left before exiting
+            while stopping and not queue.empty():
+                rest = [queue.get_nowait() for _ in range(min(self.batch_rows, queue.qsize()))]
+                rest = [row for row in rest if row is not _STOP]
+                if rest:
+                    await self._flush(rest)
+
+    async def _flush(self, batch: List[dict]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session_factory() as db:
+                    await save_scans(db, batch)
+                self.flushes += 1
+                self.written += len(batch)
+                return
+            except Exception as e:
+                if attempt < self.max_retries:
+                    self.retried += len(batch)
+                    await asyncio.sleep(0.1 * (2 ** attempt))
+                else:
+                    self._count_dropped("flush_failed", len(batch))
+                    logger.error("Write-behind flush failed, dropped %d scans: %s", len(batch), e)
+
+    async def stop(self):
+        """Flush everything still queued, then stop the background task"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "flushes": self.flushes,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "dropped_queue_full": self.dropped_queue_full,
+            "dropped_flush_failed": self.dropped_flush_failed,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+
+scan_writer = ScanWriter(
+    AsyncSessionLocal,
+    max_queue=WRITE_BEHIND_QUEUE_SIZE,
+    flush_interval_ms=WRITE_BEHIND_FLUSH_MS,
+    batch_rows=WRITE_BEHIND_BATCH_ROWS,
+    enqueue_timeout=WRITE_BEHIND_ENQUEUE_TIMEOUT,
+    max_retries=WRITE_BEHIND_MAX_RETRIES,
+)
+
+
+async def persist_scans(db: AsyncSession, rows: List[dict]):
+    """Write rows now, or hand them to the write-behind queue when it is running"""
+    if scan_writer.running:
+        await scan_writer.enqueue(rows)
+    else:
+        await save_scans(db, rows)
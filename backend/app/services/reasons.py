@@ -0,0 +1,103 @@
+"""
+Reason codes — compact storage for the explanations produced by cypher_ml_logic.
+
+Every reason is one template from REASON_TEMPLATES plus at most one numeric
+parameter (amount or hour). The payee and its domain are not stored: they are
+taken from the scan's upi_id column when the text is rendered.
+
+Packed layout (ScanRecord.reason_codes): for each reason, one code byte followed
+by its parameter — float64 for amounts, uint8 for hours, nothing otherwise.
+Codes are persisted, so only ever append new ones; never renumber.
+"""
+import struct
+from typing import List, Optional, Tuple
+
+# (code, param) — param is an amount, an hour or None depending on the code
+ReasonCode = Tuple[int, Optional[float]]
+
+AMPLIFIED_NIGHT_AMOUNT = 1
+AMPLIFIED_UNVERIFIED_AMOUNT = 2
+AMPLIFIED_VELOCITY = 3
+AMOUNT_ROUND = 4
+AMOUNT_HIGH_VALUE = 5
+AMOUNT_UNUSUAL = 6
+AMOUNT_HIGH = 7
+PAYEE_UNVERIFIED_PROVIDER = 8
+PAYEE_FIRST_TIME = 9
+PAYEE_SUSPICIOUS = 10
+TIMING_NIGHT = 11
+TIMING_UNUSUAL = 12
+TIMING_UNUSUAL_HOURS = 13
+FREQUENCY_RAPID = 14
+DEVICE_UNTRUSTED = 15
+PATTERN_NORMAL = 16
+MINOR_FACTORS = 17
+
+REASON_TEMPLATES = {
+    AMPLIFIED_NIGHT_AMOUNT: "High-risk pattern: Large transaction during unusual hours",
+    AMPLIFIED_UNVERIFIED_AMOUNT: "High-risk pattern: Large payment to unverified recipient",
+    AMPLIFIED_VELOCITY: "Suspicious velocity: Multiple rapid transactions detected",
+    AMOUNT_ROUND: "₹{amount:,.0f} is a round amount (common in scams)",
+    AMOUNT_HIGH_VALUE: "High-value transaction: ₹{amount:,.0f}",
+    AMOUNT_UNUSUAL: "Transaction amount: ₹{amount:,.0f} flagged as unusual",
+    AMOUNT_HIGH: "Unusually high transaction amount",
+    PAYEE_UNVERIFIED_PROVIDER: "Unverified payment provider: @{domain}",
+    PAYEE_FIRST_TIME: "First-time transaction to {payee_id}",
+    PAYEE_SUSPICIOUS: "Payee has suspicious or unverified history",
+    TIMING_NIGHT: "Transaction at {hour:02d}:00 (high-risk hours: 11 PM - 6 AM)",
+    TIMING_UNUSUAL: "Transaction at unusual time: {hour:02d}:00",
+    TIMING_UNUSUAL_HOURS: "Transaction initiated at unusual hours",
+    FREQUENCY_RAPID: "Rapid transaction frequency detected",
+    DEVICE_UNTRUSTED: "Transaction from a new or untrusted device",
+    PATTERN_NORMAL: "Transaction pattern appears normal",
+    MINOR_FACTORS: "Multiple minor risk factors detected",
+}
+
+# struct format of the parameter that follows each code (absent = no parameter)
+_PARAM_FORMATS = {
+    AMOUNT_ROUND: "<d",
+    AMOUNT_HIGH_VALUE: "<d",
+    AMOUNT_UNUSUAL: "<d",
+    TIMING_NIGHT: "<B",
+    TIMING_UNUSUAL: "<B",
+}
+_PARAM_STRUCTS = {code: struct.Struct(fmt) for code, fmt in _PARAM_FORMATS.items()}
+
+
+def pack_reasons(codes: List[ReasonCode]) -> bytes:
+    """Serialize reason codes for the reason_codes column"""
+    out = bytearray()
+    for code, param in codes:
+        out.append(code)
+        fmt = _PARAM_STRUCTS.get(code)
+        if fmt is not None:
+            out += fmt.pack(param)
+    return bytes(out)
+
+
+def unpack_reasons(blob: bytes) -> List[ReasonCode]:
+    """Inverse of pack_reasons"""
+    codes = []
+    pos = 0
+    while pos < len(blob):
+        code = blob[pos]
+        pos += 1
+        fmt = _PARAM_STRUCTS.get(code)
+        if fmt is None:
+            codes.append((code, None))
+        else:
+            codes.append((code, fmt.unpack_from(blob, pos)[0]))
+            pos += fmt.size
+    return codes
+
+
+def render_reasons(codes: List[ReasonCode], payee_id: Optional[str]) -> List[str]:
+    """Expand reason codes into the English sentences shown to users"""
+    domain = payee_id.split("@")[1] if payee_id and "@" in payee_id else ""
+    reasons = []
+    for code, param in codes:
+        template = REASON_TEMPLATES.get(code)
+        if template is None:
+            continue  # written by a newer release; skip rather than fail the read
+        reasons.append(template.format(amount=param, hour=param, domain=domain, payee_id=payee_id))
+    return reasons
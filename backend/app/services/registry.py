@@ -0,0 +1,253 @@
+"""
+Model registry — the one place the ML model is loaded and served from.
+
+The FastAPI lifespan calls model_registry.load(), which loads the predictor once
+per process and runs warm-up predictions so the first real request doesn't pay
+for lazy imports, the brand index or cold model caches. The ML router, the
+risk-scoring logic and the inference pool workers all share it. Scripts and
+pool workers that never run the lifespan load it lazily on first use.
+
+Hot reload: the served model is the version named by ml/models/ACTIVE (see
+ml/model_store.py), or the legacy upi_classifier.pkl when nothing is active.
+activate() loads and warms a version next to the current one, then swaps the
+reference; requests already holding the old predictor finish on it. The
+previous predictor is kept for an instant rollback(). Server processes (the
+lifespan of each uvicorn worker, and process-pool workers) start a watcher
+that polls ACTIVE every CYPHER_MODEL_WATCH_SECONDS (default 2) and follows it,
+so an activation or rollback in one worker (or from the CLI) reaches all of
+them. Set it to 0 to turn the watcher off, e.g. for a single process. Scripts
+and tests that only call load() never start one.
+"""
+import logging
+import os
+import threading
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Poll interval for the ACTIVE pointer (0 disables the watcher). On by default in
+# servers: admin swaps only reach other uvicorn workers and pool processes through it
+MODEL_WATCH_SECONDS = float(os.environ.get("CYPHER_MODEL_WATCH_SECONDS", "2"))
+
+# Watcher sentinel (None is a real pointer value: the legacy pickle)
+_NO_VERSION = object()
+
+# Representative IDs: trusted, typosquatted, numeric and keyword-heavy paths
+WARMUP_UPI_IDS = [
+    "merchant@paytm",
+    "refund@paytmm",
+    "98765@unknown",
+    "urgent-prize@fake",
+    "support-team@googlepay",
+    "customer123@okaxis",
+]
+
+
+class ModelRegistry:
+    """Loads the phishing predictor once, shares it process-wide and swaps versions atomically"""
+
+    def __init__(self, watch_interval: float = 0, models_dir: str = None):
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()   # one activation at a time
+        self._predictor = None
+        self._attempted = False
+        self.active_version = None           # published version served, None = legacy pickle
+        self._previous = None                # (version, predictor) for rollback
+        self.watch_interval = watch_interval
+        self.models_dir = models_dir          # None = ml.model_store.MODELS_DIR
+        self._watcher = None
+        self.error = None
+        self.load_ms = None
+        self.warmup_ms = None
+        self.swaps = 0
+        self.swapped_at = None
+
+    @property
+    def available(self) -> bool:
+        """True once a model is loaded; the first call loads it if nobody has tried yet"""
+        if not self._attempted:
+            self.load(warmup=False)
+        return self._predictor is not None
+
+    @property
+    def predictor(self):
+        """The shared UPIPhishingPredictor (raises if no model could be loaded)"""
+        if not self.available:
+            raise RuntimeError(f"ML model not available: {self.error}")
+        return self._predictor
+
+    @property
+    def model_version(self):
+        predictor = self._predictor
+        return predictor.model_version if predictor else None
+
+    def _store_dir(self) -> str:
+        from ml.model_store import MODELS_DIR
+        return self.models_dir or MODELS_DIR
+
+    def _build(self, version):
+        """Load (but don't install) the predictor for a published version, or the legacy pickle"""
+        from app.services.metrics import observe_stage
+
+        if version is None:
+            from ml.predictor import get_predictor
+            predictor = get_predictor()
+        else:
+            from ml.model_store import verify_version
+            from ml.predictor import UPIPhishingPredictor
+            predictor = UPIPhishingPredictor(verify_version(version, self._store_dir()), version=version)
+        predictor.on_stage = observe_stage
+        return predictor
+
+    def load(self, warmup: bool = True):
+        """Load the active model if not loaded yet (retrying after a failure), then optionally warm it up"""
+        with self._lock:
+            if self._predictor is None:
+                self._attempted = True
+                start = time.perf_counter()
+                try:
+                    from ml.model_store import get_active_version
+                    version = get_active_version(self._store_dir())
+                    self._predictor = self._build(version)
+                    self.active_version = version
+                    self.error = None
+                except Exception as e:
+                    self.error = str(e)
+                    logger.warning("ML model not loaded: %s", e)
+                    return None
+                self.load_ms = round((time.perf_counter() - start) * 1000, 1)
+        if warmup and self.warmup_ms is None:
+            self.warmup_ms = self.warm_up(self._predictor)
+        return self._predictor
+
+    def warm_up(self, predictor) -> float:
+        """Exercise single and batch prediction plus the scoring logic once; returns ms taken"""
+        from app.services.cypher_ml_logic import analyze_transaction
+
+        start = time.perf_counter()
+        predictor.predict_phishing_probabilities(WARMUP_UPI_IDS)
+        predictor.predict_phishing_probability(WARMUP_UPI_IDS[0])
+        analyze_transaction({
+            "amount_risk": 0.5, "payee_risk": 0.5, "frequency_risk": 0.5,
+            "timing_risk": 0.5, "device_risk": 0.5,
+            "amount_value": 5000, "hour_of_day": 2, "payee_id": WARMUP_UPI_IDS[1],
+        }, predictor=predictor)
+        # Warm-up results shouldn't count as cache hits for real traffic
+        predictor.cache.clear()
+        elapsed = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("ML model %s warmed up in %s ms", predictor.model_version, elapsed)
+        return elapsed
+
+    def activate(self, version, persist: bool = True) -> str:
+        """
+        Load and warm `version` (None = legacy pickle), then swap it in.
+        persist=True also moves the ACTIVE pointer so other processes follow.
+        The current model keeps serving until the swap; on failure it stays.
+        """
+        from ml.model_store import set_active_version
+
+        with self._swap_lock:
+            if self._predictor is not None and version == self.active_version:
+                return self.model_version
+            predictor = self._build(version)
+            self.warm_up(predictor)
+            if persist:
+                set_active_version(version, self._store_dir())
+            self._install(version, predictor)
+        logger.info("Serving ML model %s", predictor.model_version)
+        return predictor.model_version
+
+    def rollback(self) -> str:
+        """Swap back to the previously served model (kept in memory)"""
+        from ml.model_store import set_active_version
+
+        with self._swap_lock:
+            if self._previous is None:
+                raise RuntimeError("No previous model version to roll back to")
+            version, predictor = self._previous
+            set_active_version(version, self._store_dir())
+            self._install(version, predictor)
+        logger.info("Rolled back to ML model %s", predictor.model_version)
+        return predictor.model_version
+
+    def _install(self, version, predictor):
+        # Caller holds _swap_lock. One reference assignment: readers see old or new
+        if self._predictor is not None:
+            self._previous = (self.active_version, self._predictor)
+        self._predictor = predictor
+        self.active_version = version
+        self._attempted = True
+        self.error = None
+        self.swaps += 1
+        self.swapped_at = time.time()
+
+    def start_watcher(self):
+        """Follow the ACTIVE pointer from a daemon thread (idempotent; off when watch_interval is 0)"""
+        with self._lock:
+            if self._watcher is not None or self.watch_interval <= 0:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="cypher-model-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        from ml.model_store import get_active_version
+
+        failed = _NO_VERSION  # pointer value that failed to load; retried once ACTIVE changes
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                version = get_active_version(self._store_dir())
+            except Exception as e:
+                logger.error("Reading the ACTIVE model pointer failed: %s", e)
+                continue
+            if version == self.active_version or version == failed:
+                continue
+            try:
+                self.activate(version, persist=False)
+                failed = _NO_VERSION
+            except Exception as e:
+                failed = version
+                logger.error("Model reload failed, still serving %s: %s", self.model_version, e)
+
+    def predict_phishing_probability(self, upi_id: str) -> float:
+        return self.predictor.predict_phishing_probability(upi_id)
+
+    def predict_phishing_probabilities(self, upi_ids: List[str]) -> np.ndarray:
+        return self.predictor.predict_phishing_probabilities(upi_ids)
+
+    def stats(self) -> dict:
+        predictor = self._predictor
+        previous = self._previous[1] if self._previous else None
+        return {
+            "ml_available": predictor is not None,
+            "model_path": predictor.model_path if predictor else None,
+            "engine": predictor.engine if predictor else None,
+            "model_version": predictor.model_version if predictor else None,
+            "previous_model_version": previous.model_version if previous else None,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "swaps": self.swaps,
+            "error": self.error,
+        }
+
+
+model_registry = ModelRegistry(watch_interval=MODEL_WATCH_SECONDS)
+
+
+# Module-level entry points: picklable by reference for the process pool
+def predict_phishing_probability(upi_id: str) -> float:
+    return model_registry.predict_phishing_probability(upi_id)
+
+
+def predict_phishing_probabilities(upi_ids: List[str]) -> np.ndarray:
+    return model_registry.predict_phishing_probabilities(upi_ids)
+
+
+def predict_with_version(upi_ids: List[str]) -> List[Tuple[float, str]]:
+    """(probability, model version) per ID, all from the same model"""
+    predictor = model_registry.predictor
+    probabilities = predictor.predict_phishing_probabilities(upi_ids)
+    return [(float(p), predictor.model_version) for p in probabilities]
@@ -0,0 +1,221 @@
+"""
+Per-request stage timing: Server-Timing headers and sampled span-tree traces.
+
+TracingMiddleware starts a Trace for the scoring endpoints and keeps it in a
+context variable. Handlers open spans (validation, scoring, persistence);
+scoring stages timed further down (feature_extraction, inference,
+rule_scoring, db_commit, see metrics.observe_stage) attach to the current
+span. The inference thread pool copies the context, so worker-thread stages
+land in the request's trace (not in process-pool mode: other processes have
+their own context).
+
+- CYPHER_SERVER_TIMING=1 (default): responses carry a Server-Timing header
+  with the summed duration of each span name plus the total. Requests from
+  timing_allow_origins also get Timing-Allow-Origin, so the browser exposes
+  the timings to that page's Resource Timing API.
+- CYPHER_TRACE_SAMPLE_RATE (default 0): fraction of traced requests whose full
+  span tree is appended as one JSON line to CYPHER_TRACE_FILE (default
+  backend/logs/traces.jsonl, rotated at CYPHER_TRACE_MAX_BYTES, keeping
+  CYPHER_TRACE_BACKUPS files).
+
+With both off the middleware passes requests straight through, and every span
+or stage call is one context-variable lookup.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+SERVER_TIMING = os.environ.get("CYPHER_SERVER_TIMING", "1") == "1"
+TRACE_SAMPLE_RATE = float(os.environ.get("CYPHER_TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.environ.get(
+    "CYPHER_TRACE_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "logs", "traces.jsonl"),
+)
+TRACE_MAX_BYTES = int(os.environ.get("CYPHER_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.environ.get("CYPHER_TRACE_BACKUPS", "5"))
+
+# Endpoints that get a trace (exact paths)
+TRACED_PATHS = frozenset({"/analyze", "/analyze/batch", "/api/ml/predict_payee_risk"})
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar("cypher_trace", default=None)
+_parent: ContextVar[int] = ContextVar("cypher_trace_parent", default=-1)
+
+
+class Trace:
+    """Spans of one request: [name, start (perf_counter), duration, parent index]"""
+
+    __slots__ = ("start", "started_at", "spans", "sampled")
+
+    def __init__(self, sampled: bool = False):
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.sampled = sampled
+
+    def add(self, name: str, start: float, duration: float, parent: int) -> int:
+        # list.append is atomic, so worker threads can add spans concurrently
+        self.spans.append([name, start, duration, parent])
+        return len(self.spans) - 1
+
+    def adopt(self, other: "Trace", parent: int):
+        """Copy another trace's spans (e.g. a shared micro-batch) under `parent`"""
+        base = len(self.spans)
+        for name, start, duration, other_parent in list(other.spans):
+            self.add(name, start, duration, parent if other_parent < 0 else base + other_parent)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: duration per span name (ms), then the total"""
+        totals = {}
+        for name, _, duration, _ in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        totals["total"] = time.perf_counter() - self.start
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in totals.items())
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((start - self.start) * 1000, 3),
+                    "duration_ms": round(duration * 1000, 3),
+                    "parent": parent,
+                }
+                for name, start, duration, parent in self.spans
+            ],
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def current_parent() -> int:
+    return _parent.get()
+
+
+class span:
+    """Context manager timing a named span of the current trace (no-op without one)"""
+
+    __slots__ = ("name", "trace", "index", "token", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _trace.get()
+        if self.trace is not None:
+            self.start = time.perf_counter()
+            self.index = self.trace.add(self.name, self.start, 0.0, _parent.get())
+            self.token = _parent.set(self.index)
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            _parent.reset(self.token)
+            self.trace.spans[self.index][2] = time.perf_counter() - self.start
+        return False
+
+
+class activate:
+    """Context manager making `trace` (may be None) current, e.g. for a shared batch"""
+
+    __slots__ = ("trace", "tokens")
+
+    def __init__(self, trace: Optional[Trace]):
+        self.trace = trace
+
+    def __enter__(self):
+        self.tokens = (_trace.set(self.trace), _parent.set(-1))
+        return self.trace
+
+    def __exit__(self, *exc):
+        _trace.reset(self.tokens[0])
+        _parent.reset(self.tokens[1])
+        return False
+
+
+def record_stage(name: str, seconds: float):
+    """Add an already-timed span ending now to the current trace"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter() - seconds, seconds, _parent.get())
+
+
+def mark(name: str):
+    """Span from the start of the request until now (e.g. "validation", on handler entry)"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, trace.start, time.perf_counter() - trace.start, _parent.get())
+
+
+_trace_logger = None
+
+
+def _get_trace_logger() -> logging.Logger:
+    global _trace_logger
+    if _trace_logger is None:
+        logger = logging.getLogger("cypher.trace")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        from app.logging_config import start_background
+
+        os.makedirs(os.path.dirname(os.path.abspath(TRACE_FILE)), exist_ok=True)
+        file_handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS)
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        # Written from a background thread, off the request path
+        handler, listener = start_background(file_handler)
+        atexit.register(listener.stop)
+        logger.addHandler(handler)
+        _trace_logger = logger
+    return _trace_logger
+
+
+def write_trace(trace: Trace, method: str, path: str, status: int):
+    """Append one sampled span tree as a JSON line"""
+    record = {"method": method, "path": path, "status": status, **trace.to_dict()}
+    _get_trace_logger().info(json.dumps(record))
+
+
+class TracingMiddleware:
+    """ASGI middleware: starts traces on TRACED_PATHS, adds Server-Timing, writes sampled traces"""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING, sample_rate: float = TRACE_SAMPLE_RATE,
+                 timing_allow_origins=()):
+        self.app = app
+        self.server_timing = server_timing
+        self.sample_rate = sample_rate
+        self.timing_allow_origins = frozenset(origin.encode("latin-1") for origin in timing_allow_origins)
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["path"] not in TRACED_PATHS
+                or not (self.server_timing or self.sample_rate > 0)):
+            return await self.app(scope, receive, send)
+
+        trace = Trace(sampled=self.sample_rate > 0 and random.random() < self.sample_rate)
+        status = 500
+        origin = dict(scope["headers"]).get(b"origin") if self.timing_allow_origins else None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                    if origin in self.timing_allow_origins:
+                        headers.append((b"timing-allow-origin", origin))
+                    message["headers"] = headers
+            await send(message)
+
+        with activate(trace):
+            await self.app(scope, receive, send_with_timing)
+        if trace.sampled:
+            write_trace(trace, scope["method"], scope["path"], status)
@@ -1,22 +1,43 @@
-# User Settings Storage (Simple JSON-based persistence)
+# User Settings Storage (in-memory, per user, persisted to JSON)
+#
+# Settings live in memory keyed by user ID (X-User-Id; "default" when absent).
+# Reads come from memory, refreshed from disk when the file changed (checked at
+# most every CYPHER_SETTINGS_REFRESH_MS), so other workers' updates show up.
+# Updates are recorded as pending field changes. A debounced flush takes an
+# exclusive lock on user_settings.json.lock, re-reads the file, applies only
+# those changes and replaces the file atomically (temp file + os.replace,
+# keeping its mode). Several uvicorn workers can update the same file without
+# overwriting each other, bursts of updates cost one write, and a crash never
+# leaves a half-written file.
+import copy
 import json
+import logging
 import os
+import tempfile
+import threading
+import time
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single worker only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
 SETTINGS_FILE = Path(__file__).parent / "user_settings.json"
+# How long updates are coalesced before the file is written
+SETTINGS_FLUSH_MS = float(os.environ.get("CYPHER_SETTINGS_FLUSH_MS", "500"))
+# How often reads check the file for changes made by other processes
+SETTINGS_REFRESH_MS = float(os.environ.get("CYPHER_SETTINGS_REFRESH_MS", "1000"))
 
-def load_settings():
-    """Load user settings from JSON file"""
-    if SETTINGS_FILE.exists():
-        with open(SETTINGS_FILE, 'r') as f:
-            return json.load(f)
-    return get_default_settings()
+# Mode for a newly created settings file (what open() would give it)
+_umask = os.umask(0)
+os.umask(_umask)
+NEW_FILE_MODE = 0o666 & ~_umask
+
+DEFAULT_USER = "default"
 
-def save_settings(settings):
-    """Save user settings to JSON file"""
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=2)
-    return settings
 
 def get_default_settings():
     """Get default user settings"""
@@ -39,33 +60,175 @@ def get_default_settings():
         }
     }
 
-def update_user_info(name=None, email=None):
+
+class SettingsStore:
+    """Per-user settings cached in memory behind a lock, merged into the file on a debounce"""
+
+    def __init__(self, path: Path, flush_interval_ms: float = 500, refresh_interval_ms: float = 1000):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.refresh_interval = refresh_interval_ms / 1000.0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # keeps flushes in order
+        self._users = None                   # loaded lazily on first access
+        self._pending = {}                   # user -> section -> {key: value} not yet on disk
+        self._file_mtime = None
+        self._checked_at = 0.0
+        self._timer = None
+
+    def _read_file(self) -> dict:
+        """users dict from disk ({} when missing); a legacy file is the default user's settings"""
+        if not self.path.exists():
+            return {}
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        return data["users"] if "users" in data else {DEFAULT_USER: data}
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _apply(users: dict, pending: dict):
+        """Apply pending field changes to a users dict (unknown users start from defaults)"""
+        for user_id, sections in pending.items():
+            settings = users.setdefault(user_id, get_default_settings())
+            for section, changes in sections.items():
+                settings.setdefault(section, {}).update(changes)
+
+    @staticmethod
+    def _combine(older: dict, newer: dict):
+        """Fold newer pending changes into older ones (newer values win)"""
+        for user_id, sections in newer.items():
+            for section, changes in sections.items():
+                older.setdefault(user_id, {}).setdefault(section, {}).update(changes)
+
+    def _ensure_loaded(self):
+        # Caller holds self._lock
+        now = time.monotonic()
+        if self._users is not None and now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        mtime = self._mtime()
+        if self._users is not None and mtime == self._file_mtime:
+            return
+        users = self._read_file()
+        self._apply(users, self._pending)  # local updates not flushed yet win
+        self._users, self._file_mtime = users, mtime
+
+    def get(self, user_id=None) -> dict:
+        """Settings for one user (defaults if never saved); returns a copy"""
+        with self._lock:
+            self._ensure_loaded()
+            settings = self._users.get(user_id or DEFAULT_USER)
+            return copy.deepcopy(settings) if settings is not None else get_default_settings()
+
+    def update(self, user_id, section: str, changes: dict) -> dict:
+        """Apply the non-None values in changes to one section; returns the new settings"""
+        changes = {key: value for key, value in changes.items() if value is not None}
+        user_id = user_id or DEFAULT_USER
+        with self._lock:
+            self._ensure_loaded()
+            settings = self._users.setdefault(user_id, get_default_settings())
+            settings.setdefault(section, {}).update(changes)
+            self._pending.setdefault(user_id, {}).setdefault(section, {}).update(changes)
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return copy.deepcopy(settings)
+
+    def flush(self):
+        """Merge pending changes into the file now"""
+        with self._write_lock:
+            with self._lock:
+                self._timer = None
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                with open(self.lock_path, 'a') as lock_file:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    # Re-read under the lock: other workers may have written since we loaded
+                    users = self._read_file()
+                    self._apply(users, pending)
+                    self._write(users)
+                    mtime = self._mtime()
+            except Exception as e:
+                with self._lock:
+                    # Retried by the next update or close(); newer changes stay on top
+                    self._combine(pending, self._pending)
+                    self._pending = pending
+                logger.error("Failed to save user settings: %s", e)
+                return
+
+            with self._lock:
+                # Adopt the merged file, keeping changes made during the write
+                self._apply(users, self._pending)
+                self._users, self._file_mtime = users, mtime
+
+    def _write(self, users: dict):
+        """Atomically replace the file, keeping its permissions"""
+        try:
+            mode = os.stat(self.path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = NEW_FILE_MODE
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"users": users}, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def close(self):
+        """Cancel the pending timer and flush (called on shutdown)"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush()
+
+
+settings_store = SettingsStore(SETTINGS_FILE, flush_interval_ms=SETTINGS_FLUSH_MS,
+                               refresh_interval_ms=SETTINGS_REFRESH_MS)
+
+
+def load_settings(user_id=None):
+    """Load user settings"""
+    return settings_store.get(user_id)
+
+
+def update_user_info(name=None, email=None, user_id=None):
     """Update user information"""
-    settings = load_settings()
-    if name:
-        settings["user"]["name"] = name
-    if email:
-        settings["user"]["email"] = email
-    return save_settings(settings)
-
-def update_notifications(push_enabled=None, email_alerts=None, security_alerts=None):
+    # Empty strings are ignored, as before
+    return settings_store.update(user_id, "user", {"name": name or None, "email": email or None})
+
+
+def update_notifications(push_enabled=None, email_alerts=None, security_alerts=None, user_id=None):
     """Update notification settings"""
-    settings = load_settings()
-    if push_enabled is not None:
-        settings["notifications"]["push_enabled"] = push_enabled
-    if email_alerts is not None:
-        settings["notifications"]["email_alerts"] = email_alerts
-    if security_alerts is not None:
-        settings["notifications"]["security_alerts"] = security_alerts
-    return save_settings(settings)
-
-def update_preferences(dark_mode=None, haptic_feedback=None, language=None):
+    return settings_store.update(user_id, "notifications", {
+        "push_enabled": push_enabled,
+        "email_alerts": email_alerts,
+        "security_alerts": security_alerts,
+    })
+
+
+def update_preferences(dark_mode=None, haptic_feedback=None, language=None, user_id=None):
     """Update user preferences"""
-    settings = load_settings()
-    if dark_mode is not None:
-        settings["preferences"]["dark_mode"] = dark_mode
-    if haptic_feedback is not None:
-        settings["preferences"]["haptic_feedback"] = haptic_feedback
-    if language is not None:
-        settings["preferences"]["language"] = language
-    return save_settings(settings)
+    return settings_store.update(user_id, "preferences", {
+        "dark_mode": dark_mode,
+        "haptic_feedback": haptic_feedback,
+        "language": language,
+    })
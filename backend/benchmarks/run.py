@@ -0,0 +1,241 @@
+"""
+Microbenchmarks for the scoring hot paths.
+
+Times feature extraction, model prediction (1 / 100 / 10k rows), rule scoring
+and the /analyze and /history handlers (in-process client, throwaway SQLite DB).
+Runs offline; the prediction cache is disabled so every call does real work.
+
+Usage (from backend/):
+    python benchmarks/run.py                                   # print timings
+    python benchmarks/run.py --save benchmarks/baseline.json   # record a baseline
+    python benchmarks/run.py --compare benchmarks/baseline.json --threshold 0.25
+    python benchmarks/run.py --only feature --quick
+
+--compare exits with status 1 when any benchmark's median is more than
+--threshold (fraction) slower than the baseline.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_ROOT)
+os.chdir(BACKEND_ROOT)  # model and data paths are relative to backend/
+
+# Must be set before the app modules are imported
+_tmpdir = tempfile.TemporaryDirectory(prefix="cypher-bench-")  # removed at exit
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir.name}/bench.db"
+os.environ["CYPHER_PREDICTION_CACHE_SIZE"] = "0"
+os.environ["CYPHER_WRITE_BEHIND"] = "0"
+os.environ.setdefault("CYPHER_ML_MICROBATCH", "0")
+
+import warnings
+warnings.filterwarnings("ignore")
+
+# Target wall time per repeat when choosing the loop count
+MIN_REPEAT_SECONDS = 0.2
+
+SAMPLE_UPI_IDS = [
+    "merchant@paytm", "refund@paytmm", "98765@unknown", "zomato@phonepe",
+    "urgent-prize@fake", "support-team@googlepay", "customer123@okaxis",
+    "kyc-update@amaz0npay", "rahul.sharma@ybl", "cashback2024@phonepay",
+]
+
+
+def random_upi_ids(n: int, seed: int = 0) -> list:
+    """Deterministic mix of realistic and random IDs"""
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789._-"
+    domains = ["paytm", "ybl", "okaxis", "oksbi", "phonepe", "paytmm", "unknown", "fake"]
+    ids = []
+    for i in range(n):
+        if i % 3 == 0:
+            ids.append(SAMPLE_UPI_IDS[i % len(SAMPLE_UPI_IDS)])
+        else:
+            name = "".join(rng.choice(alphabet) for _ in range(rng.randint(4, 16)))
+            ids.append(f"{name}@{rng.choice(domains)}")
+    return ids
+
+
+def transaction(i: int) -> dict:
+    rng = random.Random(i)
+    return {
+        "amount_risk": rng.random(),
+        "payee_risk": rng.random(),
+        "frequency_risk": rng.random(),
+        "timing_risk": rng.random(),
+        "device_risk": rng.random(),
+        "payee_id": SAMPLE_UPI_IDS[i % len(SAMPLE_UPI_IDS)],
+        "amount_value": rng.choice([500, 5000, 12500.5, 49999]),
+        "hour_of_day": rng.randint(0, 23),
+    }
+
+
+def measure(fn, repeat: int) -> dict:
+    """timeit-style: calibrate the loop count, then take `repeat` samples (per-call us)"""
+    fn()  # warm-up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_REPEAT_SECONDS or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(MIN_REPEAT_SECONDS / elapsed) + 1)
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    samples_us = sorted(s * 1e6 for s in samples)
+    return {
+        "median_us": round(statistics.median(samples_us), 3),
+        "min_us": round(samples_us[0], 3),
+        "max_us": round(samples_us[-1], 3),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+@contextlib.contextmanager
+def build_benchmarks():
+    """Yields name -> zero-argument callable; setup happens here, outside the timings.
+    The app's lifespan runs for the duration of the block."""
+    from ml.feature_extractor import (
+        calculate_entropy, levenshtein_distance, min_brand_distance, extract_features,
+    )
+    from ml.predictor import UPIPhishingPredictor
+    from app.services.cypher_ml_logic import analyze_transaction
+    from app.services.registry import model_registry
+
+    ids_100 = random_upi_ids(100)
+    ids_10k = random_upi_ids(10_000)
+    predictor = UPIPhishingPredictor()
+
+    benchmarks = {
+        "feature.calculate_entropy": lambda: calculate_entropy("support-team-2024"),
+        "feature.levenshtein_distance": lambda: levenshtein_distance("paytmm", "paytm"),
+        "feature.min_brand_distance": lambda: min_brand_distance("amaz0npay"),
+        "feature.extract_features": lambda: extract_features("kyc-update@amaz0npay"),
+        # All sizes through the same entry point, so they differ only in batch size
+        "predictor.predict[1]": lambda: predictor.predict_phishing_probabilities(["refund@paytmm"]),
+        "predictor.predict[100]": lambda: predictor.predict_phishing_probabilities(ids_100),
+        "predictor.predict[10000]": lambda: predictor.predict_phishing_probabilities(ids_10k),
+    }
+
+    model_registry.load(warmup=False)
+    tx = transaction(1)
+    benchmarks["logic.analyze_transaction"] = lambda: analyze_transaction(tx)
+
+    # HTTP handlers through the full ASGI stack, rate limiting off
+    from fastapi.testclient import TestClient
+    import main
+
+    main.limiter.enabled = False
+    with TestClient(main.app) as client:
+        seed_rows = [transaction(i) for i in range(500)]
+        for start in range(0, len(seed_rows), 100):
+            client.post("/analyze/batch", json=seed_rows[start:start + 100], headers={"X-User-Id": "bench-user"})
+
+        analyze_body = transaction(2)
+        for path, response in (
+            ("/analyze", client.post("/analyze", json=analyze_body, headers={"X-User-Id": "bench-user"})),
+            ("/history", client.get("/history", headers={"X-User-Id": "bench-user"})),
+        ):
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+
+        benchmarks["api.analyze"] = lambda: client.post(
+            "/analyze", json=analyze_body, headers={"X-User-Id": "bench-user"}
+        )
+        benchmarks["api.history"] = lambda: client.get("/history", headers={"X-User-Id": "bench-user"})
+        yield benchmarks
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print deltas against a baseline; returns names that regressed beyond threshold"""
+    regressions = []
+    print(f"\n  {'benchmark':32s} {'baseline':>12s} {'current':>12s} {'change':>9s}")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"  {name:32s} {'-':>12s} {result['median_us']:10.1f}us {'new':>9s}")
+            continue
+        change = result["median_us"] / base["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  ❌"
+        print(f"  {name:32s} {base['median_us']:10.1f}us {result['median_us']:10.1f}us {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cypher hot-path microbenchmarks")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown vs baseline, as a fraction (default 0.25)")
+    parser.add_argument("--only", help="run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--quick", action="store_true", help="3 repeats, for a fast sanity check")
+    args = parser.parse_args()
+    repeat = 3 if args.quick else args.repeat
+
+    results = {}
+    with contextlib.ExitStack() as stack:
+        # Keep startup output and CLI-style prints out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            benchmarks = stack.enter_context(build_benchmarks())
+
+        print(f"\n⏱️  Cypher microbenchmarks (median of {repeat}, per call)\n")
+        for name, fn in benchmarks.items():
+            if args.only and args.only not in name:
+                continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = measure(fn, repeat)
+            results[name] = result
+            print(f"  {name:32s} {result['median_us']:12.1f}us  (min {result['min_us']:.1f}, x{result['number']})")
+
+    if args.save:
+        import numpy
+        import sklearn
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "created_at": datetime.utcnow().isoformat(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpu_count": os.cpu_count(),
+                    "numpy": numpy.__version__,
+                    "sklearn": sklearn.__version__,
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} benchmark(s) regressed more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,40 @@
 import json
+import logging
 import os
-from fastapi import FastAPI, HTTPException, Request, Depends
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.schemas import TransactionInput, AnalysisResult
-from app.services.inference import analyze_transaction
-from app.database import engine, get_db
-from app import models
+from app.logging_config import configure_logging, shutdown_logging
+from app.schemas import TransactionInput, AnalysisResult, AnalyticsSummary
+from app.services.inference import analyze_transaction, analyze_transactions
+from app.services.executor import inference_executor, InferenceSaturated, InferenceTimeout
+from app.services.registry import model_registry
+from app.services.reasons import render_reasons, unpack_reasons
+from app.services.analytics import summarize
+from app.services.persistence import scan_row, persist_scans, scan_writer, WRITE_BEHIND
+from app.services.metrics import (
+    RATE_LIMITED,
+    RequestMetricsMiddleware,
+    count_labels,
+    mark_process_dead,
+    render_metrics,
+    route_label,
+    start_gauge_refresher,
+)
+from app.services import tracing
+from app.database import engine, async_engine, get_async_db
+from app import migrations, models
 from app.user_settings import (
+    settings_store,
     load_settings,
     update_user_info,
     update_notifications,
@@ -20,109 +42,257 @@ from app.user_settings import (
 )
 from app.routers import ml
 
+# Structured logging through a background writer (see app/logging_config.py)
+configure_logging()
+
 # Create DB tables on startup (no-op if already exist)
 models.Base.metadata.create_all(bind=engine)
+# Columns and indexes added since a table was created come from an explicit
+# migration step (python -m app.migrations), not from every worker at import
+if migrations.MIGRATE_ON_STARTUP:
+    migrations.upgrade()
+elif _pending_schema := migrations.pending():
+    logging.getLogger(__name__).warning(
+        "Database schema is behind (%s); run: python -m app.migrations", ", ".join(_pending_schema)
+    )
+
+# Upper bound on transactions accepted by a single /analyze/batch call
+MAX_BATCH_SIZE = int(os.environ.get("CYPHER_MAX_BATCH_SIZE", "500"))
 
 # Rate limiter keyed by client IP
 limiter = Limiter(key_func=get_remote_address)
 
-app = FastAPI(title="Cypher Threat Engine")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm the shared model, and start the inference workers, before serving
+    configure_logging()
+    model_registry.load()
+    model_registry.start_watcher()
+    await inference_executor.warm_up()
+    if WRITE_BEHIND:
+        await scan_writer.start()
+    start_gauge_refresher()
+    yield
+    # Shutdown: flush buffered scans and settings, stop batching and release inference workers
+    await scan_writer.stop()
+    settings_store.close()
+    if ml.batcher is not None:
+        await ml.batcher.stop()
+    inference_executor.shutdown()
+    await async_engine.dispose()
+    mark_process_dead()
+    shutdown_logging()
+
+app = FastAPI(title="Cypher Threat Engine", lifespan=lifespan)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+
+def _rate_limited(request: Request, exc: RateLimitExceeded):
+    RATE_LIMITED.labels(route_label(request.scope)).inc()
+    return _rate_limit_exceeded_handler(request, exc)
+
+
+app.add_exception_handler(RateLimitExceeded, _rate_limited)
 
 # CORS — only allow our frontend domains
+ALLOWED_ORIGINS = [
+    "https://cypher-self.vercel.app",
+    "http://localhost:3000",
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "https://cypher-self.vercel.app",
-        "http://localhost:3000",
-    ],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["POST", "GET"],
     allow_headers=["Content-Type", "Authorization"],
+    # Cross-origin fetch() can only read response headers listed here
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
+# Request latency histograms for /metrics; Server-Timing and sampled traces
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(tracing.TracingMiddleware, timing_allow_origins=ALLOWED_ORIGINS)
+
 # Register ML router
 app.include_router(ml.router, prefix="/api", tags=["ml"])
 
 # ===== USER SETTINGS ENDPOINTS =====
 @app.get("/api/user/settings")
-def get_user_settings():
-    return load_settings()
+def get_user_settings(request: Request):
+    return load_settings(user_id=request.headers.get("X-User-Id"))
 
 @app.post("/api/user/info")
-def update_user(data: dict):
-    settings = update_user_info(name=data.get("name"), email=data.get("email"))
+def update_user(request: Request, data: dict):
+    settings = update_user_info(
+        name=data.get("name"),
+        email=data.get("email"),
+        user_id=request.headers.get("X-User-Id")
+    )
     return {"success": True, "settings": settings}
 
 @app.post("/api/user/notifications")
-def update_notification_settings(data: dict):
+def update_notification_settings(request: Request, data: dict):
     settings = update_notifications(
         push_enabled=data.get("push_enabled"),
         email_alerts=data.get("email_alerts"),
-        security_alerts=data.get("security_alerts")
+        security_alerts=data.get("security_alerts"),
+        user_id=request.headers.get("X-User-Id")
     )
     return {"success": True, "settings": settings}
 
 @app.post("/api/user/preferences")
-def update_user_preferences(data: dict):
+def update_user_preferences(request: Request, data: dict):
     settings = update_preferences(
         dark_mode=data.get("dark_mode"),
         haptic_feedback=data.get("haptic_feedback"),
-        language=data.get("language")
+        language=data.get("language"),
+        user_id=request.headers.get("X-User-Id")
     )
     return {"success": True, "settings": settings}
 
 # ===== ANALYSIS ENDPOINT — 30/min per IP =====
 @app.post("/analyze", response_model=AnalysisResult)
 @limiter.limit("30/minute")
-async def analyze(request: Request, data: TransactionInput, db: Session = Depends(get_db)):
+async def analyze(request: Request, data: TransactionInput, db: AsyncSession = Depends(get_async_db)):
+    tracing.mark("validation")
     try:
-        result = analyze_transaction(data)
+        with tracing.span("scoring"):
+            result = await inference_executor.run(analyze_transaction, data)
 
         # Persist to database
-        record = models.ScanRecord(
-            upi_id=data.payee_id,
-            risk_score=result.risk_score,
-            risk_label=result.risk_label,
-            reasons=json.dumps(result.reasons),
-            user_id=request.headers.get("X-User-Id"),  # Clerk user ID from frontend header
-        )
-        db.add(record)
-        db.commit()
+        with tracing.span("persistence"):
+            await persist_scans(db, [scan_row(data.payee_id, result, request.headers.get("X-User-Id"))])
+        count_labels([result])
 
         return result
+    except InferenceSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except InferenceTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ===== BATCH ANALYSIS — partner integrations, 10/min per IP =====
+@app.post("/analyze/batch", response_model=list[AnalysisResult])
+@limiter.limit("10/minute")
+async def analyze_batch(request: Request, data: list[TransactionInput], db: AsyncSession = Depends(get_async_db)):
+    if len(data) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(data)} transactions (max {MAX_BATCH_SIZE})"
+        )
+    if not data:
+        return []
+    tracing.mark("validation")
+
+    try:
+        with tracing.span("scoring"):
+            results = await inference_executor.run(analyze_transactions, data)
+
+        # Persist all scans with one bulk insert
+        user_id = request.headers.get("X-User-Id")
+        with tracing.span("persistence"):
+            await persist_scans(db, [scan_row(item.payee_id, result, user_id) for item, result in zip(data, results)])
+        count_labels(results)
+
+        return results
+    except InferenceSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except InferenceTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ===== HISTORY — from PostgreSQL =====
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def _parse_history_cursor(before: str):
+    """Parse a '<iso timestamp>,<id>' cursor as returned in X-Next-Cursor"""
+    try:
+        timestamp, record_id = before.rsplit(",", 1)
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before must be '<timestamp>,<id>'")
+
+
+def _history_reasons(row) -> list[str]:
+    """Render stored reason codes; rows written before reason codes carry JSON text"""
+    if row.reason_codes is not None:
+        return render_reasons(unpack_reasons(row.reason_codes), row.upi_id)
+    return json.loads(row.reasons) if row.reasons else []
+
+
 @app.get("/history", response_model=list[AnalysisResult])
 @limiter.limit("60/minute")
-async def get_history(request: Request, db: Session = Depends(get_db)):
+async def get_history(
+    request: Request,
+    response: Response,
+    before: Optional[str] = None,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
     user_id = request.headers.get("X-User-Id")
-    # If user ID provided, return their history; otherwise return last 50 records
+    ScanRecord = models.ScanRecord
+
+    # Only the columns the response needs; no ORM object hydration
+    query = select(
+        ScanRecord.id,
+        ScanRecord.risk_score,
+        ScanRecord.risk_label,
+        ScanRecord.upi_id,
+        ScanRecord.reasons,
+        ScanRecord.reason_codes,
+        ScanRecord.timestamp,
+    )
+    # If user ID provided, return their history; otherwise return latest records
     if user_id:
-        records = db.query(models.ScanRecord).filter(
-            models.ScanRecord.user_id == user_id
-        ).order_by(models.ScanRecord.timestamp.desc()).limit(50).all()
-    else:
-        records = db.query(models.ScanRecord).order_by(
-            models.ScanRecord.timestamp.desc()
-        ).limit(50).all()
+        query = query.where(ScanRecord.user_id == user_id)
+    # Keyset pagination: continue strictly after the last row of the previous page
+    if before:
+        query = query.where(tuple_(ScanRecord.timestamp, ScanRecord.id) < tuple_(*_parse_history_cursor(before)))
+    query = query.order_by(ScanRecord.timestamp.desc(), ScanRecord.id.desc()).limit(limit)
+
+    rows = (await db.execute(query)).all()
+
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = f"{last.timestamp.isoformat()},{last.id}"
 
     return [
         AnalysisResult(
             risk_score=r.risk_score,
             risk_label=r.risk_label,
-            reasons=json.loads(r.reasons) if r.reasons else [],
+            reasons=_history_reasons(r),
             timestamp=r.timestamp,
         )
-        for r in records
+        for r in rows
     ]
 
+@app.get("/analytics/summary", response_model=AnalyticsSummary)
+@limiter.limit("60/minute")
+async def get_analytics_summary(
+    request: Request,
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Served from scan_daily_rollups: O(days × labels) rows, not one per scan
+    return await summarize(db, request.headers.get("X-User-Id"), days)
+
 @app.get("/health")
 def health_check():
-    return {"status": "active", "engine": "cypher-ml-v1"}
+    return {
+        "status": "active",
+        "engine": "cypher-ml-v1",
+        "write_behind": scan_writer.stats() if WRITE_BEHIND else None,
+    }
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text format; aggregated across workers when PROMETHEUS_MULTIPROC_DIR is set
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
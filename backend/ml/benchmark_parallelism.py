@@ -0,0 +1,66 @@
+"""
+Parallelism benchmark: serial vs parallel forest inference on 1, 100 and 10k rows.
+Shows why UPIPhishingPredictor runs small inputs on one core and only fans
+out above CYPHER_PARALLEL_MIN_ROWS.
+
+Usage:
+    python ml/benchmark_parallelism.py [--cores N] [--repeat R]
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ml.feature_extractor import extract_feature_matrix
+from ml.predictor import UPIPhishingPredictor
+
+ROW_COUNTS = (1, 100, 10_000)
+
+
+def time_call(fn, X, repeat: int) -> float:
+    """Median wall time of fn(X) in milliseconds (after one warm-up call)"""
+    fn(X)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model", default="ml/models/upi_classifier.pkl")
+    parser.add_argument("--data", default="ml/data/upi_dataset.csv")
+    args = parser.parse_args()
+
+    upi_ids = pd.read_csv(args.data)["upi_id"].tolist()
+    X = extract_feature_matrix((upi_ids * (max(ROW_COUNTS) // len(upi_ids) + 1))[:max(ROW_COUNTS)])
+
+    model = joblib.load(args.model)
+    serial = copy.copy(model).set_params(n_jobs=1)
+    parallel = copy.copy(model).set_params(n_jobs=args.cores)
+    predictor = UPIPhishingPredictor(args.model, engine="sklearn")
+
+    print(f"\n⏱️  Forest inference latency (median of {args.repeat}, {args.cores} cores, "
+          f"policy cutover {predictor.parallel_min_rows} rows)\n")
+    print(f"  {'rows':>7s}  {'serial':>10s}  {'parallel':>10s}  {'policy':>10s}")
+    for n in ROW_COUNTS:
+        rows = X[:n]
+        serial_ms = time_call(serial.predict_proba, rows, args.repeat)
+        parallel_ms = time_call(parallel.predict_proba, rows, args.repeat)
+        policy_ms = time_call(predictor.predict_proba, rows, args.repeat)
+        print(f"  {n:7d}  {serial_ms:8.2f}ms  {parallel_ms:8.2f}ms  {policy_ms:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Columnar binary dataset format for UPI Phishing Detection
+
+A dataset is a directory of flat arrays that load with np.load (or memory-map)
+instead of being parsed row by row:
+
+    ml/data/upi_dataset.cols/
+    ├── ids.bin          UPI IDs, utf-8, each terminated by "\\n"
+    ├── offsets.npy      uint32 (int64 past 4 GiB), rows + 1 entries:
+    │                    ID i is ids.bin[offsets[i]:offsets[i+1] - 1]
+    ├── labels.npy       int8  (rows,)
+    └── columns.json     format, rows, class counts, duplicates dropped, source
+
+UPI IDs never contain newlines, so the whole ID column decodes with a single
+bytes.decode().split("\\n") call and loading is bound by I/O, not by a Python
+loop per row. A directory of .npy files (rather than .npz) keeps every column
+memory-mappable.
+
+Conversion drops repeated UPI IDs, keeping the first occurrence (and its label)
+unless --keep-duplicates is given.
+
+Usage:
+    python ml/columnar_dataset.py ml/data/upi_dataset.csv ml/data/upi_dataset.cols
+    python ml/columnar_dataset.py ml/data/shards ml/data/train.cols   # part-*.csv shards
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from itertools import repeat
+from operator import itemgetter
+
+import numpy as np
+
+FORMAT = "cypher-columnar-v1"
+
+IDS_FILE = "ids.bin"
+OFFSETS_FILE = "offsets.npy"
+LABELS_FILE = "labels.npy"
+META_FILE = "columns.json"
+
+# Rows per chunk when streaming
+CHUNK_ROWS = 100_000
+
+
+def is_columnar(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def csv_paths(path: str) -> list:
+    """
+    A CSV file, or the shards of a directory in order: those listed in its
+    manifest.json (dataset_generator output), else every part-*.csv file
+    """
+    if not os.path.isdir(path):
+        return [path]
+    manifest_path = os.path.join(path, 'manifest.json')
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            return [os.path.join(path, shard['file']) for shard in json.load(f)['shards']]
+    return [os.path.join(path, name) for name in sorted(os.listdir(path))
+            if name.startswith('part-') and name.endswith('.csv')]
+
+
+def read_csv_columns(filepath: str):
+    """(upi_ids, labels int8 array) from one CSV, without a Python loop per row"""
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    header, _, body = text.partition('\n')
+
+    plain = header.rstrip('\r') == 'upi_id,label' and '"' not in body
+    if plain:
+        # Plain two-column file (what dataset_generator writes): split it in C
+        if '\r' in body:
+            body = body.replace('\r', '')
+        lines = list(filter(None, body.split('\n')))  # blank lines, including the trailing one
+        plain = set(map(str.count, lines, repeat(','))) <= {1}
+
+    if plain:
+        fields = '\n'.join(lines).replace(',', '\n').split('\n') if lines else []
+        upi_ids, labels = fields[0::2], fields[1::2]
+    else:
+        reader = csv.reader(io.StringIO(text))
+        columns = next(reader)
+        pick = itemgetter(columns.index('upi_id'), columns.index('label'))
+        try:
+            id_column, labels = list(zip(*map(pick, filter(None, reader)))) or [(), ()]
+        except IndexError:
+            raise ValueError(f"{filepath}: row {reader.line_num} is missing the upi_id or label field") from None
+        upi_ids = list(id_column)
+
+    try:
+        return upi_ids, np.array(labels, dtype=np.int64).astype(np.int8)
+    except ValueError as e:
+        raise ValueError(f"{filepath}: malformed label column ({e})") from None
+
+
+def first_occurrences(upi_ids: list) -> np.ndarray:
+    """Sorted row indices of the first occurrence of each distinct ID"""
+    n = len(upi_ids)
+    # Assigning in reverse order leaves each key mapped to its first index
+    first = dict(zip(reversed(upi_ids), range(n - 1, -1, -1)))
+    return np.sort(np.fromiter(first.values(), dtype=np.int64, count=len(first)))
+
+
+def write_columnar(upi_ids: list, labels, out_dir: str, source: str = None, duplicates_dropped: int = 0):
+    """Write ids/offsets/labels to out_dir (built in a staging directory, then renamed)"""
+    labels = np.asarray(labels, dtype=np.int8)
+    if len(upi_ids) != len(labels):
+        raise ValueError(f"{len(upi_ids)} IDs but {len(labels)} labels")
+
+    buffer = ('\n'.join(upi_ids) + '\n').encode('utf-8') if upi_ids else b''
+    ends = np.flatnonzero(np.frombuffer(buffer, dtype=np.uint8) == ord('\n'))
+    offsets = np.zeros(len(upi_ids) + 1, dtype=np.uint32 if len(buffer) < 1 << 32 else np.int64)
+    offsets[1:] = ends + 1
+
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(out_dir)}.")
+    try:
+        with open(os.path.join(staging, IDS_FILE), 'wb') as f:
+            f.write(buffer)
+        np.save(os.path.join(staging, OFFSETS_FILE), offsets)
+        np.save(os.path.join(staging, LABELS_FILE), labels)
+        counts = np.bincount(labels, minlength=2)
+        with open(os.path.join(staging, META_FILE), 'w') as f:
+            json.dump({
+                "format": FORMAT,
+                "rows": len(upi_ids),
+                "legitimate": int(counts[0]),
+                "phishing": int(counts[1]),
+                "duplicates_dropped": duplicates_dropped,
+                "ids_bytes": len(buffer),
+                "source": source,
+                "created_at": datetime.utcnow().isoformat(),
+            }, f, indent=2)
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.rename(staging, out_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def convert_csv(csv_path: str, out_dir: str, dedupe: bool = True) -> dict:
+    """Convert a CSV file or shard directory to the columnar format; returns its columns.json"""
+    upi_ids, label_parts = [], []
+    for path in csv_paths(csv_path):
+        ids, labels = read_csv_columns(path)
+        upi_ids.extend(ids)
+        label_parts.append(labels)
+    labels = np.concatenate(label_parts) if label_parts else np.zeros(0, dtype=np.int8)
+
+    dropped = 0
+    if dedupe:
+        keep = first_occurrences(upi_ids)
+        dropped = len(upi_ids) - len(keep)
+        if dropped:
+            upi_ids = list(map(upi_ids.__getitem__, keep.tolist()))
+            labels = labels[keep]
+
+    write_columnar(upi_ids, labels, out_dir, source=os.path.abspath(csv_path), duplicates_dropped=dropped)
+    return ColumnarDataset(out_dir).meta
+
+
+class ColumnarDataset:
+    """Read side of the format: memory-mapped columns with slice/stream access"""
+
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT:
+            raise ValueError(f"{path}: unsupported dataset format {self.meta.get('format')!r}")
+
+        mode = 'r' if mmap else None
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode=mode)
+        self.labels = np.load(os.path.join(path, LABELS_FILE), mmap_mode=mode)
+        ids_path = os.path.join(path, IDS_FILE)
+        if os.path.getsize(ids_path) == 0:
+            self.buffer = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            self.buffer = np.memmap(ids_path, dtype=np.uint8, mode='r')
+        else:
+            self.buffer = np.fromfile(ids_path, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def upi_id(self, i: int) -> str:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1] - 1].tobytes().decode('utf-8')
+
+    def upi_ids(self, start: int = 0, stop: int = None) -> list:
+        """IDs of rows [start, stop) as a list of str"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return []
+        text = self.buffer[self.offsets[start]:self.offsets[stop]].tobytes().decode('utf-8')
+        return text.split('\n')[:-1]
+
+    def iter_chunks(self, chunk_rows: int = CHUNK_ROWS):
+        """Stream (upi_ids, labels) chunks without loading the whole dataset"""
+        for start in range(0, len(self), chunk_rows):
+            stop = min(start + chunk_rows, len(self))
+            yield self.upi_ids(start, stop), np.asarray(self.labels[start:stop])
+
+
+def load_columnar(path: str):
+    """(upi_ids, labels int8 array) for a whole columnar dataset"""
+    dataset = ColumnarDataset(path)
+    return dataset.upi_ids(), np.asarray(dataset.labels)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Convert a CSV dataset (or shard directory) to the columnar format")
+    parser.add_argument("source", nargs="?", default="ml/data/upi_dataset.csv")
+    parser.add_argument("out", nargs="?", default="ml/data/upi_dataset.cols")
+    parser.add_argument("--keep-duplicates", action="store_true", help="keep repeated UPI IDs")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    meta = convert_csv(args.source, args.out, dedupe=not args.keep_duplicates)
+    print(f"✅ {args.out}: {meta['rows']:,} rows ({meta['legitimate']:,} legitimate, "
+          f"{meta['phishing']:,} phishing), {meta['duplicates_dropped']:,} duplicates dropped "
+          f"in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,201 @@
+"""
+Compiled forest engine for UPI Phishing Detection
+Flattens the fitted RandomForest into contiguous NumPy arrays and evaluates
+it without sklearn, matching predict_proba exactly.
+
+Layout (one directory of .npy files, loaded with mmap):
+    feature.npy    int32   (nodes,)    split feature, 0 for leaves (sorted)
+    threshold.npy  float32 (nodes,)    split threshold, see below
+    left.npy       int32   (nodes,)    left child; leaves point at themselves
+    right.npy      int32   (nodes,)    right child; leaves point at themselves
+    value.npy      float64 (nodes, 2)  normalized class probabilities per node
+    roots.npy      int32   (trees,)    root node of each tree
+    meta.json      depth, feature count, classes, source model checksum
+
+Exactness: sklearn compares float32 features against float64 thresholds.
+For a float32 x, "x <= t" equals "x <= t32" where t32 is the largest float32
+not above t, so thresholds are stored rounded down. Leaf probabilities stay
+float64 and tree outputs are summed in tree order, as sklearn does.
+
+Usage:
+    python ml/compiled_forest.py      # writes ml/models/upi_classifier.forest/
+"""
+
+import json
+import os
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+# Up to this many rows, branch decisions are computed for every node at once
+DENSE_ROWS = 8
+# Larger inputs are walked in row chunks that keep the working set in cache
+ROW_CHUNK = 256
+
+
+def compile_forest(model) -> dict:
+    """Flatten a fitted RandomForestClassifier into the arrays above"""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        nodes = np.arange(offset, offset + n, dtype=np.int64)
+
+        threshold = tree.threshold.astype(np.float32)
+        too_high = threshold.astype(np.float64) > tree.threshold
+        threshold[too_high] = np.nextafter(threshold[too_high], np.float32(-np.inf))
+
+        # Leaves loop back to themselves so every row can walk max_depth steps
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.float32(0), threshold))
+        lefts.append(np.where(is_leaf, nodes, tree.children_left + offset))
+        rights.append(np.where(is_leaf, nodes, tree.children_right + offset))
+
+        # Same normalization as DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    feature = np.concatenate(features)
+    # Renumber nodes so they are grouped by split feature (leaves count as
+    # feature 0): every node's branch for one row is then a comparison of the
+    # thresholds against that row's features repeated per group
+    order = np.argsort(feature, kind="stable")
+    new_id = np.empty_like(order)
+    new_id[order] = np.arange(len(order))
+
+    return {
+        "feature": feature[order].astype(np.int32),
+        "threshold": np.concatenate(thresholds)[order].astype(np.float32),
+        "left": new_id[np.concatenate(lefts)[order]].astype(np.int32),
+        "right": new_id[np.concatenate(rights)[order]].astype(np.int32),
+        "value": np.ascontiguousarray(np.concatenate(values)[order]),
+        "roots": new_id[np.array(roots)].astype(np.int32),
+        "max_depth": max_depth,
+        "n_features": int(model.n_features_in_),
+        "classes": [int(c) for c in model.classes_],
+    }
+
+
+def save_compiled(compiled: dict, path: str, source_checksum: str = None):
+    """Write compiled arrays as a directory of .npy files plus meta.json"""
+    os.makedirs(path, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(path, f"{name}.npy"), compiled[name])
+    meta = {
+        "max_depth": compiled["max_depth"],
+        "n_features": compiled["n_features"],
+        "classes": compiled["classes"],
+        "n_trees": len(compiled["roots"]),
+        "n_nodes": len(compiled["feature"]),
+        "source_checksum": source_checksum,
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+class CompiledForest:
+    """predict_proba-compatible evaluator over compiled forest arrays"""
+
+    def __init__(self, arrays: dict, max_depth: int, n_features: int, classes=(0, 1)):
+        # np.asarray drops the np.memmap subclass (slow to index) but keeps the mapping
+        self.feature = np.asarray(arrays["feature"])
+        self.threshold = np.asarray(arrays["threshold"])
+        self.left = np.asarray(arrays["left"])
+        self.right = np.asarray(arrays["right"])
+        self.value = np.asarray(arrays["value"])
+        self.roots = np.asarray(arrays["roots"])
+        # Children interleaved so one gather picks the branch: [2*node] left, [2*node+1] right
+        self.children = np.column_stack([self.left, self.right]).ravel()
+        # Nodes are grouped by feature: group sizes and right - left for the dense path
+        self.feature_counts = np.bincount(self.feature, minlength=n_features)
+        self.child_step = self.right - self.left
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.classes_ = np.array(classes)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CompiledForest":
+        """Load a compiled forest directory; arrays are memory-mapped by default"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS}
+        return cls(arrays, meta["max_depth"], meta["n_features"], meta["classes"])
+
+    @classmethod
+    def from_model(cls, model) -> "CompiledForest":
+        compiled = compile_forest(model)
+        return cls(compiled, compiled["max_depth"], compiled["n_features"], compiled["classes"])
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node index reached in every tree, shape (n, trees)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n = len(X)
+        node = np.tile(self.roots, (n, 1))
+
+        if n <= DENSE_ROWS:
+            # Few rows: decide every node's branch up front (a handful of large,
+            # cheap array ops), then each level is a single gather
+            n_nodes = len(self.feature)
+            go_right = np.repeat(X, self.feature_counts, axis=1) > self.threshold
+            next_node = (self.left + go_right * self.child_step).ravel()
+            row_offset = (np.arange(n) * n_nodes)[:, np.newaxis]
+            for _ in range(self.max_depth):
+                node = next_node[row_offset + node]
+            return node
+
+        # Many rows: all trees advance one level per step; finished rows sit on their leaf
+        flat_X = X.ravel()
+        row_offset = (np.arange(n) * self.n_features)[:, np.newaxis]
+        for _ in range(self.max_depth):
+            go_right = flat_X[row_offset + self.feature[node]] > self.threshold[node]
+            node = self.children[2 * node + go_right]
+        return node
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Class probabilities, shape (n, classes); mean of per-tree leaf probabilities"""
+        out = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), ROW_CHUNK):
+            leaf_values = self.value[self.apply(X[start:start + ROW_CHUNK])]   # (rows, trees, classes)
+            # cumsum adds trees strictly in order, like sklearn's accumulation
+            out[start:start + ROW_CHUNK] = np.cumsum(leaf_values, axis=1)[:, -1, :]
+        return out / len(self.roots)
+
+
+if __name__ == "__main__":
+    import sys
+    import joblib
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from ml.predictor import file_checksum
+
+    MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+    PKL_PATH = os.path.join(MODEL_DIR, "models", "upi_classifier.pkl")
+    FOREST_PATH = os.path.join(MODEL_DIR, "models", "upi_classifier.forest")
+
+    print(f"Loading scikit-learn model from {PKL_PATH}...")
+    model = joblib.load(PKL_PATH)
+
+    compiled = compile_forest(model)
+    save_compiled(compiled, FOREST_PATH, source_checksum=file_checksum(PKL_PATH))
+    size_kb = sum(os.path.getsize(os.path.join(FOREST_PATH, name)) for name in os.listdir(FOREST_PATH)) / 1024
+    print(f"✅ Compiled {len(compiled['roots'])} trees ({len(compiled['feature'])} nodes, "
+          f"{size_kb:.0f} KB) to {FOREST_PATH}")
+
+    # Verification against sklearn on random inputs in the feature ranges
+    print("Verifying compiled output matches sklearn...")
+    forest = CompiledForest.load(FOREST_PATH)
+    rng = np.random.default_rng(0)
+    X = (rng.random((2000, compiled["n_features"])) * rng.choice([1, 10, 50], compiled["n_features"])).astype(np.float32)
+    model.set_params(n_jobs=1)
+    diff = np.abs(forest.predict_proba(X) - model.predict_proba(X)).max()
+    print("Verification PASSED: Outputs match!" if diff == 0 else f"Warning: Outputs differ by {diff:.3g}")
@@ -29,7 +29,9 @@ def convert():
     initial_type = np.zeros((1, 11)).astype(np.float32)
     
     print("Converting to ONNX format...")
-    onx = to_onnx(model, initial_type, target_opset=12)
+    # Plain probability tensor (no ZipMap) so onnxruntime can return it without
+    # building one dict per row; the batch dimension stays dynamic
+    onx = to_onnx(model, initial_type, target_opset=12, options={id(model): {"zipmap": False}})
     
     with open(ONNX_PATH, "wb") as f:
         f.write(onx.SerializeToString())
@@ -51,9 +53,7 @@ def convert():
     print(f"   Sklearn prob (class 1): {sklearn_pred[0][1]:.4f}")
     
     try:
-        # Probability for class 1
-        # For RF classifier, the second output is a list of dicts or a tensor
-        # In most cases with to_onnx, it's a list of probabilities as second output
+        # Probability for class 1 (second output is an (n, 2) probability tensor)
         onnx_prob = onnx_pred[1][0][1]
         print(f"   ONNX prob (class 1):    {onnx_prob:.4f}")
         
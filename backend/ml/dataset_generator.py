@@ -3,8 +3,11 @@ Synthetic UPI Dataset Generator
 Generates realistic UPI IDs for training ML phishing detection model
 """
 
+import os
 import random
+import shutil
 import string
+import tempfile
 from typing import List, Tuple
 
 # Known legitimate UPI providers
@@ -44,72 +47,74 @@ SUSPICIOUS_MERCHANTS = [
 ]
 
 
-def generate_legitimate_upi(count: int) -> List[Tuple[str, int]]:
+def generate_legitimate_upi(count: int, rng=random) -> List[Tuple[str, int]]:
     """Generate legitimate UPI IDs with trusted domains"""
     upis = []
     
     for _ in range(count):
         # Choose between merchant name or random username
-        if random.random() < 0.6:
+        if rng.random() < 0.6:
             # Legitimate merchant
-            username = random.choice(LEGITIMATE_MERCHANTS)
-            if random.random() < 0.3:
-                username += str(random.randint(1, 999))
+            username = rng.choice(LEGITIMATE_MERCHANTS)
+            if rng.random() < 0.3:
+                username += str(rng.randint(1, 999))
         else:
             # Personal account (name-based)
-            username = ''.join(random.choices(string.ascii_lowercase, k=random.randint(5, 12)))
-            if random.random() < 0.5:
-                username += str(random.randint(1, 99))
+            username = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12)))
+            if rng.random() < 0.5:
+                username += str(rng.randint(1, 99))
         
-        domain = random.choice(TRUSTED_DOMAINS)
+        domain = rng.choice(TRUSTED_DOMAINS)
         upi = f"{username}@{domain}"
         upis.append((upi, 0))  # Label: 0 = legitimate
     
     return upis
 
 
-def generate_typosquatting_upi(count: int) -> List[Tuple[str, int]]:
+def generate_typosquatting_upi(count: int, rng=random) -> List[Tuple[str, int]]:
     """Generate typosquatting UPI IDs (brand impersonation)"""
     upis = []
+    merchants = LEGITIMATE_MERCHANTS + SUSPICIOUS_MERCHANTS
     
     for _ in range(count):
         # Mix of legitimate-looking usernames with typosquatted domains
-        if random.random() < 0.5:
-            username = random.choice(LEGITIMATE_MERCHANTS + SUSPICIOUS_MERCHANTS)
+        if rng.random() < 0.5:
+            username = rng.choice(merchants)
         else:
-            username = ''.join(random.choices(string.ascii_lowercase, k=random.randint(5, 10)))
+            username = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
         
-        if random.random() < 0.3:
-            username += str(random.randint(1, 999))
+        if rng.random() < 0.3:
+            username += str(rng.randint(1, 999))
         
-        domain = random.choice(TYPOSQUATTING_DOMAINS)
+        domain = rng.choice(TYPOSQUATTING_DOMAINS)
         upi = f"{username}@{domain}"
         upis.append((upi, 1))  # Label: 1 = phishing
     
     return upis
 
 
-def generate_phishing_keyword_upi(count: int) -> List[Tuple[str, int]]:
+def generate_phishing_keyword_upi(count: int, rng=random) -> List[Tuple[str, int]]:
     """Generate UPI IDs with phishing keywords"""
     upis = []
+    suspicious_domains = TYPOSQUATTING_DOMAINS + ['unknown', 'temp', 'test', 'fake']
     
     for _ in range(count):
         # Combine phishing keyword with brand or generic term
-        keyword = random.choice(PHISHING_KEYWORDS)
+        keyword = rng.choice(PHISHING_KEYWORDS)
         
-        if random.random() < 0.5:
+        if rng.random() < 0.5:
             # Brand + keyword (e.g., paytm-refund)
-            brand = random.choice(['paytm', 'phonepe', 'gpay', 'amazon', 'flipkart'])
-            username = f"{brand}{random.choice(['-', '_', ''])}{keyword}"
+            brand = rng.choice(['paytm', 'phonepe', 'gpay', 'amazon', 'flipkart'])
+            username = f"{brand}{rng.choice(['-', '_', ''])}{keyword}"
         else:
             # Keyword + number
-            username = f"{keyword}{random.randint(1, 999)}"
+            username = f"{keyword}{rng.randint(1, 999)}"
         
         # Mix of legitimate and suspicious domains
-        if random.random() < 0.4:
-            domain = random.choice(TRUSTED_DOMAINS)
+        if rng.random() < 0.4:
+            domain = rng.choice(TRUSTED_DOMAINS)
         else:
-            domain = random.choice(TYPOSQUATTING_DOMAINS + ['unknown', 'temp', 'test', 'fake'])
+            domain = rng.choice(suspicious_domains)
         
         upi = f"{username}@{domain}"
         upis.append((upi, 1))  # Label: 1 = phishing
@@ -117,20 +122,20 @@ def generate_phishing_keyword_upi(count: int) -> List[Tuple[str, int]]:
     return upis
 
 
-def generate_random_id_upi(count: int) -> List[Tuple[str, int]]:
+def generate_random_id_upi(count: int, rng=random) -> List[Tuple[str, int]]:
     """Generate high-entropy random UPI IDs (suspicious)"""
     upis = []
     
     for _ in range(count):
         # Random character sequences
-        length = random.randint(8, 15)
-        username = ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
+        length = rng.randint(8, 15)
+        username = ''.join(rng.choices(string.ascii_lowercase + string.digits, k=length))
         
         # Mix of domains
-        if random.random() < 0.3:
-            domain = random.choice(TRUSTED_DOMAINS)
+        if rng.random() < 0.3:
+            domain = rng.choice(TRUSTED_DOMAINS)
         else:
-            domain = ''.join(random.choices(string.ascii_lowercase, k=random.randint(4, 8)))
+            domain = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 8)))
         
         upi = f"{username}@{domain}"
         upis.append((upi, 1))  # Label: 1 = phishing
@@ -138,16 +143,17 @@ def generate_random_id_upi(count: int) -> List[Tuple[str, int]]:
     return upis
 
 
-def generate_numbers_only_upi(count: int) -> List[Tuple[str, int]]:
+def generate_numbers_only_upi(count: int, rng=random) -> List[Tuple[str, int]]:
     """Generate UPI IDs starting with only numbers (suspicious pattern)"""
     upis = []
+    domains = TRUSTED_DOMAINS + TYPOSQUATTING_DOMAINS + ['unknown', 'temp']
     
     for _ in range(count):
         # Numbers-only username
-        username = ''.join(random.choices(string.digits, k=random.randint(5, 10)))
+        username = ''.join(rng.choices(string.digits, k=rng.randint(5, 10)))
         
         # Mix of domains
-        domain = random.choice(TRUSTED_DOMAINS + TYPOSQUATTING_DOMAINS + ['unknown', 'temp'])
+        domain = rng.choice(domains)
         
         upi = f"{username}@{domain}"
         upis.append((upi, 1))  # Label: 1 = phishing
@@ -155,29 +161,40 @@ def generate_numbers_only_upi(count: int) -> List[Tuple[str, int]]:
     return upis
 
 
-def generate_dataset(total_samples: int = 10000) -> List[Tuple[str, int]]:
+# Category -> (generator, share of samples)
+CATEGORY_MIX = {
+    'legitimate': (generate_legitimate_upi, 0.5),         # 50% legitimate
+    'typosquatting': (generate_typosquatting_upi, 0.15),  # 15% typosquatting
+    'phishing_keyword': (generate_phishing_keyword_upi, 0.15),  # 15% phishing keywords
+    'random_id': (generate_random_id_upi, 0.1),           # 10% random IDs
+    'numbers_only': (generate_numbers_only_upi, 0.1),     # 10% numbers-only
+}
+
+# Sharded generation: rows per shard file, and rows generated/shuffled/written at a time
+SHARD_ROWS = 1_000_000
+CHUNK_ROWS = 100_000
+
+
+def category_counts(total_samples: int) -> dict:
+    """Samples per category; rounding leftovers go to 'legitimate' so counts sum to the total"""
+    counts = {name: int(total_samples * share) for name, (_, share) in CATEGORY_MIX.items()}
+    counts['legitimate'] += total_samples - sum(counts.values())
+    return counts
+
+
+def generate_dataset(total_samples: int = 10000, rng=random) -> List[Tuple[str, int]]:
     """
     Generate balanced synthetic UPI dataset
     
     Returns:
         List of (upi_id, label) tuples where label is 0 (legitimate) or 1 (phishing)
     """
-    # Distribution of samples
-    legitimate_count = int(total_samples * 0.5)  # 50% legitimate
-    typosquatting_count = int(total_samples * 0.15)  # 15% typosquatting
-    phishing_keyword_count = int(total_samples * 0.15)  # 15% phishing keywords
-    random_id_count = int(total_samples * 0.1)  # 10% random IDs
-    numbers_only_count = int(total_samples * 0.1)  # 10% numbers-only
-    
     dataset = []
-    dataset.extend(generate_legitimate_upi(legitimate_count))
-    dataset.extend(generate_typosquatting_upi(typosquatting_count))
-    dataset.extend(generate_phishing_keyword_upi(phishing_keyword_count))
-    dataset.extend(generate_random_id_upi(random_id_count))
-    dataset.extend(generate_numbers_only_upi(numbers_only_count))
+    for name, count in category_counts(total_samples).items():
+        dataset.extend(CATEGORY_MIX[name][0](count, rng))
     
     # Shuffle dataset
-    random.shuffle(dataset)
+    rng.shuffle(dataset)
     
     return dataset
 
@@ -197,13 +214,128 @@ def save_dataset(dataset: List[Tuple[str, int]], filepath: str = 'upi_dataset.cs
     print(f"   Phishing: {sum(1 for _, label in dataset if label == 1)}")
 
 
+def shard_seed(seed: int, shard: int) -> str:
+    """Per-shard RNG seed: shard output depends only on (seed, shard), not on the worker count"""
+    return f"{seed}:{shard}"
+
+
+def generate_shard(shard: int, rows: int, seed: int, out_dir: str) -> dict:
+    """
+    Generate one shard, streaming CHUNK_ROWS at a time to part-NNNNN.csv.
+    Each chunk has the category mix and is shuffled. Returns the shard's manifest entry.
+    """
+    import csv
+    
+    rng = random.Random(shard_seed(seed, shard))
+    filename = f"part-{shard:05d}.csv"
+    counts = dict.fromkeys(CATEGORY_MIX, 0)
+    
+    with open(os.path.join(out_dir, filename), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['upi_id', 'label'])
+        for start in range(0, rows, CHUNK_ROWS):
+            chunk = []
+            for name, count in category_counts(min(CHUNK_ROWS, rows - start)).items():
+                chunk.extend(CATEGORY_MIX[name][0](count, rng))
+                counts[name] += count
+            rng.shuffle(chunk)
+            writer.writerows(chunk)
+    
+    return {
+        'file': filename,
+        'rows': rows,
+        'legitimate': counts['legitimate'],
+        'phishing': rows - counts['legitimate'],
+        'categories': counts,
+    }
+
+
+def generate_sharded(total_samples: int, out_dir: str, shard_rows: int = SHARD_ROWS,
+                     workers: int = None, seed: int = 0) -> dict:
+    """
+    Generate total_samples rows as CSV shards in out_dir across a process pool,
+    then write manifest.json (shards, class and category counts). The output is
+    identical for any worker count. Returns the manifest.
+
+    Shards are built in a staging directory that then replaces out_dir, so no
+    part file from an earlier run survives. An existing out_dir without a
+    manifest.json (not a previous run's output) is refused.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    if os.path.isdir(out_dir) and os.listdir(out_dir) \
+            and not os.path.isfile(os.path.join(out_dir, 'manifest.json')):
+        raise ValueError(f"{out_dir} is not empty and has no manifest.json; refusing to replace it")
+    plan = [(shard, min(shard_rows, total_samples - start))
+            for shard, start in enumerate(range(0, total_samples, shard_rows))]
+    
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(out_dir)}.")
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            futures = [pool.submit(generate_shard, shard, rows, seed, staging) for shard, rows in plan]
+            shards = [future.result() for future in futures]
+        manifest = _write_manifest(staging, shards, seed, shard_rows, total_samples)
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.rename(staging, out_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def _write_manifest(out_dir: str, shards: list, seed: int, shard_rows: int, total_samples: int) -> dict:
+    """Write out_dir/manifest.json: shard list, class and category counts"""
+    import json
+    
+    categories = {name: sum(s['categories'][name] for s in shards) for name in CATEGORY_MIX}
+    manifest = {
+        'format': 'csv',
+        'seed': seed,
+        'shard_rows': shard_rows,
+        'total_rows': total_samples,
+        'legitimate': sum(s['legitimate'] for s in shards),
+        'phishing': sum(s['phishing'] for s in shards),
+        'categories': categories,
+        'shards': shards,
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
 if __name__ == "__main__":
+    import argparse
+    import time
+    
+    parser = argparse.ArgumentParser(description="Generate the synthetic UPI dataset")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--out", default="ml/data/upi_dataset.csv", help="CSV file (single-process mode)")
+    parser.add_argument("--shards-dir", help="write CSV shards + manifest.json here using a process pool")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible output (sharded default 0)")
+    args = parser.parse_args()
+    
+    if args.shards_dir:
+        print(f"🔄 Generating {args.rows:,} rows into {args.shards_dir} ...")
+        started = time.perf_counter()
+        manifest = generate_sharded(args.rows, args.shards_dir, shard_rows=args.shard_rows,
+                                    workers=args.workers, seed=args.seed or 0)
+        print(f"✅ {len(manifest['shards'])} shards in {time.perf_counter() - started:.1f}s")
+        print(f"   Legitimate: {manifest['legitimate']:,}")
+        print(f"   Phishing: {manifest['phishing']:,}")
+        raise SystemExit(0)
+    
     # Generate dataset
     print("🔄 Generating synthetic UPI dataset...")
-    dataset = generate_dataset(total_samples=10000)
+    dataset = generate_dataset(total_samples=args.rows,
+                               rng=random.Random(args.seed) if args.seed is not None else random)
     
     # Save to file
-    save_dataset(dataset, filepath='ml/data/upi_dataset.csv')
+    save_dataset(dataset, filepath=args.out)
     
     # Show examples
     print("\n📋 Sample UPI IDs:")
@@ -0,0 +1,152 @@
+"""
+On-disk feature matrix cache for UPI Phishing Detection
+
+Feature extraction for the training set runs once per (dataset, feature
+extractor) pair. Later training runs, sweeps and evaluations memory-map the
+cached matrices instead of recomputing them.
+
+Layout:
+    ml/data/feature_cache/
+    └── <dataset sha256[:16]>-<extractor version>/
+        ├── X.npy        float32 (rows, 11), training feature order
+        ├── y.npy        int8    (rows,)
+        └── meta.json    dataset path and checksum, extractor version, rows, build time
+
+Entries are built in a staging directory and renamed into place, so readers
+never see a partial one. Stale entries are never reused (the key changes);
+delete the directory to reclaim space.
+
+Usage:
+    python -m ml.feature_cache [dataset.csv | shards/ | dataset.cols/] [--workers N]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ml.columnar_dataset import IDS_FILE, LABELS_FILE, OFFSETS_FILE, csv_paths, is_columnar
+from ml.feature_extractor import FEATURE_NAMES, extract_feature_matrix, extractor_version
+
+CACHE_DIR = os.environ.get("CYPHER_FEATURE_CACHE_DIR", "ml/data/feature_cache")
+
+# IDs per parallel extraction task
+CHUNK_ROWS = 100_000
+
+
+def _data_files(path: str) -> list:
+    """Files holding a dataset's rows; metadata with build times (columns.json, manifest.json) is left out"""
+    if os.path.isfile(path):
+        return [path]
+    if is_columnar(path):
+        return [os.path.join(path, name) for name in (IDS_FILE, OFFSETS_FILE, LABELS_FILE)]
+    return csv_paths(path)
+
+
+def dataset_checksum(path: str) -> str:
+    """sha256 of a dataset's data files, so re-converting or re-sharding the same rows keeps the key"""
+    digest = hashlib.sha256()
+    for file_path in _data_files(path):
+        digest.update(os.path.basename(file_path).encode())
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(dataset_path: str, checksum: str = None) -> str:
+    return f"{(checksum or dataset_checksum(dataset_path))[:16]}-{extractor_version()}"
+
+
+def _fill_rows(path: str, start: int, upi_ids):
+    """Worker task: extract features for one chunk straight into the shared .npy file"""
+    X = np.load(path, mmap_mode='r+')
+    X[start:start + len(upi_ids)] = extract_feature_matrix(upi_ids)
+    X.flush()
+
+
+def build_feature_matrix(upi_ids, path: str, workers: int = None, chunk_rows: int = CHUNK_ROWS):
+    """Write the feature matrix for upi_ids to a .npy file, extracting chunks in a process pool"""
+    n = len(upi_ids)
+    X = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n, len(FEATURE_NAMES)))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or n <= chunk_rows:
+        if n:
+            X[:] = extract_feature_matrix(upi_ids)
+        X.flush()
+        return
+    X.flush()
+    del X
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_fill_rows, path, start, upi_ids[start:start + chunk_rows])
+                   for start in range(0, n, chunk_rows)]
+        for future in futures:
+            future.result()
+
+
+def cached_features(dataset_path: str, load_fn, workers: int = None, cache_dir: str = CACHE_DIR,
+                    mmap: bool = True):
+    """
+    (X, y) for a dataset: memory-mapped from the cache when present, otherwise
+    load_fn(dataset_path) -> (upi_ids, labels) is called, features are
+    extracted in parallel and the result is cached.
+    """
+    checksum = dataset_checksum(dataset_path)
+    key = cache_key(dataset_path, checksum)
+    entry = os.path.join(cache_dir, key)
+    mode = 'r' if mmap else None
+
+    if not os.path.exists(os.path.join(entry, "meta.json")):
+        started = time.perf_counter()
+        upi_ids, labels = load_fn(dataset_path)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=cache_dir, prefix=f".{key}.")
+        try:
+            build_feature_matrix(upi_ids, os.path.join(staging, "X.npy"), workers=workers)
+            np.save(os.path.join(staging, "y.npy"), np.asarray(labels, dtype=np.int8))
+            with open(os.path.join(staging, "meta.json"), 'w') as f:
+                json.dump({
+                    "dataset_path": dataset_path,
+                    "dataset_sha256": checksum,
+                    "extractor_version": extractor_version(),
+                    "feature_names": FEATURE_NAMES,
+                    "rows": len(upi_ids),
+                    "created_at": datetime.utcnow().isoformat(),
+                    "build_seconds": round(time.perf_counter() - started, 2),
+                }, f, indent=2)
+            os.rename(staging, entry)
+        except OSError:
+            # Another process published the same entry first; use theirs
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.exists(os.path.join(entry, "meta.json")):
+                raise
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    X = np.load(os.path.join(entry, "X.npy"), mmap_mode=mode)
+    y = np.load(os.path.join(entry, "y.npy"), mmap_mode=mode)
+    return X, y
+
+
+if __name__ == "__main__":
+    import argparse
+    from ml.train_model import load_dataset
+
+    parser = argparse.ArgumentParser(description="Build (or check) the cached feature matrix for a dataset")
+    parser.add_argument("dataset", nargs="?", default="ml/data/upi_dataset.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    X, y = cached_features(args.dataset, load_dataset, workers=args.workers)
+    print(f"✅ Features for {args.dataset}: {X.shape[0]:,} rows "
+          f"({time.perf_counter() - started:.1f}s) in {os.path.join(CACHE_DIR, cache_key(args.dataset))}")
@@ -4,8 +4,10 @@ Converts UPI IDs into numerical features for ML model
 """
 
 import re
+import os
 import math
-from typing import Dict, List
+import numpy as np
+from typing import Dict, List, Sequence
 from collections import Counter
 
 
@@ -31,6 +33,23 @@ LEGITIMATE_BRANDS = {
     'phonepe', 'googlepay', 'gpay'
 }
 
+# Placeholder domains that never earn a neutral reputation
+INVALID_DOMAINS = ['unknown', 'temp', 'test', 'fake']
+
+# Feature order used by the model (must match training order)
+FEATURE_NAMES = [
+    'username_length', 'domain_length', 'total_length',
+    'digit_ratio', 'special_char_ratio', 'entropy',
+    'has_trusted_domain', 'has_phishing_keyword', 'starts_with_digits',
+    'min_brand_distance', 'domain_reputation'
+]
+
+# Below this many IDs the per-ID path is cheaper than array setup
+VECTORIZE_MIN_BATCH = 32
+
+# Rows processed per vectorized chunk (bounds the (rows x 128) histogram)
+CHUNK_SIZE = 16384
+
 
 def calculate_entropy(text: str) -> float:
     """Calculate Shannon entropy of text (randomness measure)"""
@@ -64,11 +83,176 @@ def levenshtein_distance(s1: str, s2: str) -> int:
     return previous_row[-1]
 
 
+class BrandIndex:
+    """
+    Exact nearest-brand search by Levenshtein distance
+    
+    Brands are indexed by their characters and padded bigrams. For a query,
+    a lower bound on the edit distance to every brand is computed from the
+    shared postings: the bag distance (unmatched characters) and the bigram
+    bound (each edit destroys at most two bigrams). Brands are then verified
+    in increasing lower-bound order with a Levenshtein DP vectorized across
+    candidates, stopping once no remaining brand can beat the best found.
+    """
+    
+    # Candidates verified per DP call
+    VERIFY_CHUNK = 256
+    
+    def __init__(self, brands=()):
+        self.brands = sorted({b.strip().lower() for b in brands if b and b.strip()})
+        self._brand_set = set(self.brands)
+        
+        n = len(self.brands)
+        self.lengths = np.array([len(b) for b in self.brands], dtype=np.int32)
+        
+        # Padded code points for the vectorized DP (0 = padding)
+        width = int(self.lengths.max()) if n else 1
+        self.codes = np.zeros((n, width), dtype=np.uint32)
+        for i, brand in enumerate(self.brands):
+            self.codes[i, :len(brand)] = [ord(c) for c in brand]
+        
+        # Inverted indexes: char -> (brand ids, occurrences), bigram -> brand ids
+        char_postings = {}
+        gram_postings = {}
+        self.gram_counts = np.zeros(n, dtype=np.int32)
+        for i, brand in enumerate(self.brands):
+            for char, count in Counter(brand).items():
+                char_postings.setdefault(char, []).append((i, count))
+            grams = self._bigrams(brand)
+            self.gram_counts[i] = len(grams)
+            for gram in grams:
+                gram_postings.setdefault(gram, []).append(i)
+        self.char_postings = {
+            char: (np.array([i for i, _ in entries], dtype=np.int32),
+                   np.array([c for _, c in entries], dtype=np.int32))
+            for char, entries in char_postings.items()
+        }
+        self.gram_postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in gram_postings.items()}
+    
+    @classmethod
+    def from_file(cls, filepath: str, include_builtin: bool = True) -> 'BrandIndex':
+        """Build an index from a text file with one brand per line ('#' starts a comment)"""
+        brands = set(LEGITIMATE_BRANDS) if include_builtin else set()
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                brand = line.split('#', 1)[0].strip()
+                if brand:
+                    brands.add(brand)
+        return cls(brands)
+    
+    def __len__(self):
+        return len(self.brands)
+    
+    @staticmethod
+    def _bigrams(text: str) -> set:
+        padded = f"\x02{text}\x03"
+        return {padded[i:i + 2] for i in range(len(padded) - 1)}
+    
+    def lower_bounds(self, word: str) -> np.ndarray:
+        """Lower bound of levenshtein_distance(word, brand) for every brand"""
+        n = len(self.brands)
+        
+        # Bag distance: characters that cannot be matched (covers length difference)
+        shared_chars = np.zeros(n, dtype=np.int32)
+        for char, count in Counter(word).items():
+            entry = self.char_postings.get(char)
+            if entry is not None:
+                ids, counts = entry
+                shared_chars[ids] += np.minimum(counts, count)
+        
+        # Bigram bound: each missing bigram needs an edit, one edit destroys at most two
+        grams = self._bigrams(word)
+        shared_grams = np.zeros(n, dtype=np.int32)
+        for gram in grams:
+            ids = self.gram_postings.get(gram)
+            if ids is not None:
+                shared_grams[ids] += 1
+        
+        return np.maximum.reduce([
+            len(word) - shared_chars,
+            self.lengths - shared_chars,
+            (len(grams) - shared_grams + 1) // 2,
+            (self.gram_counts - shared_grams + 1) // 2,
+        ])
+    
+    def distances(self, word: str, ids: np.ndarray) -> np.ndarray:
+        """Exact Levenshtein distance from word to each brand in ids"""
+        lengths = self.lengths[ids]
+        width = int(lengths.max())
+        codes = self.codes[ids, :width]
+        cols = np.arange(width + 1, dtype=np.int32)
+        
+        # Row i of the DP table for all candidates at once
+        previous = np.broadcast_to(cols, (len(ids), width + 1))
+        for i, c in enumerate(word, 1):
+            cost = (codes != ord(c)).astype(np.int32)
+            step = np.minimum(previous[:, :-1] + cost, previous[:, 1:] + 1)
+            current = np.empty_like(previous)
+            current[:, 0] = i
+            current[:, 1:] = step
+            # Insertions: current[j] = min_k<=j(current[k] + j - k)
+            current = np.minimum.accumulate(current - cols, axis=1) + cols
+            previous = current
+        
+        return previous[np.arange(len(ids)), lengths]
+    
+    def nearest_distance(self, word: str) -> int:
+        """Minimum Levenshtein distance from word to any indexed brand"""
+        if not self.brands:
+            return 999
+        if word in self._brand_set:
+            return 0
+        
+        bounds = self.lower_bounds(word)
+        best = None
+        for bound in np.unique(bounds):
+            if best is not None and bound >= best:
+                break
+            candidates = np.flatnonzero(bounds == bound)
+            # Verify in small chunks: a hit equal to the bound ends the search
+            for start in range(0, len(candidates), self.VERIFY_CHUNK):
+                distance = int(self.distances(word, candidates[start:start + self.VERIFY_CHUNK]).min())
+                if best is None or distance < best:
+                    best = distance
+                if best == bound:
+                    return best
+        
+        return best
+
+
+# Built once at import; set CYPHER_BRANDS_FILE to extend the brand list
+_brand_index = BrandIndex(LEGITIMATE_BRANDS)
+
+
+def load_brand_index(filepath: str, include_builtin: bool = True) -> BrandIndex:
+    """Rebuild the global brand index from a brand list file"""
+    global _brand_index
+    _brand_index = BrandIndex.from_file(filepath, include_builtin=include_builtin)
+    return _brand_index
+
+
+if os.environ.get("CYPHER_BRANDS_FILE"):
+    load_brand_index(os.environ["CYPHER_BRANDS_FILE"])
+
+
+def extractor_version() -> str:
+    """
+    Short hash identifying what extract_feature_matrix computes: this module's
+    source, the feature order and the active brand list. Cached feature
+    matrices are keyed by it (see ml/feature_cache.py).
+    """
+    import hashlib
+    digest = hashlib.sha256()
+    with open(os.path.abspath(__file__), 'rb') as f:
+        digest.update(f.read())
+    digest.update('\n'.join(FEATURE_NAMES).encode())
+    digest.update('\n'.join(_brand_index.brands).encode())
+    return digest.hexdigest()[:12]
+
+
 def min_brand_distance(username: str) -> int:
     """Calculate minimum Levenshtein distance to known brands"""
-    if not LEGITIMATE_BRANDS:
-        return 999
-    return min(levenshtein_distance(username.lower(), brand) for brand in LEGITIMATE_BRANDS)
+    return _brand_index.nearest_distance(username.lower())
 
 
 def extract_features(upi_id: str) -> Dict[str, float]:
@@ -129,7 +313,7 @@ def extract_features(upi_id: str) -> Dict[str, float]:
     # Domain reputation score (0-1)
     if has_trusted_domain:
         domain_reputation = 1.0
-    elif domain_length < 3 or domain_lower in ['unknown', 'temp', 'test', 'fake']:
+    elif domain_length < 3 or domain_lower in INVALID_DOMAINS:
         domain_reputation = 0.0
     else:
         domain_reputation = 0.5
@@ -150,8 +334,132 @@ def extract_features(upi_id: str) -> Dict[str, float]:
 
 
 def extract_features_batch(upi_ids: List[str]) -> List[Dict[str, float]]:
-    """Extract features for multiple UPI IDs"""
-    return [extract_features(upi_id) for upi_id in upi_ids]
+    """
+    Extract features for multiple UPI IDs as dicts (vectorized; use extract_feature_matrix for model input).
+    Values equal extract_features' except entropy, which sums in a different order and may differ by an ulp.
+    """
+    X = extract_feature_matrix(upi_ids, dtype=np.float64)
+    return [dict(zip(FEATURE_NAMES, row)) for row in X.tolist()]
+
+
+def feature_vector(upi_id: str) -> List[float]:
+    """Extract features for one UPI ID as a list in FEATURE_NAMES order"""
+    features = extract_features(upi_id)
+    return [features[name] for name in FEATURE_NAMES]
+
+
+def extract_feature_matrix(upi_ids: Sequence[str], dtype=np.float32) -> np.ndarray:
+    """
+    Extract features for many UPI IDs straight into a model-ready matrix
+    
+    Character classes, lengths, entropy and domain flags are computed with
+    array operations over the whole batch; brand distance is computed once
+    per distinct username. Values match extract_features (cast to dtype).
+    
+    Returns:
+        C-contiguous array of shape (len(upi_ids), 11), float32 by default
+    """
+    n = len(upi_ids)
+    X = np.empty((n, len(FEATURE_NAMES)), dtype=dtype)
+    
+    if n < VECTORIZE_MIN_BATCH:
+        for i, upi_id in enumerate(upi_ids):
+            X[i] = feature_vector(upi_id)
+        return X
+    
+    for start in range(0, n, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, n)
+        _fill_feature_chunk(X[start:stop], upi_ids[start:stop])
+    
+    return X
+
+
+def _fill_feature_chunk(out: np.ndarray, upi_ids: Sequence[str]):
+    """Vectorized feature extraction for one chunk, written into out"""
+    ids = np.asarray(upi_ids, dtype=np.str_)
+    n = len(ids)
+    
+    # UTF-32 code points, one row per ID (zero padded)
+    codes = ids.view(np.uint32).reshape(n, -1)
+    width = codes.shape[1]
+    
+    total_length = np.char.str_len(ids)
+    
+    # Split at the first '@'
+    is_at = codes == ord('@')
+    has_at = is_at.any(axis=1)
+    username_length = np.where(has_at, is_at.argmax(axis=1), 0)
+    domain_length = np.where(has_at, total_length - username_length - 1, 0)
+    in_username = np.arange(width)[None, :] < username_length[:, None]
+    
+    # Character composition (ASCII classes; non-ASCII rows are redone below)
+    is_digit = (codes >= ord('0')) & (codes <= ord('9'))
+    is_alnum = (
+        is_digit
+        | ((codes >= ord('a')) & (codes <= ord('z')))
+        | ((codes >= ord('A')) & (codes <= ord('Z')))
+    )
+    digit_count = (is_digit & in_username).sum(axis=1)
+    special_char_count = (~is_alnum & in_username).sum(axis=1)
+    safe_length = np.maximum(username_length, 1)
+    digit_ratio = np.where(username_length > 0, digit_count / safe_length, 0.0)
+    special_char_ratio = np.where(username_length > 0, special_char_count / safe_length, 0.0)
+    starts_with_digits = (username_length > 0) & is_digit[:, 0]
+    
+    # Entropy from a per-row character histogram
+    rows, cols = np.nonzero(in_username)
+    char_codes = np.minimum(codes[rows, cols], 127)
+    counts = np.bincount(rows * 128 + char_codes, minlength=n * 128).reshape(n, 128)
+    p = counts / safe_length[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -np.where(counts > 0, p * np.log2(p), 0.0).sum(axis=1)
+    
+    # Keyword / domain flags on lowercased parts
+    parts = np.char.partition(ids, '@')
+    username_lower = np.char.lower(parts[:, 0])
+    domain_lower = np.char.lower(parts[:, 2])
+    
+    has_trusted_domain = np.zeros(n, dtype=bool)
+    for trusted in TRUSTED_DOMAINS:
+        has_trusted_domain |= np.char.find(domain_lower, trusted) >= 0
+    
+    has_phishing_keyword = np.zeros(n, dtype=bool)
+    for keyword in PHISHING_KEYWORDS:
+        has_phishing_keyword |= np.char.find(username_lower, keyword) >= 0
+    
+    domain_reputation = np.where(
+        has_trusted_domain, 1.0,
+        np.where((domain_length < 3) | np.isin(domain_lower, INVALID_DOMAINS), 0.0, 0.5)
+    )
+    
+    # Brand similarity, once per distinct username
+    brand_distance = np.full(n, 999.0)
+    distinct, inverse = np.unique(username_lower[has_at], return_inverse=True)
+    distances = np.array([min_brand_distance(str(u)) for u in distinct], dtype=np.float64)
+    brand_distance[has_at] = distances[inverse.reshape(-1)]
+    
+    out[:, 0] = username_length
+    out[:, 1] = domain_length
+    out[:, 2] = total_length
+    out[:, 3] = digit_ratio
+    out[:, 4] = special_char_ratio
+    out[:, 5] = entropy
+    out[:, 6] = has_trusted_domain
+    out[:, 7] = has_phishing_keyword
+    out[:, 8] = starts_with_digits
+    out[:, 9] = brand_distance
+    out[:, 10] = domain_reputation
+    
+    # Invalid UPI format - same high-risk row as extract_features
+    invalid = ~has_at
+    if invalid.any():
+        out[invalid] = 0
+        out[invalid, 2] = total_length[invalid]
+        out[invalid, 9] = 999
+    
+    # Non-ASCII IDs need Unicode-aware isdigit/isalnum/lower
+    for i in np.flatnonzero((codes > 127).any(axis=1)):
+        out[i] = feature_vector(str(ids[i]))
 
 
 if __name__ == "__main__":
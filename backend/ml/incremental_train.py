@@ -0,0 +1,191 @@
+"""
+Incremental model updates from analyst-labelled scans
+
+Grows the served Random Forest with a few new trees fitted only on scans
+labelled since the last update, then publishes the result as a new model
+version. Cost scales with the number of new labels, not with the training
+set or the scan history.
+
+- Labels are scan_records.analyst_label (1 phishing / 0 legitimate, set via
+  POST /api/ml/labels), read in batches in (labelled_at, id) order.
+- labelled_at is stamped before the label's transaction commits, so a label
+  can become visible after a later-stamped one was already read. Only labels
+  older than CYPHER_LABEL_SETTLE_SECONDS (default 60) are read; the watermark
+  never passes a label that might still be committing.
+- The base model is the active version (or the legacy pickle). Its manifest's
+  metrics.label_watermark marks the last label it has seen; the legacy pickle
+  and full retrains have none, so every label counts as new.
+- warm_start leaves the existing trees untouched; only the --trees new ones see
+  the new data. The published manifest records the new watermark.
+- Updates need at least --min-labels new labels covering both classes;
+  otherwise nothing is published and the labels stay pending.
+
+Usage:
+    python ml/incremental_train.py [--trees 10] [--batch-size 5000] [--min-labels 50] [--activate]
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sqlalchemy import select, tuple_
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import engine
+from app.models import ScanRecord
+from ml.feature_extractor import extract_feature_matrix
+from ml.model_store import (
+    MODELS_DIR,
+    ModelStoreError,
+    get_active_version,
+    load_manifest,
+    publish_model,
+    set_active_version,
+    verify_version,
+)
+
+LEGACY_MODEL = "upi_classifier.pkl"
+
+# Labels stamped more recently than this may still be in uncommitted transactions
+LABEL_SETTLE_SECONDS = float(os.environ.get("CYPHER_LABEL_SETTLE_SECONDS", "60"))
+
+
+def load_base_model(models_dir: str = MODELS_DIR):
+    """(model, version or None for the legacy pickle, label watermark or None)"""
+    version = get_active_version(models_dir)
+    if version is None:
+        return joblib.load(os.path.join(models_dir, LEGACY_MODEL)), None, None
+    model = joblib.load(verify_version(version, models_dir))
+    watermark = load_manifest(version, models_dir).get("metrics", {}).get("label_watermark")
+    return model, version, watermark
+
+
+def iter_label_batches(watermark: dict = None, batch_size: int = 5000, bind=engine,
+                       settle_seconds: float = LABEL_SETTLE_SECONDS):
+    """Yield [(id, upi_id, label, labelled_at), ...] batches of settled labels after the watermark, oldest first"""
+    cursor = None
+    if watermark:
+        cursor = (datetime.fromisoformat(watermark["labelled_at"]), watermark["id"])
+    settled_before = datetime.utcnow() - timedelta(seconds=settle_seconds)
+
+    with bind.connect() as conn:
+        while True:
+            query = (
+                select(ScanRecord.id, ScanRecord.upi_id, ScanRecord.analyst_label, ScanRecord.labelled_at)
+                .where(ScanRecord.analyst_label.is_not(None), ScanRecord.labelled_at < settled_before)
+                .order_by(ScanRecord.labelled_at, ScanRecord.id)
+                .limit(batch_size)
+            )
+            if cursor is not None:
+                query = query.where(tuple_(ScanRecord.labelled_at, ScanRecord.id) > tuple_(*cursor))
+            rows = conn.execute(query).all()
+            if not rows:
+                return
+            yield rows
+            cursor = (rows[-1].labelled_at, rows[-1].id)
+            if len(rows) < batch_size:
+                return
+
+
+def collect_new_labels(watermark: dict = None, batch_size: int = 5000, bind=engine,
+                       settle_seconds: float = LABEL_SETTLE_SECONDS):
+    """(X, y, new watermark) for all settled labels after `watermark`; features are extracted batch by batch"""
+    X_parts, y_parts = [], []
+    new_watermark = watermark
+    for rows in iter_label_batches(watermark, batch_size, bind, settle_seconds):
+        labelled = [row for row in rows if row.upi_id]
+        if labelled:
+            X_parts.append(extract_feature_matrix([row.upi_id for row in labelled]))
+            y_parts.append(np.array([row.analyst_label for row in labelled], dtype=np.int8))
+        last = rows[-1]
+        new_watermark = {"labelled_at": last.labelled_at.isoformat(), "id": last.id}
+
+    if not X_parts:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int8), new_watermark
+    return np.concatenate(X_parts), np.concatenate(y_parts), new_watermark
+
+
+def add_trees(model: RandomForestClassifier, X, y, trees: int) -> RandomForestClassifier:
+    """Fit `trees` more estimators on (X, y) only, keeping the existing ones"""
+    if not isinstance(model, RandomForestClassifier):
+        raise ModelStoreError(f"Incremental updates need a RandomForestClassifier, got {type(model).__name__}")
+    if set(np.unique(y).tolist()) != set(model.classes_.tolist()):
+        # A forest whose trees disagree on the class set can't average probabilities
+        raise ValueError("New labels must include every class the model predicts")
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + trees)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return model
+
+
+def main(trees: int = 10, batch_size: int = 5000, min_labels: int = 50, activate: bool = False,
+         models_dir: str = MODELS_DIR, bind=engine, settle_seconds: float = LABEL_SETTLE_SECONDS):
+    """Incremental update pipeline; returns the published version, or None when there was nothing to do"""
+    print("=" * 60)
+    print("  UPI Phishing Detection - Incremental Model Update")
+    print("=" * 60)
+
+    model, base_version, watermark = load_base_model(models_dir)
+    print(f"\n📦 Base model: {base_version or LEGACY_MODEL} ({len(model.estimators_)} trees)")
+    print(f"   Labels after: {watermark['labelled_at'] + ' #' + str(watermark['id']) if watermark else 'beginning'}")
+
+    print("\n📂 Reading new analyst labels...")
+    X, y, new_watermark = collect_new_labels(watermark, batch_size, bind, settle_seconds)
+    class_counts = np.bincount(y, minlength=2)
+    print(f"   New labels: {len(y)} (legitimate {class_counts[0]}, phishing {class_counts[1]})")
+
+    if len(y) < min_labels or not class_counts.all():
+        print(f"\n⏸️  Not enough new labels (need {min_labels}, both classes); nothing published")
+        return None
+
+    base_accuracy = float((model.predict(X) == y).mean())
+    print(f"   Base model accuracy on new labels: {base_accuracy:.2%}")
+
+    print(f"\n🌲 Adding {trees} trees fitted on the new labels...")
+    add_trees(model, X, y, trees)
+    accuracy = float((model.predict(X) == y).mean())
+    print(f"   Updated model accuracy on new labels: {accuracy:.2%}")
+
+    fd, tmp_path = tempfile.mkstemp(dir=models_dir, suffix=".pkl.tmp")
+    os.close(fd)
+    try:
+        joblib.dump(model, tmp_path)
+        version = publish_model(tmp_path, models_dir=models_dir, metrics={
+            "incremental": True,
+            "base_version": base_version,
+            "label_watermark": new_watermark,
+            "new_labels": int(len(y)),
+            "trees_added": trees,
+            "n_estimators": len(model.estimators_),
+            "base_accuracy_on_new": round(base_accuracy, 4),
+            "accuracy_on_new": round(accuracy, 4),
+        })
+    finally:
+        os.remove(tmp_path)
+
+    print(f"\n📦 Published model version {version}")
+    if activate:
+        set_active_version(version, models_dir)
+        print("   Activated (running servers reload it within CYPHER_MODEL_WATCH_SECONDS)")
+    else:
+        print(f"   Serve it with: python -m ml.model_store activate {version}")
+    return version
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Add trees fitted on newly labelled scans and publish a new version")
+    parser.add_argument("--trees", type=int, default=10, help="trees to add (default 10)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="labels read per query")
+    parser.add_argument("--min-labels", type=int, default=50, help="minimum new labels to publish an update")
+    parser.add_argument("--activate", action="store_true", help="make the new version active")
+    parser.add_argument("--settle-seconds", type=float, default=LABEL_SETTLE_SECONDS,
+                        help="skip labels set more recently than this (default CYPHER_LABEL_SETTLE_SECONDS)")
+    args = parser.parse_args()
+    main(trees=args.trees, batch_size=args.batch_size, min_labels=args.min_labels, activate=args.activate,
+         settle_seconds=args.settle_seconds)
@@ -0,0 +1,176 @@
+"""
+Versioned model store for UPI Phishing Detection
+
+Layout:
+    ml/models/
+    ├── ACTIVE                     # name of the version being served (absent: legacy pickle)
+    ├── upi_classifier.pkl         # legacy single model, served when nothing is active
+    └── <version>/
+        ├── model.pkl
+        ├── feature_schema.json    # feature names/order the model was trained on
+        └── manifest.json          # version, sha256, size, created_at, metrics
+
+Versions are immutable once published. The server loads whatever ACTIVE names,
+so activating or rolling back is a pointer change (see app/services/registry.py).
+
+Usage:
+    python -m ml.model_store publish [model.pkl] [--version V] [--activate]
+    python -m ml.model_store list
+    python -m ml.model_store activate <version>
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from ml.feature_extractor import FEATURE_NAMES
+
+MODELS_DIR = os.environ.get("CYPHER_MODELS_DIR", "ml/models")
+
+MODEL_FILE = "model.pkl"
+MANIFEST_FILE = "manifest.json"
+SCHEMA_FILE = "feature_schema.json"
+ACTIVE_FILE = "ACTIVE"
+
+
+class ModelStoreError(Exception):
+    """A version is missing, corrupt or incompatible with this feature extractor"""
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def version_dir(version: str, models_dir: str = MODELS_DIR) -> str:
+    if not version or os.sep in version or version.startswith('.'):
+        raise ModelStoreError(f"Invalid model version: {version!r}")
+    return os.path.join(models_dir, version)
+
+
+def publish_model(model_path: str, version: str = None, models_dir: str = MODELS_DIR,
+                  metrics: dict = None, activate: bool = False) -> str:
+    """
+    Copy a trained model into a new immutable version directory with its
+    feature schema and manifest. Returns the version name.
+    """
+    checksum = sha256_file(model_path)
+    version = version or f"{datetime.utcnow():%Y%m%d-%H%M%S}-{checksum[:8]}"
+    final_dir = version_dir(version, models_dir)
+    if os.path.exists(final_dir):
+        raise ModelStoreError(f"Model version already exists: {version}")
+
+    # Build in a temp directory, then rename: readers never see a partial version
+    os.makedirs(models_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=models_dir, prefix=f".{version}.")
+    try:
+        shutil.copyfile(model_path, os.path.join(staging, MODEL_FILE))
+        with open(os.path.join(staging, SCHEMA_FILE), 'w') as f:
+            json.dump({"feature_names": FEATURE_NAMES}, f, indent=2)
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump({
+                "version": version,
+                "created_at": datetime.utcnow().isoformat(),
+                "model_file": MODEL_FILE,
+                "sha256": checksum,
+                "size_bytes": os.path.getsize(model_path),
+                "metrics": metrics or {},
+            }, f, indent=2)
+        os.rename(staging, final_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate:
+        set_active_version(version, models_dir)
+    return version
+
+
+def load_manifest(version: str, models_dir: str = MODELS_DIR) -> dict:
+    path = os.path.join(version_dir(version, models_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise ModelStoreError(f"Unknown model version: {version}")
+    with open(path) as f:
+        return json.load(f)
+
+
+def verify_version(version: str, models_dir: str = MODELS_DIR) -> str:
+    """Check checksum and feature schema; returns the model file path"""
+    manifest = load_manifest(version, models_dir)
+    directory = version_dir(version, models_dir)
+    model_path = os.path.join(directory, manifest["model_file"])
+
+    if sha256_file(model_path) != manifest["sha256"]:
+        raise ModelStoreError(f"Checksum mismatch for model version {version}")
+    with open(os.path.join(directory, SCHEMA_FILE)) as f:
+        feature_names = json.load(f)["feature_names"]
+    if feature_names != FEATURE_NAMES:
+        raise ModelStoreError(f"Model version {version} was trained on a different feature schema")
+    return model_path
+
+
+def list_versions(models_dir: str = MODELS_DIR) -> list:
+    """Manifests of all published versions, oldest first"""
+    manifests = []
+    if os.path.isdir(models_dir):
+        for name in os.listdir(models_dir):
+            if os.path.exists(os.path.join(models_dir, name, MANIFEST_FILE)):
+                manifests.append(load_manifest(name, models_dir))
+    return sorted(manifests, key=lambda m: m["created_at"])
+
+
+def get_active_version(models_dir: str = MODELS_DIR):
+    """Version named by the ACTIVE pointer, or None for the legacy pickle"""
+    path = os.path.join(models_dir, ACTIVE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+
+def set_active_version(version, models_dir: str = MODELS_DIR):
+    """Point ACTIVE at a version (None removes it: serve the legacy pickle)"""
+    path = os.path.join(models_dir, ACTIVE_FILE)
+    if version is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    load_manifest(version, models_dir)  # must exist
+    fd, tmp_path = tempfile.mkstemp(dir=models_dir, suffix=".tmp")
+    with os.fdopen(fd, 'w') as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage versioned models")
+    sub = parser.add_subparsers(dest="command", required=True)
+    publish = sub.add_parser("publish")
+    publish.add_argument("model_path", nargs="?", default=os.path.join(MODELS_DIR, "upi_classifier.pkl"))
+    publish.add_argument("--version")
+    publish.add_argument("--activate", action="store_true")
+    sub.add_parser("list")
+    activate = sub.add_parser("activate")
+    activate.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        version = publish_model(args.model_path, version=args.version, activate=args.activate)
+        print(f"📦 Published model version {version}" + (" (active)" if args.activate else ""))
+    elif args.command == "list":
+        active = get_active_version()
+        for manifest in list_versions():
+            marker = "*" if manifest["version"] == active else " "
+            print(f" {marker} {manifest['version']:32s} {manifest['created_at']}  {manifest['sha256'][:12]}")
+    elif args.command == "activate":
+        verify_version(args.version)
+        set_active_version(args.version)
+        print(f"✅ Active model version: {args.version}")
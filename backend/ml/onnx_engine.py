@@ -0,0 +1,63 @@
+"""
+ONNX Runtime inference engine for UPI Phishing Detection
+Serves predict_proba from the converted upi_classifier.onnx
+"""
+
+import threading
+import numpy as np
+
+
+class OnnxEngine:
+    """predict_proba-compatible wrapper around an onnxruntime InferenceSession"""
+    
+    def __init__(self, onnx_path: str, intra_op_threads: int = 1, inter_op_threads: int = 1,
+                 initial_batch: int = 64):
+        """Create a tuned CPU session for the model at onnx_path"""
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.n_features = model_input.shape[1]
+        
+        # Second output holds class probabilities: a tensor, or a
+        # sequence of {class: prob} maps when converted with ZipMap
+        probability_output = self.session.get_outputs()[1]
+        self.output_name = probability_output.name
+        self._zipmap = probability_output.type.startswith("seq")
+        
+        self.initial_batch = initial_batch
+        self._local = threading.local()
+    
+    def _input_buffer(self, n: int) -> np.ndarray:
+        """Per-thread float32 input buffer, grown to the next power of two as needed"""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < n:
+            capacity = max(self.initial_batch, 1 << (n - 1).bit_length())
+            buffer = np.empty((capacity, self.n_features), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer[:n]
+    
+    def predict_proba(self, X) -> np.ndarray:
+        """Class probabilities for a batch of any size, shape (n, 2)"""
+        n = len(X)
+        if n == 0:
+            return np.empty((0, 2), dtype=np.float32)
+        
+        inputs = self._input_buffer(n)
+        inputs[...] = X
+        probabilities = self.session.run([self.output_name], {self.input_name: inputs})[0]
+        
+        if self._zipmap:
+            return np.array([[row[0], row[1]] for row in probabilities], dtype=np.float32)
+        return probabilities
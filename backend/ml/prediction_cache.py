@@ -0,0 +1,87 @@
+"""
+Prediction cache for UPI Phishing Detection
+Bounded LRU cache with a per-entry TTL, safe to share across threads
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class PredictionCache:
+    """Size-bounded LRU cache whose entries expire after ttl seconds"""
+    
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0, clock=time.monotonic):
+        """maxsize <= 0 disables caching"""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+    
+    def get(self, key: Hashable) -> Optional[float]:
+        """Return the cached value, or None on a miss or expired entry"""
+        if not self.enabled:
+            return None
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, value = entry
+            if self._clock() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: float):
+        """Insert or refresh an entry, evicting least recently used ones over maxsize"""
+        if not self.enabled:
+            return
+        
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -4,51 +4,179 @@ Loads trained model and provides prediction interface
 """
 
 import os
+import copy
+import hashlib
+import logging
+import time
 import joblib
 import numpy as np
-from ml.feature_extractor import extract_features
+from typing import List
+from ml.feature_extractor import extract_feature_matrix
+from ml.prediction_cache import PredictionCache
+
+logger = logging.getLogger(__name__)
+
+# Inference engine: "sklearn" (joblib RandomForest), "onnx" (onnxruntime) or
+# "compiled" (flattened forest arrays, see ml/compiled_forest.py)
+INFERENCE_ENGINE = os.environ.get("CYPHER_INFERENCE_ENGINE", "sklearn").lower()
+
+# onnxruntime thread pools (1/1 keeps each request on one core; the server
+# gets its concurrency from workers, not from intra-op parallelism)
+ORT_INTRA_OP_THREADS = int(os.environ.get("CYPHER_ORT_INTRA_OP_THREADS", "1"))
+ORT_INTER_OP_THREADS = int(os.environ.get("CYPHER_ORT_INTER_OP_THREADS", "1"))
+
+# Parallelism policy (the n_jobs stored in the pickle is ignored): inputs with
+# fewer than CYPHER_PARALLEL_MIN_ROWS rows run on one core, larger batches fan
+# out over at most CYPHER_INFERENCE_CORES cores. With several server workers,
+# keep workers x cores within the machine's core count.
+PARALLEL_MIN_ROWS = int(os.environ.get("CYPHER_PARALLEL_MIN_ROWS", "2000"))
+INFERENCE_CORES = int(os.environ.get("CYPHER_INFERENCE_CORES", str(os.cpu_count() or 1)))
+
+# Prediction cache (size 0 disables it)
+PREDICTION_CACHE_SIZE = int(os.environ.get("CYPHER_PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.environ.get("CYPHER_PREDICTION_CACHE_TTL", "300"))
+
+
+def file_checksum(path: str) -> str:
+    """Short SHA-256 of a model file, used as its version"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
 
 
 class UPIPhishingPredictor:
     """Wrapper class for UPI phishing detection model"""
     
-    def __init__(self, model_path: str = 'ml/models/upi_classifier.pkl'):
-        """Initialize predictor with trained model"""
+    def __init__(self, model_path: str = 'ml/models/upi_classifier.pkl', engine: str = None,
+                 version: str = None):
+        """Initialize predictor with trained model (version: published name, default file checksum)"""
         self.model_path = model_path
+        self.version = version
+        self.onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+        self.forest_path = os.path.splitext(model_path)[0] + '.forest'
+        self.requested_engine = (engine or INFERENCE_ENGINE).lower()
+        self.engine = None
         self.model = None
+        self.parallel_model = None   # used for batches of PARALLEL_MIN_ROWS or more
+        self.parallel_min_rows = PARALLEL_MIN_ROWS
+        self.cores = max(1, INFERENCE_CORES)
+        self.model_version = None
+        self.cache = PredictionCache(maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+        # Optional callable(stage, seconds) for "feature_extraction" and "inference" timings
+        self.on_stage = None
         self.load_model()
     
     def load_model(self):
-        """Load trained model from disk"""
+        """Load trained model from disk using the requested engine"""
+        if self.requested_engine == "onnx":
+            if os.path.exists(self.onnx_path):
+                try:
+                    self._load_onnx()
+                    return
+                except Exception as e:
+                    logger.warning("ONNX engine unavailable (%s), falling back to sklearn", e)
+            else:
+                logger.warning("ONNX model not found at %s, falling back to sklearn", self.onnx_path)
+        elif self.requested_engine == "compiled":
+            self._load_compiled()
+            return
+        elif self.requested_engine != "sklearn":
+            raise ValueError(f"Unknown inference engine: {self.requested_engine}")
+        
+        self._load_sklearn()
+    
+    def _load_sklearn(self):
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"Model file not found: {self.model_path}\n"
+                "Please run 'python ml/train_model.py' to train the model first."
+            )
+        
+        model = joblib.load(self.model_path)
+        # Serial copy for small inputs; a shallow copy shares the fitted trees
+        self.model = copy.copy(model).set_params(n_jobs=1)
+        self.parallel_model = model.set_params(n_jobs=self.cores) if self.cores > 1 else None
+        self.engine = "sklearn"
+        self._set_version(self.model_path)
+        logger.info("ML model loaded from %s", self.model_path)
+    
+    def _load_onnx(self):
+        from ml.onnx_engine import OnnxEngine
+        
+        self.model = OnnxEngine(
+            self.onnx_path,
+            intra_op_threads=ORT_INTRA_OP_THREADS,
+            inter_op_threads=ORT_INTER_OP_THREADS,
+        )
+        # Second session whose intra-op pool spans the core budget, for large batches
+        self.parallel_model = None
+        if self.cores > ORT_INTRA_OP_THREADS:
+            self.parallel_model = OnnxEngine(
+                self.onnx_path,
+                intra_op_threads=self.cores,
+                inter_op_threads=ORT_INTER_OP_THREADS,
+            )
+        self.engine = "onnx"
+        self._set_version(self.onnx_path)
+        logger.info("ML model loaded from %s (onnxruntime)", self.onnx_path)
+    
+    def _load_compiled(self):
+        import json
+        from ml.compiled_forest import CompiledForest
+        
         if not os.path.exists(self.model_path):
             raise FileNotFoundError(
                 f"Model file not found: {self.model_path}\n"
                 "Please run 'python ml/train_model.py' to train the model first."
             )
         
-        self.model = joblib.load(self.model_path)
-        print(f"✅ ML model loaded from {self.model_path}")
+        # Predictions are identical to the pickle's, so it shares the pickle's version
+        version = file_checksum(self.model_path)
+        meta_path = os.path.join(self.forest_path, 'meta.json')
+        source_checksum = None
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                source_checksum = json.load(f).get('source_checksum')
+        
+        if source_checksum == version:
+            self.model = CompiledForest.load(self.forest_path)
+            logger.info("ML model loaded from %s (compiled forest)", self.forest_path)
+        else:
+            # Missing or built from another pickle: compile in memory instead
+            logger.warning("Compiled forest at %s missing or stale, compiling from %s", self.forest_path, self.model_path)
+            self.model = CompiledForest.from_model(joblib.load(self.model_path))
+            logger.info("ML model loaded from %s (compiled forest)", self.model_path)
+        self.parallel_model = None   # NumPy gathers hold the GIL; threads don't help
+        self.engine = "compiled"
+        self._set_version(self.model_path)
+    
+    def _set_version(self, path: str):
+        """Record the loaded model's version; cached predictions of other versions are dropped"""
+        self.model_version = self.version or file_checksum(path)
+        self.cache.clear()
+    
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Model probabilities, run serially or in parallel depending on batch size"""
+        if self.parallel_model is not None and len(X) >= self.parallel_min_rows:
+            return self.parallel_model.predict_proba(X)
+        return self.model.predict_proba(X)
+    
+    def parallelism(self) -> dict:
+        """Current parallelism policy, for health reporting"""
+        return {
+            "parallel_min_rows": self.parallel_min_rows,
+            "cores": self.cores if self.parallel_model is not None else 1,
+        }
     
     def prepare_features(self, upi_id: str) -> np.ndarray:
-        """Convert UPI ID to feature vector"""
-        features = extract_features(upi_id)
-        
-        # Convert dict to ordered array (must match training order)
-        feature_vector = [
-            features['username_length'],
-            features['domain_length'],
-            features['total_length'],
-            features['digit_ratio'],
-            features['special_char_ratio'],
-            features['entropy'],
-            features['has_trusted_domain'],
-            features['has_phishing_keyword'],
-            features['starts_with_digits'],
-            features['min_brand_distance'],
-            features['domain_reputation']
-        ]
-        
-        return np.array([feature_vector])
+        """Convert UPI ID to feature vector (1 x 11, training order)"""
+        return extract_feature_matrix([upi_id])
+    
+    def prepare_features_batch(self, upi_ids: List[str]) -> np.ndarray:
+        """Convert many UPI IDs to a feature matrix (one row per ID)"""
+        return extract_feature_matrix(upi_ids)
     
     def predict_phishing_probability(self, upi_id: str) -> float:
         """
@@ -63,13 +191,64 @@ class UPIPhishingPredictor:
         if not self.model:
             raise RuntimeError("Model not loaded. Call load_model() first.")
         
+        # Keyed by the exact ID features are extracted from; the request
+        # schemas strip whitespace before IDs get here
+        key = (upi_id, self.model_version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
         # Extract features
+        start = time.perf_counter()
         X = self.prepare_features(upi_id)
+        extracted = self._stage_done("feature_extraction", start)
         
         # Predict probability
-        probability = self.model.predict_proba(X)[0][1]  # Probability of class 1 (phishing)
+        probability = float(self.predict_proba(X)[0][1])  # Probability of class 1 (phishing)
+        self._stage_done("inference", extracted)
         
-        return float(probability)
+        self.cache.put(key, probability)
+        return probability
+    
+    def predict_phishing_probabilities(self, upi_ids: List[str]) -> np.ndarray:
+        """
+        Predict phishing probabilities for many UPI IDs with one model call
+        
+        Cached IDs are served from the cache; the remaining distinct IDs
+        go through feature extraction and the model together.
+        
+        Returns:
+            Array of phishing probabilities, aligned with upi_ids
+        """
+        if not self.model:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        
+        version = self.model_version
+        probabilities = {}
+        for upi_id in dict.fromkeys(upi_ids):
+            cached = self.cache.get((upi_id, version))
+            if cached is not None:
+                probabilities[upi_id] = cached
+        
+        missing = [upi_id for upi_id in dict.fromkeys(upi_ids) if upi_id not in probabilities]
+        if missing:
+            start = time.perf_counter()
+            X = self.prepare_features_batch(missing)
+            extracted = self._stage_done("feature_extraction", start)
+            phishing_probabilities = self.predict_proba(X)[:, 1]
+            self._stage_done("inference", extracted)
+            for upi_id, probability in zip(missing, phishing_probabilities):
+                probability = float(probability)
+                probabilities[upi_id] = probability
+                self.cache.put((upi_id, version), probability)
+        
+        return np.array([probabilities[upi_id] for upi_id in upi_ids], dtype=np.float64)
+    
+    def _stage_done(self, stage: str, start: float) -> float:
+        """Report a stage that began at `start` to on_stage; returns the next stage's start"""
+        if self.on_stage is not None:
+            self.on_stage(stage, time.perf_counter() - start)
+        return time.perf_counter()
     
     def predict(self, upi_id: str) -> dict:
         """
@@ -84,6 +263,11 @@ class UPIPhishingPredictor:
             }
         """
         probability = self.predict_phishing_probability(upi_id)
+        return self.format_prediction(upi_id, probability)
+    
+    @staticmethod
+    def format_prediction(upi_id: str, probability: float) -> dict:
+        """Build the predict() response from an already computed probability"""
         is_phishing = probability >= 0.5
         
         # Confidence levels
@@ -128,6 +312,20 @@ def predict_phishing_probability(upi_id: str) -> float:
     return predictor.predict_phishing_probability(upi_id)
 
 
+def predict_phishing_probabilities(upi_ids: List[str]) -> np.ndarray:
+    """
+    Convenience function for batch predictions
+    
+    Args:
+        upi_ids: List of UPI ID strings
+    
+    Returns:
+        Array of phishing probabilities (0.0 - 1.0)
+    """
+    predictor = get_predictor()
+    return predictor.predict_phishing_probabilities(upi_ids)
+
+
 if __name__ == "__main__":
     # Test predictor
     print("🧪 Testing UPI Phishing Predictor\n")
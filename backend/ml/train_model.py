@@ -4,52 +4,44 @@ Trains Random Forest classifier on synthetic dataset
 """
 
 import os
+import sys
 import csv
 import joblib
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
-from feature_extractor import extract_features
+
+# Run as a script: put backend/ on sys.path and import everything through the
+# ml package, so each module (and its state) is loaded once
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ml.columnar_dataset import csv_paths, is_columnar, load_columnar
+from ml.feature_cache import cached_features
+from ml.feature_extractor import extract_feature_matrix, FEATURE_NAMES
+from ml.model_store import publish_model
 
 
 def load_dataset(filepath: str = 'ml/data/upi_dataset.csv'):
-    """Load UPI dataset from CSV"""
+    """Load UPI dataset from a CSV file, a directory of part-*.csv shards, or a columnar dataset"""
+    if is_columnar(filepath):
+        return load_columnar(filepath)
+    
     upi_ids = []
     labels = []
     
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            upi_ids.append(row['upi_id'])
-            labels.append(int(row['label']))
+    for path in csv_paths(filepath):
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                upi_ids.append(row['upi_id'])
+                labels.append(int(row['label']))
     
     return upi_ids, labels
 
 
 def prepare_features(upi_ids):
-    """Convert UPI IDs to feature vectors"""
-    features_list = []
-    
-    for upi_id in upi_ids:
-        features = extract_features(upi_id)
-        # Convert dict to ordered list
-        feature_vector = [
-            features['username_length'],
-            features['domain_length'],
-            features['total_length'],
-            features['digit_ratio'],
-            features['special_char_ratio'],
-            features['entropy'],
-            features['has_trusted_domain'],
-            features['has_phishing_keyword'],
-            features['starts_with_digits'],
-            features['min_brand_distance'],
-            features['domain_reputation']
-        ]
-        features_list.append(feature_vector)
-    
-    return np.array(features_list)
+    """Convert UPI IDs to feature vectors (float32 matrix, training order)"""
+    return extract_feature_matrix(upi_ids)
 
 
 def train_model(X_train, y_train):
@@ -93,18 +85,11 @@ def evaluate_model(model, X_test, y_test):
     
     # Feature importance
     print("\n  Top 5 Important Features:")
-    feature_names = [
-        'username_length', 'domain_length', 'total_length',
-        'digit_ratio', 'special_char_ratio', 'entropy',
-        'has_trusted_domain', 'has_phishing_keyword', 'starts_with_digits',
-        'min_brand_distance', 'domain_reputation'
-    ]
-    
     importances = model.feature_importances_
     indices = np.argsort(importances)[::-1][:5]
     
     for i, idx in enumerate(indices, 1):
-        print(f"    {i}. {feature_names[idx]}: {importances[idx]:.4f}")
+        print(f"    {i}. {FEATURE_NAMES[idx]}: {importances[idx]:.4f}")
     
     return accuracy
 
@@ -116,23 +101,27 @@ def save_model(model, filepath: str = 'ml/models/upi_classifier.pkl'):
     print(f"\n💾 Model saved to {filepath}")
 
 
-def main():
+def load_features(dataset_path: str = 'ml/data/upi_dataset.csv', use_cache: bool = True, workers: int = None):
+    """(X, y) for a dataset; from the on-disk feature cache unless use_cache=False"""
+    if use_cache:
+        return cached_features(dataset_path, load_dataset, workers=workers)
+    upi_ids, labels = load_dataset(dataset_path)
+    return prepare_features(upi_ids), np.array(labels)
+
+
+def main(dataset_path: str = 'ml/data/upi_dataset.csv', use_cache: bool = True, workers: int = None):
     """Main training pipeline"""
     print("=" * 60)
     print("  UPI Phishing Detection - Model Training Pipeline")
     print("=" * 60)
     
-    # 1. Load dataset
-    print("\n📂 Loading dataset...")
-    upi_ids, labels = load_dataset()
-    print(f"   Total samples: {len(upi_ids)}")
-    print(f"   Legitimate: {labels.count(0)}")
-    print(f"   Phishing: {labels.count(1)}")
-    
-    # 2. Extract features
-    print("\n🔍 Extracting features...")
-    X = prepare_features(upi_ids)
-    y = np.array(labels)
+    # 1-2. Load dataset and extract features (memory-mapped from the cache when unchanged)
+    print("\n📂 Loading dataset and features...")
+    X, y = load_features(dataset_path, use_cache=use_cache, workers=workers)
+    class_counts = np.bincount(y, minlength=2)
+    print(f"   Total samples: {len(y)}")
+    print(f"   Legitimate: {class_counts[0]}")
+    print(f"   Phishing: {class_counts[1]}")
     print(f"   Feature matrix shape: {X.shape}")
     
     # 3. Split dataset
@@ -149,8 +138,11 @@ def main():
     # 5. Evaluate model
     accuracy = evaluate_model(model, X_test, y_test)
     
-    # 6. Save model
+    # 6. Save model (legacy path) and publish it as a new immutable version
     save_model(model)
+    version = publish_model('ml/models/upi_classifier.pkl', metrics={"accuracy": round(float(accuracy), 4)})
+    print(f"📦 Published model version {version}")
+    print(f"   Serve it with: python -m ml.model_store activate {version}")
     
     print("\n" + "=" * 60)
     print(f"  ✅ Training Complete! Accuracy: {accuracy:.2%}")
@@ -178,4 +170,11 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Train the UPI phishing classifier")
+    parser.add_argument("--dataset", default="ml/data/upi_dataset.csv")
+    parser.add_argument("--no-cache", action="store_true", help="recompute features instead of using the cache")
+    parser.add_argument("--workers", type=int, default=None, help="feature extraction processes")
+    args = parser.parse_args()
+    main(args.dataset, use_cache=not args.no_cache, workers=args.workers)
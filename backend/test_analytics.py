@@ -0,0 +1,114 @@
+"""
+Daily rollups kept by save_scans match a direct GROUP BY over scan_records
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# Throwaway database and direct writes, set before the app is imported
+_tmpdir = tempfile.TemporaryDirectory(prefix="cypher-test-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir.name}/test.db")
+os.environ.setdefault("CYPHER_WRITE_BEHIND", "0")
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.services.analytics import summarize
+from app.services.persistence import save_scans
+
+
+def scan(user_id, timestamp, risk_label, risk_score):
+    return {"upi_id": "shop@paytm", "user_id": user_id, "timestamp": timestamp,
+            "risk_label": risk_label, "risk_score": risk_score}
+
+
+def batches():
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    yesterday = today - timedelta(days=1)
+    first = [
+        scan("alice", today, "danger", 91.0),
+        scan("alice", today, "danger", 78.5),
+        scan("alice", today, "safe", 4.0),
+        scan("alice", yesterday, "warning", 55.0),
+        scan(None, today, "danger", 88.0),
+        scan("bob", today, "safe", 12.5),
+    ]
+    # Same users, days and labels again: the rollups take the upsert path
+    second = [
+        scan("alice", today + timedelta(minutes=5), "danger", 97.0),
+        scan("alice", today, "safe", 2.5),
+        scan("alice", yesterday, "warning", 41.0),
+        scan(None, today, "danger", 60.0),
+        scan("bob", today, "warning", 47.5),
+    ]
+    return first, second
+
+
+async def grouped_scans(db):
+    Scan = models.ScanRecord
+    user, day = func.coalesce(Scan.user_id, ""), func.date(Scan.timestamp)
+    rows = await db.execute(
+        select(user, day, Scan.risk_label, func.count(), func.sum(Scan.risk_score), func.max(Scan.risk_score))
+        .group_by(user, day, Scan.risk_label)
+    )
+    return {(u, d, label): (count, total, top) for u, d, label, count, total, top in rows.all()}
+
+
+async def rollups(db):
+    Rollup = models.ScanDailyRollup
+    rows = (await db.execute(select(Rollup))).scalars().all()
+    return {(r.user_id, r.day.isoformat(), r.risk_label): (r.scan_count, r.score_sum, r.score_max) for r in rows}
+
+
+def expected_summary(groups, user_id):
+    selected = {key: value for key, value in groups.items() if user_id is None or key[0] == user_id}
+    by_label = {"safe": 0, "warning": 0, "danger": 0}
+    for (_, _, label), (count, _, _) in selected.items():
+        by_label[label] += count
+    total = sum(count for count, _, _ in selected.values())
+    return {
+        "total_scans": total,
+        "average_risk_score": round(sum(s for _, s, _ in selected.values()) / total, 2),
+        "max_risk_score": max(top for _, _, top in selected.values()),
+        "by_label": by_label,
+        "days_with_scans": sorted({day for _, day, _ in selected}),
+    }
+
+
+def test_rollups_match_group_by_after_upserts():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        first, second = batches()
+        async with AsyncSession(engine) as db:
+            await save_scans(db, first)
+            after_first = (await rollups(db), await grouped_scans(db))
+            await save_scans(db, second)
+            after_second = (await rollups(db), await grouped_scans(db))
+            summaries = {user: await summarize(db, user, days=7) for user in (None, "alice", "bob", "")}
+        await engine.dispose()
+        return after_first, after_second, summaries
+
+    after_first, after_second, summaries = asyncio.run(scenario())
+
+    for rolled, grouped in (after_first, after_second):
+        assert rolled.keys() == grouped.keys()
+        for key, (count, total, top) in grouped.items():
+            assert rolled[key] == (count, pytest.approx(total), top)
+    # The second batch updated existing groups and added one new group
+    assert len(after_second[0]) == len(after_first[0]) + 1
+
+    groups = after_second[1]
+    for user, summary in summaries.items():
+        expected = expected_summary(groups, user)
+        assert summary["total_scans"] == expected["total_scans"]
+        assert summary["average_risk_score"] == expected["average_risk_score"]
+        assert summary["max_risk_score"] == expected["max_risk_score"]
+        assert summary["by_label"] == expected["by_label"]
+        assert [day["day"].isoformat() for day in summary["daily"]] == expected["days_with_scans"]
+        assert sum(day["total"] for day in summary["daily"]) == expected["total_scans"]
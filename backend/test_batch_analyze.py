@@ -0,0 +1,98 @@
+"""
+/analyze/batch must score every transaction exactly like /analyze
+"""
+import os
+import random
+import tempfile
+
+# Throwaway database and direct writes, set before the app is imported
+_tmpdir = tempfile.TemporaryDirectory(prefix="cypher-test-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir.name}/test.db")
+os.environ.setdefault("CYPHER_WRITE_BEHIND", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.schemas import TransactionInput
+from app.services.cypher_ml_logic import analyze_transaction as score_features
+from app.services.cypher_ml_logic import analyze_transactions_batch
+
+PAYEES = [
+    "merchant@paytm", "refund@paytmm", "98765@unknown", "zomato@phonepe",
+    "urgent-prize@fake", "kyc-update@amaz0npay", "rahul.sharma@ybl", None,
+]
+
+
+def transactions(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        row = {
+            "amount_risk": rng.random(),
+            "payee_risk": rng.random(),
+            "frequency_risk": rng.random(),
+            "timing_risk": rng.random(),
+            "device_risk": rng.random(),
+        }
+        # Mix of full and backward-compatible (5-feature) inputs
+        if i % 4:
+            row["payee_id"] = PAYEES[i % len(PAYEES)]
+            row["amount_value"] = rng.choice([500, 5000, 10000, 12500.5, 49999])
+            row["hour_of_day"] = rng.randint(0, 23)
+        rows.append(row)
+    return rows
+
+
+def comparable(result):
+    return {key: result[key] for key in ("risk_score", "risk_label", "reasons", "model_version")}
+
+
+def test_batch_scoring_matches_single():
+    """Vectorized rule + ML batch path equals the per-transaction path"""
+    features = [TransactionInput(**row).model_dump() for row in transactions(60)]
+    batch = analyze_transactions_batch(features)
+    assert [comparable(result) for result in batch] == [comparable(score_features(f)) for f in features]
+
+
+@pytest.fixture(scope="module")
+def client():
+    main.limiter.enabled = False
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def test_batch_endpoint_matches_analyze_endpoint(client):
+    rows = transactions(25, seed=1)
+    batch = client.post("/analyze/batch", json=rows)
+    assert batch.status_code == 200
+    assert len(batch.json()) == len(rows)
+
+    for row, batched in zip(rows, batch.json()):
+        single = client.post("/analyze", json=row)
+        assert single.status_code == 200
+        assert comparable(batched) == comparable(single.json())
+
+
+def test_batch_endpoint_limits(client):
+    assert client.post("/analyze/batch", json=[]).json() == []
+    too_many = transactions(1)[:1] * (main.MAX_BATCH_SIZE + 1)
+    assert client.post("/analyze/batch", json=too_many).status_code == 413
+
+
+def test_server_timing_is_readable_cross_origin(client):
+    origin = "http://localhost:3000"
+    response = client.post("/analyze", json=transactions(1)[0], headers={"Origin": origin})
+    assert "total;dur=" in response.headers["server-timing"]
+    assert response.headers["timing-allow-origin"] == origin
+    assert "server-timing" in response.headers["access-control-expose-headers"].lower()
+
+    other = client.post("/analyze", json=transactions(1)[0], headers={"Origin": "https://evil.example"})
+    assert "timing-allow-origin" not in other.headers
+
+
+def test_payee_risk_strips_padding_like_analyze(client):
+    padded = client.post("/api/ml/predict_payee_risk", json={"upi_id": "  refund@paytmm "})
+    plain = client.post("/api/ml/predict_payee_risk", json={"upi_id": "refund@paytmm"})
+    assert padded.status_code == plain.status_code == 200
+    assert padded.json() == plain.json()
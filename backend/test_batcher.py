@@ -0,0 +1,86 @@
+"""
+Micro-batcher: window / max_batch flushing, result fan-out, and shutdown
+"""
+import asyncio
+
+import pytest
+
+from app.services.batcher import BatcherStopped, MicroBatcher
+
+
+def recording(batches):
+    def predict_batch(upi_ids):
+        batches.append(list(upi_ids))
+        return [f"score:{upi_id}" for upi_id in upi_ids]
+    return predict_batch
+
+
+def test_window_coalesces_concurrent_calls():
+    batches = []
+
+    async def scenario():
+        batcher = MicroBatcher(recording(batches), window_ms=20, max_batch=8)
+        results = await asyncio.gather(*(batcher.submit(f"u{i}@paytm") for i in range(3)))
+        await batcher.stop()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [f"score:u{i}@paytm" for i in range(3)]
+    assert batches == [["u0@paytm", "u1@paytm", "u2@paytm"]]
+    assert stats["batches"] == 1 and stats["dispatched"] == 3
+
+
+def test_max_batch_flushes_without_waiting_for_the_window():
+    batches = []
+
+    async def scenario():
+        batcher = MicroBatcher(recording(batches), window_ms=200, max_batch=4)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        calls = [asyncio.ensure_future(batcher.submit(f"u{i}@paytm")) for i in range(10)]
+        results = await asyncio.gather(*calls[:8])
+        elapsed = loop.time() - started
+        results += await asyncio.gather(*calls[8:])
+        await batcher.stop()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == [f"score:u{i}@paytm" for i in range(10)]
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert elapsed < 0.2  # full batches skip the window
+
+
+def test_short_result_list_fails_every_caller():
+    async def scenario():
+        batcher = MicroBatcher(lambda upi_ids: ["only-one"], window_ms=10, max_batch=8)
+        calls = [batcher.submit(f"u{i}@paytm") for i in range(3)]
+        results = await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), timeout=2)
+        await batcher.stop()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert stats["failed_batches"] == 1
+
+
+def test_stop_resolves_every_pending_call():
+    async def slow_runner(fn, *args):
+        await asyncio.sleep(0.05)
+        return fn(*args)
+
+    async def scenario():
+        # A dispatched batch finishes; calls still waiting out the window fail fast
+        dispatched = MicroBatcher(recording([]), window_ms=0, max_batch=8, runner=slow_runner)
+        in_flight = asyncio.ensure_future(dispatched.submit("a@paytm"))
+        await asyncio.sleep(0.01)
+        await dispatched.stop()
+
+        waiting = MicroBatcher(recording([]), window_ms=10_000, max_batch=8)
+        queued = [asyncio.ensure_future(waiting.submit(f"u{i}@paytm")) for i in range(3)]
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(waiting.stop(), timeout=2)
+        return await in_flight, await asyncio.gather(*queued, return_exceptions=True)
+
+    finished, stopped = asyncio.run(scenario())
+    assert finished == "score:a@paytm"
+    assert len(stopped) == 3 and all(isinstance(result, BatcherStopped) for result in stopped)
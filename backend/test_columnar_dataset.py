@@ -0,0 +1,67 @@
+"""
+Round-trip tests for the columnar dataset format (CSV -> .cols -> loader)
+"""
+
+import numpy as np
+import pytest
+
+from ml.columnar_dataset import ColumnarDataset, convert_csv, load_columnar, read_csv_columns
+
+ROWS = [("a@b", 1), ("c@d", 0), ("a@b", 0), ("e@f", 1)]
+
+
+def write_csv(path, body):
+    path.write_text("upi_id,label\n" + body, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("body", [
+    "a@b,1\nc@d,0\na@b,0\ne@f,1",            # no trailing newline
+    "a@b,1\nc@d,0\na@b,0\ne@f,1\n",          # trailing newline
+    "a@b,1\nc@d,0\na@b,0\ne@f,1\n\n\n",      # trailing blank lines
+    "a@b,1\n\nc@d,0\na@b,0\n\ne@f,1\n",      # blank lines in the middle
+    "a@b,1\r\nc@d,0\r\n\r\na@b,0\r\ne@f,1\r\n",  # CRLF
+])
+def test_csv_round_trip(tmp_path, body):
+    """IDs and labels stay aligned through conversion, with and without blank lines"""
+    csv_path = write_csv(tmp_path / "data.csv", body)
+
+    upi_ids, labels = read_csv_columns(csv_path)
+    assert list(zip(upi_ids, labels.tolist())) == ROWS
+
+    convert_csv(csv_path, str(tmp_path / "all.cols"), dedupe=False)
+    upi_ids, labels = load_columnar(str(tmp_path / "all.cols"))
+    assert list(zip(upi_ids, labels.tolist())) == ROWS
+
+    # De-duplication keeps the first occurrence of each ID and its label
+    meta = convert_csv(csv_path, str(tmp_path / "dedup.cols"))
+    upi_ids, labels = load_columnar(str(tmp_path / "dedup.cols"))
+    assert list(zip(upi_ids, labels.tolist())) == [("a@b", 1), ("c@d", 0), ("e@f", 1)]
+    assert meta["duplicates_dropped"] == 1
+
+
+def test_csv_fallback_for_quoted_and_reordered_columns(tmp_path):
+    """Files the fast path can't split go through csv.reader"""
+    path = tmp_path / "data.csv"
+    path.write_text('label,upi_id,category\n1,"x,y@z",a\n\n0,q@r,b\n', encoding="utf-8")
+    upi_ids, labels = read_csv_columns(str(path))
+    assert upi_ids == ["x,y@z", "q@r"]
+    assert labels.tolist() == [1, 0]
+
+
+def test_malformed_row_raises(tmp_path):
+    csv_path = write_csv(tmp_path / "data.csv", "a@b,1\nc@d\n")
+    with pytest.raises(ValueError):
+        read_csv_columns(csv_path)
+
+
+def test_streaming_matches_full_load(tmp_path):
+    csv_path = write_csv(tmp_path / "data.csv", "".join(f"id{i}@x,{i % 2}\n" for i in range(25)))
+    convert_csv(csv_path, str(tmp_path / "d.cols"))
+    dataset = ColumnarDataset(str(tmp_path / "d.cols"))
+
+    chunks = list(dataset.iter_chunks(chunk_rows=7))
+    assert [len(ids) for ids, _ in chunks] == [7, 7, 7, 4]
+    assert sum((ids for ids, _ in chunks), []) == dataset.upi_ids()
+    assert np.array_equal(np.concatenate([labels for _, labels in chunks]), dataset.labels)
+    assert dataset.upi_id(24) == "id24@x"
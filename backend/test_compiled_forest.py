@@ -0,0 +1,56 @@
+"""
+CompiledForest must reproduce sklearn's predict_proba bit for bit
+"""
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from ml.compiled_forest import DENSE_ROWS, CompiledForest, compile_forest, save_compiled
+from ml.feature_extractor import extract_feature_matrix
+
+UPI_IDS = [
+    "merchant@paytm", "refund@paytmm", "98765@unknown", "zomato@phonepe",
+    "urgent-prize@fake", "support-team@googlepay", "customer123@okaxis",
+    "kyc-update@amaz0npay", "rahul.sharma@ybl", "cashback2024@phonepay", "no-at-sign",
+]
+
+
+def rows_with_thresholds(model, rng, n):
+    """Random rows plus rows sitting exactly on (float32-rounded) split thresholds"""
+    X = rng.normal(size=(n, model.n_features_in_)).astype(np.float32)
+    for tree in model.estimators_[:5]:
+        splits = tree.tree_.feature >= 0
+        for feature, threshold in zip(tree.tree_.feature[splits], tree.tree_.threshold[splits]):
+            row = rng.normal(size=model.n_features_in_).astype(np.float32)
+            row[feature] = np.float32(threshold)
+            X = np.vstack([X, row])
+    return X
+
+
+def assert_bit_exact(model, X):
+    compiled = CompiledForest.from_model(model)
+    # Both evaluation paths: per-node dense decisions (few rows) and level stepping (many)
+    for rows in (X[:1], X[:DENSE_ROWS], X):
+        assert np.array_equal(compiled.predict_proba(rows), model.predict_proba(rows))
+
+
+def test_matches_sklearn_on_random_forest():
+    rng = np.random.default_rng(0)
+    X_train = rng.normal(size=(400, 11)).astype(np.float32)
+    y_train = (X_train[:, 0] + X_train[:, 3] * X_train[:, 5] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X_train, y_train)
+
+    assert_bit_exact(model, rows_with_thresholds(model, rng, 300))
+
+
+def test_matches_sklearn_on_shipped_model(tmp_path):
+    model = joblib.load("ml/models/upi_classifier.pkl")
+    X = extract_feature_matrix(UPI_IDS * 10)
+    assert_bit_exact(model, X)
+
+    # Saved and memory-mapped arrays give the same answers
+    compiled = compile_forest(model)
+    save_compiled(compiled, str(tmp_path / "forest"))
+    loaded = CompiledForest.load(str(tmp_path / "forest"))
+    assert np.array_equal(loaded.predict_proba(X), model.predict_proba(X))
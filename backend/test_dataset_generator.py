@@ -0,0 +1,73 @@
+"""
+Sharded generation: reproducible bytes, consistent manifest counts, no stale shards
+"""
+import json
+import os
+
+import pytest
+
+from ml import dataset_generator
+from ml.columnar_dataset import csv_paths
+from ml.dataset_generator import CATEGORY_MIX, category_counts, generate_sharded
+from ml.train_model import load_dataset
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Several chunks per shard without generating 100k rows
+    monkeypatch.setattr(dataset_generator, "CHUNK_ROWS", 700)
+
+
+def shard_bytes(out_dir):
+    return {os.path.basename(path): open(path, "rb").read() for path in csv_paths(out_dir)}
+
+
+def test_same_seed_same_bytes(tmp_path, small_chunks):
+    a = generate_sharded(5000, str(tmp_path / "a"), shard_rows=2000, workers=1, seed=7)
+    b = generate_sharded(5000, str(tmp_path / "b"), shard_rows=2000, workers=2, seed=7)
+    assert a == b
+    assert shard_bytes(tmp_path / "a") == shard_bytes(tmp_path / "b")
+
+    c = generate_sharded(5000, str(tmp_path / "c"), shard_rows=2000, workers=1, seed=8)
+    assert shard_bytes(tmp_path / "c") != shard_bytes(tmp_path / "a")
+    assert a["categories"] == c["categories"]
+
+
+def test_manifest_counts(tmp_path, small_chunks):
+    manifest = generate_sharded(5000, str(tmp_path / "shards"), shard_rows=2000, workers=1)
+    assert [s["rows"] for s in manifest["shards"]] == [2000, 2000, 1000]
+
+    for shard in manifest["shards"]:
+        expected = dict.fromkeys(CATEGORY_MIX, 0)
+        for start in range(0, shard["rows"], 700):
+            for name, count in category_counts(min(700, shard["rows"] - start)).items():
+                expected[name] += count
+        assert shard["categories"] == expected
+        assert shard["legitimate"] + shard["phishing"] == shard["rows"]
+
+    totals = {name: sum(s["categories"][name] for s in manifest["shards"]) for name in CATEGORY_MIX}
+    assert manifest["categories"] == totals
+    assert sum(totals.values()) == manifest["total_rows"] == 5000
+
+    upi_ids, labels = load_dataset(str(tmp_path / "shards"))
+    assert len(upi_ids) == 5000
+    assert sum(labels) == manifest["phishing"]
+
+
+def test_rerun_drops_stale_shards(tmp_path):
+    out_dir = str(tmp_path / "shards")
+    generate_sharded(3000, out_dir, shard_rows=1000, workers=1, seed=1)
+    manifest = generate_sharded(1500, out_dir, shard_rows=1000, workers=1, seed=2)
+
+    assert sorted(os.listdir(out_dir)) == ["manifest.json", "part-00000.csv", "part-00001.csv"]
+    assert len(load_dataset(out_dir)[0]) == 1500
+    with open(os.path.join(out_dir, "manifest.json")) as f:
+        assert json.load(f) == manifest
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".")]
+
+
+def test_refuses_unrelated_directory(tmp_path):
+    (tmp_path / "notes.txt").write_text("keep me")
+    with pytest.raises(ValueError):
+        generate_sharded(100, str(tmp_path), shard_rows=50, workers=1)
+    assert (tmp_path / "notes.txt").read_text() == "keep me"
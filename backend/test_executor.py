@@ -0,0 +1,58 @@
+"""
+Inference pool admission: saturation, timeouts and in-flight accounting
+"""
+import asyncio
+import threading
+
+import pytest
+
+from app.services.executor import InferenceExecutor, InferenceSaturated, InferenceTimeout
+from app.services.metrics import INFERENCE_IN_FLIGHT
+
+
+def test_timed_out_work_keeps_its_slot():
+    gauge_before = INFERENCE_IN_FLIGHT._value.get()
+    release = threading.Event()
+
+    async def scenario():
+        executor = InferenceExecutor(workers=1, queue_limit=1, timeout=0.2)
+        try:
+            await executor.warm_up()  # worker started and initialized, so the first task runs at once
+            running = asyncio.ensure_future(executor.run(release.wait))
+            queued = asyncio.ensure_future(executor.run(release.wait))
+            await asyncio.sleep(0.05)
+            assert executor.in_flight == 2
+
+            # Worker busy and queue full: rejected without queueing
+            with pytest.raises(InferenceSaturated):
+                await executor.run(release.wait)
+
+            for task in (running, queued):
+                with pytest.raises(InferenceTimeout):
+                    await task
+            # The queued task was cancelled; the running one still occupies the worker
+            assert executor.in_flight == 1
+            assert INFERENCE_IN_FLIGHT._value.get() - gauge_before == 1
+
+            # One slot is free again; queued behind the stuck worker, this one times
+            # out too and is cancelled, so it gives its slot back
+            with pytest.raises(InferenceTimeout):
+                await executor.run(release.wait)
+            assert executor.in_flight == 1
+
+            release.set()
+            for _ in range(200):
+                if executor.in_flight == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert await executor.run(lambda: 42) == 42
+            return executor.stats()
+        finally:
+            release.set()
+            executor.shutdown()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0
+    assert stats["rejected"] == 1 and stats["timeouts"] == 3 and stats["completed"] == 1
+    assert stats["max_in_flight"] == 2
+    assert INFERENCE_IN_FLIGHT._value.get() == gauge_before
@@ -0,0 +1,40 @@
+"""
+Feature cache keys depend on a dataset's rows, not on when it was converted
+"""
+import json
+import os
+
+from ml.columnar_dataset import META_FILE, convert_csv
+from ml.feature_cache import dataset_checksum
+
+ROWS = "upi_id,label\nmerchant@paytm,0\nrefund@paytmm,1\nzomato@phonepe,0\n"
+
+
+def test_checksum_ignores_conversion_metadata(tmp_path):
+    csv_path = tmp_path / "dataset.csv"
+    csv_path.write_text(ROWS)
+    cols = str(tmp_path / "dataset.cols")
+
+    convert_csv(str(csv_path), cols)
+    first = dataset_checksum(cols)
+    with open(os.path.join(cols, META_FILE)) as f:
+        created_at = json.load(f)["created_at"]
+
+    convert_csv(str(csv_path), cols)
+    with open(os.path.join(cols, META_FILE)) as f:
+        assert json.load(f)["created_at"] != created_at
+    assert dataset_checksum(cols) == first
+
+    csv_path.write_text(ROWS.replace("refund@paytmm,1", "refund@paytmm,0"))
+    convert_csv(str(csv_path), cols)
+    assert dataset_checksum(cols) != first
+
+
+def test_shard_checksum_ignores_manifest(tmp_path):
+    (tmp_path / "part-00000.csv").write_text(ROWS)
+    shards = [{"file": "part-00000.csv", "rows": 3}]
+    (tmp_path / "manifest.json").write_text(json.dumps({"workers": 1, "shards": shards}))
+    first = dataset_checksum(str(tmp_path))
+
+    (tmp_path / "manifest.json").write_text(json.dumps({"workers": 8, "shards": shards}))
+    assert dataset_checksum(str(tmp_path)) == first
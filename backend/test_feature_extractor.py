@@ -0,0 +1,79 @@
+"""
+Parity tests: vectorized feature extraction vs the per-ID reference
+"""
+import random
+
+import numpy as np
+
+from ml.feature_extractor import (
+    FEATURE_NAMES,
+    LEGITIMATE_BRANDS,
+    BrandIndex,
+    VECTORIZE_MIN_BATCH,
+    extract_feature_matrix,
+    extract_features_batch,
+    feature_vector,
+    levenshtein_distance,
+    min_brand_distance,
+)
+
+SAMPLE_UPI_IDS = [
+    "merchant@paytm", "refund@paytmm", "98765@unknown", "zomato@phonepe",
+    "urgent-prize@fake", "support-team@googlepay", "customer123@okaxis",
+    "kyc-update@amaz0npay", "rahul.sharma@ybl", "cashback2024@phonepay",
+    "no-at-sign", "@paytm", "user@", "a@b@c", "ÜMLAUT@paytm", "١٢٣@ybl", "",
+]
+
+
+def random_upi_ids(n, seed=0):
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyzABC0123456789._-"
+    domains = ["paytm", "ybl", "okaxis", "paytmm", "unknown", "fake", "x"]
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 14))) + "@" + rng.choice(domains)
+        for _ in range(n)
+    ]
+
+
+def test_feature_matrix_matches_extract_features():
+    """Vectorized path (large batch) and small-batch path equal extract_features row by row"""
+    upi_ids = SAMPLE_UPI_IDS + random_upi_ids(500)
+    assert len(upi_ids) >= VECTORIZE_MIN_BATCH
+
+    expected = np.array([feature_vector(upi_id) for upi_id in upi_ids], dtype=np.float32)
+    X = extract_feature_matrix(upi_ids)
+    assert X.dtype == np.float32 and X.shape == (len(upi_ids), len(FEATURE_NAMES))
+    np.testing.assert_allclose(X, expected, rtol=1e-6, atol=1e-6)
+
+    small = extract_feature_matrix(SAMPLE_UPI_IDS[:5])
+    np.testing.assert_array_equal(small, expected[:5])
+
+
+def test_extract_features_batch_matches_extract_features():
+    """Same values at float64; entropy is summed in another order, so allow a few ulps (rtol 1e-12)"""
+    upi_ids = SAMPLE_UPI_IDS + random_upi_ids(5000, seed=1)
+    batch = extract_features_batch(upi_ids)
+    assert len(batch) == len(upi_ids)
+    assert all(list(features) == FEATURE_NAMES for features in batch)
+
+    actual = np.array([[features[name] for name in FEATURE_NAMES] for features in batch], dtype=np.float64)
+    expected = np.array([feature_vector(upi_id) for upi_id in upi_ids], dtype=np.float64)
+    entropy = FEATURE_NAMES.index("entropy")
+    others = [i for i in range(len(FEATURE_NAMES)) if i != entropy]
+    np.testing.assert_array_equal(actual[:, others], expected[:, others])
+    np.testing.assert_allclose(actual[:, entropy], expected[:, entropy], rtol=1e-12, atol=1e-15)
+
+
+def test_brand_index_matches_brute_force_levenshtein():
+    """BrandIndex.nearest_distance equals the minimum over all brands of levenshtein_distance"""
+    brands = sorted(LEGITIMATE_BRANDS) + ["flipkartpay", "zomatofood", "ab", "a-b.c"]
+    index = BrandIndex(brands)
+    words = [upi_id.split("@")[0].lower() for upi_id in SAMPLE_UPI_IDS + random_upi_ids(300, seed=2)]
+    words += ["", "paytm", "payt", "paytmmm", "amaz0n", "gooogle", "x" * 40] + brands
+
+    for word in words:
+        expected = min(levenshtein_distance(word, brand) for brand in index.brands)
+        assert index.nearest_distance(word) == expected, word
+        assert min_brand_distance(word) == min(levenshtein_distance(word, b) for b in sorted(LEGITIMATE_BRANDS))
+
+    assert BrandIndex([]).nearest_distance("paytm") == 999
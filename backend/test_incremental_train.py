@@ -0,0 +1,108 @@
+"""
+Incremental training: label watermark, settle margin, publish gate, warm-started trees
+"""
+from datetime import datetime, timedelta
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, ScanRecord
+from ml import incremental_train
+from ml.feature_extractor import extract_feature_matrix
+from ml.model_store import load_manifest
+
+PHISHING = ["refund{}@paytmm", "kyc-update{}@okaxiss", "lottery{}@ybll"]
+LEGITIMATE = ["ramesh{}@okhdfcbank", "store{}@paytm", "priya{}@ybl"]
+
+
+@pytest.fixture
+def db():
+    bind = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=bind)
+    return bind
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    ids = [p.format(i) for i in range(10) for p in PHISHING + LEGITIMATE]
+    y = np.array([1, 1, 1, 0, 0, 0] * 10)
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(extract_feature_matrix(ids), y)
+    joblib.dump(model, tmp_path / incremental_train.LEGACY_MODEL)
+    return str(tmp_path)
+
+
+def add_labels(bind, count, labelled_at, phishing=True, legitimate=True):
+    patterns = (PHISHING if phishing else []) + (LEGITIMATE if legitimate else [])
+    with Session(bind) as session:
+        for i in range(count):
+            pattern = patterns[i % len(patterns)]
+            session.add(ScanRecord(
+                upi_id=pattern.format(i), risk_score=0.5, risk_label="warning",
+                analyst_label=int(pattern in PHISHING), labelled_at=labelled_at,
+            ))
+        session.commit()
+
+
+def test_watermark_advances_past_read_labels(db):
+    old = datetime.utcnow() - timedelta(hours=1)
+    add_labels(db, 7, old)
+
+    batches = list(incremental_train.iter_label_batches(None, batch_size=3, bind=db))
+    assert [len(rows) for rows in batches] == [3, 3, 1]
+
+    X, y, watermark = incremental_train.collect_new_labels(None, batch_size=3, bind=db)
+    assert len(X) == len(y) == 7
+    assert watermark == {"labelled_at": old.isoformat(), "id": 7}
+    assert list(incremental_train.iter_label_batches(watermark, bind=db)) == []
+
+    add_labels(db, 2, old + timedelta(minutes=1))
+    _, y, watermark = incremental_train.collect_new_labels(watermark, bind=db)
+    assert len(y) == 2 and watermark["id"] == 9
+
+
+def test_recent_labels_wait_for_settle_margin(db):
+    add_labels(db, 4, datetime.utcnow() - timedelta(hours=1))
+    add_labels(db, 4, datetime.utcnow())
+
+    _, y, watermark = incremental_train.collect_new_labels(None, bind=db, settle_seconds=60)
+    assert len(y) == 4 and watermark["id"] == 4
+    # Once settled they're picked up after the same watermark
+    _, y, _ = incremental_train.collect_new_labels(watermark, bind=db, settle_seconds=-60)
+    assert len(y) == 4
+
+
+def test_publish_needs_min_labels_and_both_classes(db, models_dir):
+    old = datetime.utcnow() - timedelta(hours=1)
+    add_labels(db, 30, old, legitimate=False)
+    assert incremental_train.main(trees=2, min_labels=20, models_dir=models_dir, bind=db) is None
+
+    add_labels(db, 5, old + timedelta(minutes=1), phishing=False)
+    assert incremental_train.main(trees=2, min_labels=50, models_dir=models_dir, bind=db) is None
+
+    version = incremental_train.main(trees=2, min_labels=20, models_dir=models_dir, bind=db)
+    metrics = load_manifest(version, models_dir)["metrics"]
+    assert metrics["new_labels"] == 35 and metrics["label_watermark"]["id"] == 35
+    assert metrics["n_estimators"] == 7
+
+
+def test_add_trees_keeps_existing_estimators(models_dir):
+    model, _, _ = incremental_train.load_base_model(models_dir)
+    existing = list(model.estimators_)
+    X = extract_feature_matrix(["refund9@paytmm", "ramesh9@okhdfcbank"] * 5)
+    before = [tree.predict_proba(X) for tree in existing]
+
+    incremental_train.add_trees(model, X, np.array([1, 0] * 5), trees=3)
+    assert len(model.estimators_) == len(existing) + 3
+    assert all(a is b for a, b in zip(model.estimators_, existing))
+    for tree, proba in zip(existing, before):
+        np.testing.assert_array_equal(tree.predict_proba(X), proba)
+
+    with pytest.raises(ValueError):
+        incremental_train.add_trees(model, X[:1], np.array([1]), trees=1)
@@ -0,0 +1,46 @@
+"""
+Schema upgrades: an old scan_records table gains the new columns and indexes,
+and repeated or racing runs don't fail
+"""
+from sqlalchemy import create_engine, inspect, text
+
+from app import migrations
+from app.models import ScanRecord
+
+
+def old_database(tmp_path):
+    bind = create_engine(f"sqlite:///{tmp_path}/old.db")
+    with bind.begin() as conn:
+        # scan_records as the first release created it
+        conn.execute(text(
+            "CREATE TABLE scan_records (id INTEGER PRIMARY KEY, upi_id VARCHAR(120), "
+            "risk_score FLOAT NOT NULL, risk_label VARCHAR(20) NOT NULL, reasons VARCHAR(2000), "
+            "user_id VARCHAR(120), timestamp DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO scan_records (risk_score, risk_label) VALUES (0.5, 'warning')"))
+    return bind
+
+
+def test_upgrade_adds_columns_and_indexes(tmp_path):
+    bind = old_database(tmp_path)
+    assert "column scan_records.reason_codes" in migrations.pending(bind)
+
+    added = migrations.upgrade(bind)
+    assert "column scan_records.analyst_label" in added
+    assert "index ix_scan_records_labelled_at_id" in added
+    assert migrations.pending(bind) == []
+    assert migrations.upgrade(bind) == []
+
+    columns = {c["name"] for c in inspect(bind).get_columns("scan_records")}
+    assert columns == {c.name for c in ScanRecord.__table__.columns}
+    with bind.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM scan_records")).scalar() == 1
+
+
+def test_losing_a_race_is_not_an_error(tmp_path):
+    bind = old_database(tmp_path)
+    migrations.upgrade(bind)
+    # What a second worker does after its own check saw the schema as missing
+    migrations._add_column(bind, ScanRecord.__table__.c.labelled_at)
+    for index in ScanRecord.__table__.indexes:
+        migrations._create_index(bind, index)
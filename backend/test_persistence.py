@@ -0,0 +1,40 @@
+"""
+Write-behind drops are counted in the writer stats and in /metrics
+"""
+import asyncio
+
+from app.services.metrics import WRITE_BEHIND_DROPPED
+from app.services.persistence import ScanWriter
+
+
+def dropped_metric(reason):
+    return WRITE_BEHIND_DROPPED.labels(reason)._value.get()
+
+
+class FailingSession:
+    async def __aenter__(self):
+        raise RuntimeError("database is down")
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_dropped_rows_are_counted():
+    before = {reason: dropped_metric(reason) for reason in ("queue_full", "flush_failed")}
+
+    async def scenario():
+        writer = ScanWriter(FailingSession, max_queue=2, flush_interval_ms=1000,
+                            enqueue_timeout=0.01, max_retries=0)
+        await writer.start()
+        # The flusher holds one row while it waits an interval; two fit in the queue
+        await writer.enqueue([{"upi_id": f"u{i}@paytm"} for i in range(5)])
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["enqueued"] + stats["dropped_queue_full"] == 5
+    assert stats["dropped_queue_full"] >= 1
+    assert stats["dropped_flush_failed"] == stats["enqueued"]
+    assert stats["dropped"] == 5 and stats["written"] == 0
+    assert dropped_metric("queue_full") - before["queue_full"] == stats["dropped_queue_full"]
+    assert dropped_metric("flush_failed") - before["flush_failed"] == stats["dropped_flush_failed"]
@@ -0,0 +1,76 @@
+"""
+Prediction cache: TTL expiry, LRU bound, and model-version keys
+"""
+import numpy as np
+
+from ml.feature_extractor import extract_feature_matrix
+from ml.prediction_cache import PredictionCache
+from ml.predictor import UPIPhishingPredictor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = PredictionCache(maxsize=10, ttl=5.0, clock=clock)
+    cache.put("a", 0.5)
+    clock.now = 4.9
+    assert cache.get("a") == 0.5
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1 and len(cache) == 0
+
+    # A refresh restarts the TTL
+    cache.put("a", 0.7)
+    clock.now = 9.0
+    cache.put("a", 0.8)
+    clock.now = 12.0
+    assert cache.get("a") == 0.8
+
+
+def test_lru_bound():
+    cache = PredictionCache(maxsize=3, ttl=60.0)
+    for key in "abc":
+        cache.put(key, 0.1)
+    cache.get("a")          # a becomes most recently used
+    cache.put("d", 0.2)     # evicts b, the least recently used
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == [0.1, 0.1, 0.2]
+    assert len(cache) == 3 and cache.stats()["evictions"] == 1
+
+    disabled = PredictionCache(maxsize=0)
+    disabled.put("a", 0.5)
+    assert disabled.get("a") is None and len(disabled) == 0
+
+
+def test_key_includes_model_version():
+    predictor = UPIPhishingPredictor()
+    upi_id = "refund@paytmm"
+    fresh = predictor.predict_phishing_probability(upi_id)
+    assert predictor.cache.get((upi_id, predictor.model_version)) == fresh
+
+    # An entry scored by another model version is never served to this one
+    predictor.cache.put((upi_id, "previous-model"), 0.123)
+    assert predictor.predict_phishing_probability(upi_id) == fresh
+    assert predictor.predict_phishing_probabilities([upi_id])[0] == fresh
+
+    current = predictor.model_version
+    predictor.model_version = "previous-model"
+    assert predictor.predict_phishing_probability(upi_id) == 0.123
+    predictor.model_version = current
+
+
+def test_cache_does_not_change_scores():
+    """Cached scores equal the model's output for the ID exactly as given"""
+    predictor = UPIPhishingPredictor()
+    upi_ids = ["merchant@paytm", "Merchant@PAYTM", " merchant@paytm ", "merchant@paytm"]
+    expected = predictor.predict_proba(extract_feature_matrix(upi_ids))[:, 1]
+    for _ in range(2):  # cold, then from the cache
+        np.testing.assert_array_equal(predictor.predict_phishing_probabilities(upi_ids), expected)
+        assert [predictor.predict_phishing_probability(u) for u in upi_ids] == expected.tolist()
@@ -0,0 +1,64 @@
+"""
+Reason codes: pack/unpack round-trip and rendering identical to the live reasons
+"""
+import random
+
+from app.services.cypher_ml_logic import analyze_transaction
+from app.services.reasons import (
+    REASON_TEMPLATES,
+    _PARAM_FORMATS,
+    pack_reasons,
+    render_reasons,
+    unpack_reasons,
+)
+
+
+def sample_param(code, rng):
+    fmt = _PARAM_FORMATS.get(code)
+    if fmt == "<d":
+        return rng.choice([0.0, 500.0, 10000.0, 12500.5, 49999.99, 1e9])
+    if fmt == "<B":
+        return rng.randint(0, 23)
+    return None
+
+
+def test_pack_unpack_round_trip():
+    """Every code, alone and in random sequences, survives pack -> unpack unchanged"""
+    rng = random.Random(0)
+    for code in REASON_TEMPLATES:
+        codes = [(code, sample_param(code, rng))]
+        assert unpack_reasons(pack_reasons(codes)) == codes
+
+    for _ in range(200):
+        codes = [(code, sample_param(code, rng))
+                 for code in rng.choices(list(REASON_TEMPLATES), k=rng.randint(0, 6))]
+        assert unpack_reasons(pack_reasons(codes)) == codes
+
+    assert pack_reasons([]) == b"" and unpack_reasons(b"") == []
+
+
+def test_stored_codes_render_the_same_reasons():
+    """What /history renders from stored codes equals what /analyze returned"""
+    rng = random.Random(1)
+    payees = ["merchant@paytm", "refund@paytmm", "98765@unknown", "x@okaxis", None]
+    for i in range(200):
+        features = {
+            "amount_risk": rng.random(),
+            "payee_risk": rng.random(),
+            "frequency_risk": rng.random(),
+            "timing_risk": rng.random(),
+            "device_risk": rng.random(),
+            "amount_value": rng.choice([None, 500, 10000, 12500.5, 49999]),
+            "hour_of_day": rng.choice([None, 2, 9, 23]),
+            "payee_id": payees[i % len(payees)],
+        }
+        result = analyze_transaction(features)
+        stored = pack_reasons(result["reason_codes"])
+        assert render_reasons(unpack_reasons(stored), features["payee_id"]) == result["reasons"]
+
+
+def test_unknown_codes_are_skipped():
+    """Codes written by a newer release don't break reads"""
+    assert render_reasons([(250, None), (min(REASON_TEMPLATES), None)], "a@b") == [
+        REASON_TEMPLATES[min(REASON_TEMPLATES)]
+    ]
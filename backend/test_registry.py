@@ -0,0 +1,68 @@
+"""
+Model registry: activate, rollback, and the watcher following ACTIVE
+"""
+import threading
+import time
+
+import pytest
+
+from app.services.registry import ModelRegistry
+from ml.model_store import get_active_version, publish_model, set_active_version
+
+LEGACY_MODEL = "ml/models/upi_classifier.pkl"
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    for version in ("v1", "v2"):
+        publish_model(LEGACY_MODEL, version=version, models_dir=str(tmp_path))
+    return str(tmp_path)
+
+
+def test_activate_and_rollback(models_dir):
+    registry = ModelRegistry(models_dir=models_dir)
+    registry.load(warmup=False)
+    assert registry.active_version is None
+    legacy = registry.model_version
+
+    assert registry.activate("v1") == "v1"
+    assert registry.active_version == "v1" and get_active_version(models_dir) == "v1"
+    assert registry.predict_phishing_probability("refund@paytmm") == pytest.approx(
+        registry._previous[1].predict_phishing_probability("refund@paytmm")
+    )
+
+    assert registry.rollback() == legacy
+    assert registry.active_version is None and get_active_version(models_dir) is None
+    assert registry.stats()["previous_model_version"] == "v1"
+    assert registry.swaps == 2
+
+
+def test_watcher_follows_active(models_dir):
+    registry = ModelRegistry(watch_interval=0.05, models_dir=models_dir)
+    registry.load(warmup=False)
+    assert registry._watcher is None  # load() alone never starts one
+
+    def watchers():
+        return sum(t.name == "cypher-model-watcher" for t in threading.enumerate())
+
+    # Concurrent starts (e.g. thread-pool initializers) create one watcher
+    before = watchers()
+    starters = [threading.Thread(target=registry.start_watcher) for _ in range(8)]
+    for thread in starters:
+        thread.start()
+    for thread in starters:
+        thread.join()
+    assert watchers() == before + 1
+
+    for version in ("v2", None):
+        set_active_version(version, models_dir)
+        deadline = time.monotonic() + 10
+        while registry.active_version != version and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert registry.active_version == version
+
+
+def test_watcher_off_by_default():
+    registry = ModelRegistry()
+    registry.start_watcher()
+    assert registry._watcher is None
@@ -0,0 +1,66 @@
+"""
+Settings store: several workers sharing one file must not erase each other's updates
+"""
+import json
+import os
+import stat
+
+from app.user_settings import SettingsStore
+
+
+def stores(path, n=2):
+    # One store per simulated uvicorn worker; long debounce, flushed explicitly
+    return [SettingsStore(path, flush_interval_ms=60_000, refresh_interval_ms=0) for _ in range(n)]
+
+
+def test_workers_merge_instead_of_overwriting(tmp_path):
+    path = tmp_path / "user_settings.json"
+    a, b = stores(path)
+
+    a.update("alice", "preferences", {"language": "Hindi"})
+    b.update("bob", "user", {"name": "Bob"})
+    b.update("alice", "notifications", {"push_enabled": False})
+    a.flush()
+    b.flush()
+
+    users = json.loads(path.read_text())["users"]
+    assert users["alice"]["preferences"]["language"] == "Hindi"
+    assert users["alice"]["notifications"]["push_enabled"] is False
+    assert users["bob"]["user"]["name"] == "Bob"
+
+    # Each worker sees the other's changes on its next read
+    assert a.get("bob")["user"]["name"] == "Bob"
+    assert b.get("alice")["preferences"]["language"] == "Hindi"
+
+    # Later writes to the same field win
+    b.update("alice", "preferences", {"language": "Tamil"})
+    b.flush()
+    a.update("alice", "preferences", {"dark_mode": False})
+    a.flush()
+    alice = json.loads(path.read_text())["users"]["alice"]["preferences"]
+    assert alice["language"] == "Tamil" and alice["dark_mode"] is False
+
+
+def test_flush_keeps_file_mode(tmp_path):
+    path = tmp_path / "user_settings.json"
+    path.write_text(json.dumps({"users": {}}))
+    os.chmod(path, 0o644)
+
+    (store,) = stores(path, 1)
+    store.update(None, "preferences", {"dark_mode": False})
+    store.close()
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    assert json.loads(path.read_text())["users"]["default"]["preferences"]["dark_mode"] is False
+
+
+def test_legacy_single_user_file(tmp_path):
+    path = tmp_path / "user_settings.json"
+    path.write_text(json.dumps({"user": {"name": "Old"}, "preferences": {"language": "English"}}))
+    (store,) = stores(path, 1)
+    assert store.get()["user"]["name"] == "Old"
+
+    store.update("default", "preferences", {"language": "Hindi"})
+    store.flush()
+    users = json.loads(path.read_text())["users"]
+    assert users["default"] == {"user": {"name": "Old"}, "preferences": {"language": "Hindi"}}